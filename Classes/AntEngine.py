@@ -0,0 +1,343 @@
+from typing import Callable
+
+import numpy as np
+
+from Classes.RuleCompiler import (
+    CompiledRules,
+    Directions,
+    DIRECTION_DX,
+    DIRECTION_DY,
+    compile_rules
+)
+from Classes.ZobristHash import HASH_MASK, ZobristHash
+
+
+class AntEngine:
+    """
+    Headless Langton's ant (turmite) simulation (no Qt dependency).
+
+    The grid is a row-major uint8 buffer, so a cell is addressed as grid[y, x].
+    The ant wraps around the grid edges (torus).
+    """
+
+    traceable = True            # trace() and trace_hashes() follow the single ant (the detectors need them)
+    wraps = True                # the grid wraps around, its state is finite (the cycles and the trajectory log need it)
+
+    def __init__(self, rules: str | CompiledRules, width: int, height: int):
+        if width < 1 or height < 1:
+            raise ValueError("Grid size must be at least 1x1")
+
+        self.width = width
+        self.height = height
+        self._allocate()
+
+        # next x / y coordinate for every direction, so the loop needs no wrap around checks
+        self._next_x = [[(x + dx) % width for x in range(width)] for dx in DIRECTION_DX]
+        self._next_y = [[(y + dy) % height for y in range(height)] for dy in DIRECTION_DY]
+
+        self.compiled: CompiledRules = compile_rules("RL")
+        self.x = 0
+        self.y = 0
+        self.direction = Directions.ANT_DOWN
+        self.state = 0
+        self.steps = 0
+
+        # grid writes computed ahead (e.g. highway extrapolation), done when the grid is needed
+        self._pending_fills: list[Callable[[np.ndarray], tuple[np.ndarray, np.ndarray]]] = []
+
+        self.set_rules(rules)
+        self.reset()
+
+    def _allocate(self):
+        # bytearray is the storage used by the stepping loop (fast item access from Python),
+        # the numpy array is a view of the same memory for everything else
+        self._cells = bytearray(self.width * self.height)
+        self._grid = np.frombuffer(self._cells, dtype=np.uint8).reshape(self.height, self.width)
+
+    @property
+    def rules(self) -> str:
+        return self.compiled.source
+
+    @property
+    def grid(self) -> np.ndarray:
+        self._materialize()
+        # read-only view, no copy
+        view = self._grid.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def grid_view(self) -> np.ndarray:
+        # the cells as a read-only grid without a copy (grid[y, x], slices and index arrays), for the display
+        return self.grid
+
+    @property
+    def cells(self) -> memoryview:
+        self._materialize()
+        return memoryview(self._cells).toreadonly()
+
+    @property
+    def memory(self) -> int:
+        # bytes allocated for the cells
+        return len(self._cells)
+
+    @property
+    def ant_positions(self) -> tuple[np.ndarray, np.ndarray]:
+        # x and y coordinates of all the ants
+        return np.array([self.x]), np.array([self.y])
+
+    def rows(self, top: int, bottom: int) -> np.ndarray:
+        # cells of the rows top to bottom (exclusive), uint8 shape (rows, width)
+        return self.grid[top:bottom]
+
+    def colors_at(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.grid[ys, xs]
+
+    def population(self) -> int:
+        # cells with a non zero color
+        return int(np.count_nonzero(self.grid))
+
+    def copy(self) -> "AntEngine":
+        # plain engine with the same rules, grid and ant
+        engine = AntEngine(self.compiled, self.width, self.height)
+        engine.restore(self.grid, self.x, self.y, self.direction, self.state, self.steps)
+        return engine
+
+    def restore(self, grid: np.ndarray, x: int, y: int, direction: int, state: int, steps: int):
+        # puts the engine into a saved state, the grid has to have the engine size
+        if grid.shape != self._grid.shape:
+            raise ValueError(f"Grid size {grid.shape[1]}x{grid.shape[0]} does not match {self.width}x{self.height}")
+        self._pending_fills.clear()
+        self._grid[:] = grid
+        self._restore_ant(x, y, direction, state, steps)
+
+    def map_cells(self, path: str, offset: int, x: int, y: int, direction: int, state: int, steps: int):
+        # restore() from the cells of a file (a byte per cell row by row from offset) backing the engine
+        # as a copy-on-write mapping: nothing is read up front and only the pages written are copied
+        grid = np.asarray(np.memmap(path, dtype=np.uint8, mode="c", offset=offset, shape=(self.height, self.width)))
+        self._pending_fills.clear()
+        self._grid = grid
+        self._cells = memoryview(grid).cast("B")
+        self._restore_ant(x, y, direction, state, steps)
+
+    def _restore_ant(self, x: int, y: int, direction: int, state: int, steps: int):
+        self.x = int(x)
+        self.y = int(y)
+        self.direction = Directions(int(direction))
+        self.state = int(state)
+        self.steps = int(steps)
+
+    def defer_fill(self, fill: Callable[[np.ndarray], tuple[np.ndarray, np.ndarray]]):
+        # fill(grid) writes into the grid and returns the (ys, xs) of the written cells
+        self._pending_fills.append(fill)
+
+    def set_rules(self, rules: str | CompiledRules):
+        if not isinstance(rules, CompiledRules):
+            rules = compile_rules(rules)
+        self.compiled = rules
+
+    def reset(self):
+        # ant starts in the middle of the grid heading down
+        self.x = self.width // 2
+        self.y = self.height // 2
+        self.direction = Directions.ANT_DOWN
+        self.state = 0
+        self.steps = 0
+
+        self._pending_fills.clear()
+        self._grid.fill(0)
+
+    def _materialize(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        written = []
+        while self._pending_fills:
+            written.append(self._pending_fills.pop(0)(self._grid))
+        return written
+
+    def step(self, n: int = 1):
+        if self._pending_fills:
+            self._materialize()
+
+        # everything used in the loop is bound to locals, attribute/global lookups are slow
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        next_x = self._next_x
+        next_y = self._next_y
+        cells = self._cells
+        width = self.width
+        x = self.x
+        y = self.y
+        direction = self.direction
+        key = compiled.key(self.state, direction)
+
+        # the loop is table lookups only
+        for _ in range(n):
+            i = y * width + x
+            k = key + cells[i]
+            cells[i] = step_write[k]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x = next_x[direction][x]
+            y = next_y[direction][y]
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+
+    def step_back(self, n: int = 1):
+        """
+        Undoes the last n steps without any stored history: the ant moves back against its
+        direction and the step back tables give the color and the direction before the step.
+        """
+        self._check_step_back(n)
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_back_write = compiled.step_back_write
+        step_back_direction = compiled.step_back_direction
+        step_back_key = compiled.step_back_key
+        next_x = self._next_x
+        next_y = self._next_y
+        cells = self._cells
+        width = self.width
+        x = self.x
+        y = self.y
+        direction = int(self.direction)
+        key = compiled.key(self.state, direction)
+
+        # the same loop as step() in the reverse order, direction ^ 2 is the opposite direction
+        for _ in range(n):
+            x = next_x[direction ^ 2][x]
+            y = next_y[direction ^ 2][y]
+            i = y * width + x
+            k = key + cells[i]
+            cells[i] = step_back_write[k]
+            key = step_back_key[k]
+            direction = step_back_direction[k]
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps -= n
+
+    def _check_step_back(self, n: int):
+        if not self.compiled.reversible:
+            raise ValueError(f"Rules '{self.compiled.source}' are not reversible")
+        if not 0 <= n <= self.steps:
+            raise ValueError(f"Can not step back {n} steps from step {self.steps}")
+
+    def trace(self, n: int) -> np.ndarray:
+        """Same as step(n), but returns the step key (ant state, direction and cell color) of every step."""
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        next_x = self._next_x
+        next_y = self._next_y
+        cells = self._cells
+        width = self.width
+        x = self.x
+        y = self.y
+        direction = self.direction
+        key = compiled.key(self.state, direction)
+        keys = np.zeros(n, dtype=np.int32)
+        recorded = memoryview(keys)
+
+        for t in range(n):
+            i = y * width + x
+            k = key + cells[i]
+            recorded[t] = k
+            cells[i] = step_write[k]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x = next_x[direction][x]
+            y = next_y[direction][y]
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+        return keys
+
+    def trace_hashes(self, n: int, zobrist: ZobristHash, grid_hash: int) -> tuple[np.ndarray, int]:
+        """
+        Same as step(n), but keeps the Zobrist hash of the grid (grid_hash, for the grid before
+        the steps) up to date. Returns the state hash after every step and the new grid hash.
+        """
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        cell_keys = zobrist.cell_keys_view
+        write_deltas = zobrist.write_deltas
+        ant_keys = zobrist.ant_keys
+        next_x = self._next_x
+        next_y = self._next_y
+        cells = self._cells
+        width = self.width
+        x = self.x
+        y = self.y
+        direction = self.direction
+        key = compiled.key(self.state, direction)
+        hashes = np.zeros(n, dtype=np.uint64)
+        recorded = memoryview(hashes)
+
+        for t in range(n):
+            i = y * width + x
+            k = key + cells[i]
+            cells[i] = step_write[k]
+            grid_hash = (grid_hash + cell_keys[i] * write_deltas[k]) & HASH_MASK
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x = next_x[direction][x]
+            y = next_y[direction][y]
+            recorded[t] = (grid_hash + cell_keys[y * width + x] * ant_keys[key]) & HASH_MASK
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+        return hashes, grid_hash
+
+    def hashes_of_trace(self, keys: np.ndarray, x: int, y: int, zobrist: ZobristHash,
+                        grid_hash: int) -> tuple[np.ndarray, int]:
+        # the result of trace_hashes() from the keys of the steps traced from (x, y) (numpy, the
+        # uint64 arithmetic wraps around), for the engines without a hashing loop
+        xs, ys = self.trace_positions(np.append(keys, 0), x, y)
+        cells = (ys % self.height) * self.width + xs % self.width
+
+        write_deltas = np.array(zobrist.write_deltas, dtype=np.uint64)[keys]
+        grid_hashes = np.uint64(grid_hash) + np.cumsum(zobrist.cell_keys[cells[:-1]] * write_deltas, dtype=np.uint64)
+        next_keys = np.asarray(self.compiled.step_next_key)[keys]
+        hashes = grid_hashes + zobrist.cell_keys[cells[1:]] * np.array(zobrist.ant_keys, dtype=np.uint64)[next_keys]
+        return hashes, int(grid_hashes[-1]) if len(keys) else grid_hash
+
+    def trace_positions(self, keys: np.ndarray, x: int, y: int) -> tuple[np.ndarray, np.ndarray]:
+        # cells visited by the traced steps starting at (x, y), not wrapped around the grid
+        return trace_positions(self.compiled, keys, x, y)
+
+
+def trace_positions(compiled: CompiledRules, keys: np.ndarray, x: int, y: int) -> tuple[np.ndarray, np.ndarray]:
+    # cells visited by the steps of the keys starting at (x, y), on the plane
+    directions = np.asarray(compiled.step_direction)[keys]
+    xs = np.empty(len(keys), dtype=np.int64)
+    ys = np.empty(len(keys), dtype=np.int64)
+    if len(keys):
+        xs[0] = x
+        ys[0] = y
+        xs[1:] = x + np.cumsum(np.asarray(compiled.dx)[directions[:-1]])
+        ys[1:] = y + np.cumsum(np.asarray(compiled.dy)[directions[:-1]])
+    return xs, ys
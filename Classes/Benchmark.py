@@ -0,0 +1,117 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    """A measured value of a benchmark with its parameters."""
+    name: str
+    params: dict
+    value: float
+    unit: str                       # e.g. "steps/s" or "s"
+    higher_is_better: bool
+
+    @property
+    def key(self) -> str:
+        # the same benchmark with the same parameters in another run
+        return self.name + "".join(f" {name}={value}" for name, value in sorted(self.params.items()))
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """A benchmark of the baseline and of the current run."""
+    key: str
+    baseline: float
+    current: float
+    unit: str
+    slowdown: float                 # relative, positive = worse than the baseline
+    regression: bool
+
+
+def measure(function: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> float:
+    """
+    Median time (seconds) of a call. The calls are grouped so a measured group takes at
+    least min_time (like timeit), repeat groups are measured.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed > min_time / 10 else 10
+
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - started) / number)
+    return statistics.median(times)
+
+
+def machine_metadata() -> dict:
+    # what the results depend on, to tell apart the runs of other machines
+    metadata = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "python_implementation": platform.python_implementation(),
+        "numpy": np.__version__,
+    }
+    pyside = sys.modules.get("PySide6")
+    if pyside is not None:
+        metadata["pyside6"] = pyside.__version__
+    try:
+        metadata["commit"] = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return metadata
+
+
+def save_results(path: str, results: list[BenchmarkResult], metadata: dict):
+    with open(path, "w") as file:
+        json.dump({"metadata": metadata, "results": [asdict(result) for result in results]}, file, indent=2)
+
+
+def load_results(path: str) -> tuple[list[BenchmarkResult], dict]:
+    with open(path) as file:
+        data = json.load(file)
+    try:
+        return [BenchmarkResult(**result) for result in data["results"]], data.get("metadata", {})
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"'{path}' is not a benchmark result file") from e
+
+
+def compare_results(baseline: list[BenchmarkResult], current: list[BenchmarkResult],
+                    threshold: float) -> list[Comparison]:
+    """The benchmarks of both runs, a regression is slower than the baseline by more than threshold (0.1 = 10 %)."""
+    baseline_values = {result.key: result for result in baseline}
+    comparisons = []
+    for result in current:
+        before = baseline_values.get(result.key)
+        if before is None or before.value <= 0 or result.value <= 0:
+            continue
+        if result.higher_is_better:
+            slowdown = before.value / result.value - 1
+        else:
+            slowdown = result.value / before.value - 1
+        comparisons.append(Comparison(key=result.key, baseline=before.value, current=result.value, unit=result.unit,
+                                      slowdown=slowdown, regression=slowdown > threshold))
+    return comparisons
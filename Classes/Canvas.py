@@ -1,8 +1,15 @@
+import math
+from contextlib import nullcontext
 from dataclasses import dataclass
 
+import numpy as np
+
 from PySide6.QtWidgets import QWidget
-from PySide6.QtGui import QPainter, QBrush, QColor, QPixmap, QImage, QPen, QPolygon
-from PySide6.QtCore import QRect, Qt, QPoint
+from PySide6.QtGui import QPainter, QBrush, QColor, QPixmap, QImage, QPen, QPolygon, QRegion
+from PySide6.QtCore import QRect, QRectF, Qt, QPoint, QPointF
+
+from Classes.GridPyramid import GridPyramid
+from Classes.PerfMetrics import PHASE_PAINT, PerfMetrics
 
 @dataclass
 class Rule:
@@ -14,7 +21,22 @@ class GridCanvas(QWidget):
         super().__init__(parent)
         self.Bg_color = _bg_color
         self.cell_size = 1
-        self.cells = {}
+        self.grid = None                # read-only view of the simulation grid (grid[y, x])
+        self.memory = None              # the array the image of the grid shows (the packed rows of a PackedGrid)
+        self.grid_lock = nullcontext()  # held while the cells are read (the owner of the grid writes them holding it)
+
+        # the grid cells as the pixels of an image (no copy), the cell color is the index into the color table
+        self.image: QImage | None = None
+
+        # changed cells are repainted in dirty_tile_size x dirty_tile_size blocks, merged to rectangles,
+        # the whole canvas is repainted when too much of it changed
+        self.dirty_tile_size = 16
+        self.full_update_ratio = 0.25
+        self.max_dirty_rects = 32
+
+        self.ant_xs = None              # positions of the ants shown over the grid
+        self.ant_ys = None
+        self.Ant_color = "#000000"
         self.cell_colors = [       # some initial colors
             "#FF0000", "#00FF00", "#0000FF", "#FFFF00", "#FF00FF",
             "#00FFFF", "#A60000", "#FFA500", "#FF6262", "#202072",
@@ -22,6 +44,18 @@ class GridCanvas(QWidget):
             "#A68900", "#FFD300", "#FFDE40", "#FF4C4C", "#4CFF4C"
         ]
 
+        # the view: pixels per cell and the cell at the top left corner of the canvas, the wheel zooms and
+        # dragging moves it; a zoomed out view draws a level of the pyramid (a cell per 2^k x 2^k cells)
+        self.zoom = 1.0
+        self.origin_x = 0.0
+        self.origin_y = 0.0
+        self.max_zoom = 64.0
+        self.pyramid = GridPyramid(self.dirty_tile_size)
+        self.level_images: dict[int, QImage] = {}       # images of the pyramid levels (no copy)
+        self._drag_start: tuple[QPointF, float, float] | None = None
+
+        self.metrics = PerfMetrics()    # times the painting (disabled until the main window enables it)
+        self.overlay_lines: list[str] = []      # text drawn over the top left corner of the grid
 
         if previous_placeholder and isinstance(previous_placeholder, QWidget):
             self.setMinimumSize(previous_placeholder.minimumSize())
@@ -33,38 +67,249 @@ class GridCanvas(QWidget):
             raise AttributeError("Placeholder does not have type of QWidget")
 
     def setCellSize(self, cell_size: int):
+        # the zoom of the initial view
         self.cell_size = cell_size
+        self.resetView()
+
+    def resetView(self):
+        # cell_size pixels per cell, the center of the grid in the center of the canvas
+        self.zoom = float(self.cell_size)
+        self.origin_x = self.origin_y = 0.0
+        if self.grid is not None:
+            height, width = self.grid.shape
+            self.origin_x = float(round((width - self.width() / self.zoom) / 2))
+            self.origin_y = float(round((height - self.height() / self.zoom) / 2))
+        self.update()
 
     def setColors(self, colors: list[str]):
         self.cell_colors = colors.copy()
+        # only the color table changes, the cells stay in the image
+        for image in [self.image, *self.level_images.values()]:
+            if image is not None:
+                image.setColorTable(self.colorTable(image))
         self.update()
 
-    def addCell(self, x: int, y: int, color_idx: int):
-        # adding or updating existing cell
-        self.cells[(x, y)] = color_idx
-
-    def repaint_grid(self):
-        self.update()
+    def colorTable(self, image: QImage) -> list[int]:
+        # color 0 is the background, the rest of the 256 indexes is unused (a 1-bit image has 2 of them)
+        table = [QColor(self.Bg_color).rgb()]
+        table += [QColor(color).rgb() for color in self.cell_colors[1:256]]
+        table += [table[0]] * (256 - len(table))
+        return table[:2] if image.format() == QImage.Format.Format_Mono else table
+
+    def setGrid(self, grid, dirty: np.ndarray | None = None):
+        # the image shows the grid memory itself (no copy), the simulation worker owns it: a byte per
+        # cell array, or the bits of a packed grid (PackedGrid, a 1-bit image of its packed rows);
+        # dirty are the dirty_tile_size tiles changed since the last call (None = everything)
+        packed = getattr(grid, "packed", None)
+        if packed is None and not grid.flags.c_contiguous:
+            grid = np.ascontiguousarray(grid)
+        memory = grid if packed is None else packed
+        if self.grid is None or self.grid.shape != grid.shape or \
+                self.memory.__array_interface__["data"][0] != memory.__array_interface__["data"][0]:
+            height, width = grid.shape
+            image_format = QImage.Format.Format_Indexed8 if packed is None else QImage.Format.Format_Mono
+            self.image = QImage(memory.data, width, height, memory.strides[0], image_format)
+            self.image.setColorTable(self.colorTable(self.image))
+            self.memory = memory
+            resized = self.grid is None or self.grid.shape != grid.shape
+            self.grid = grid            # keeps the memory of the image alive
+            self.pyramid.set_grid(grid)
+            self.level_images = {}
+            if resized:
+                self.resetView()
+            self.update()
+            return
 
-    def clearCell(self, x: int, y: int):
-        if (x, y) in self.cells:
-            del self.cells[(x, y)]
+        self.pyramid.mark_dirty(dirty)
+        rects = None if dirty is None else self.dirtyRects(dirty)
+        if rects is None:
             self.update()
+        elif rects:
+            self.update(self.cellsRegion(rects))
+
+    def dirtyRects(self, dirty: np.ndarray) -> list[QRect] | None:
+        # rectangles (in cells) covering the dirty tiles, None when the whole canvas should be repainted
+        tile = self.dirty_tile_size
+        if np.count_nonzero(dirty) > self.full_update_ratio * dirty.size:
+            return None
+
+        # runs of dirty tiles in a row, the same runs in the following rows make one rectangle
+        rects = []
+        open_runs = {}
+        for tile_y in np.nonzero(dirty.any(axis=1))[0].tolist():
+            edges = np.diff(np.concatenate(([0], dirty[tile_y].astype(np.int8), [0])))
+            runs = {}
+            for start, end in zip(np.nonzero(edges == 1)[0].tolist(), np.nonzero(edges == -1)[0].tolist()):
+                rect = open_runs.get((start, end))
+                if rect is not None and rect.bottom() == tile_y * tile - 1:
+                    rect.setBottom(rect.bottom() + tile)
+                else:
+                    rect = QRect(start * tile, tile_y * tile, (end - start) * tile, tile)
+                    rects.append(rect)
+                runs[(start, end)] = rect
+            open_runs = runs
+
+        if len(rects) > self.max_dirty_rects:
+            return None
+        return rects
+
+    def cellsRegion(self, rects: list[QRect]) -> QRegion:
+        region = QRegion()
+        for rect in rects:
+            region += self.cellsRect(rect)
+        return region
+
+    def cellsRect(self, cells: QRect) -> QRect:
+        # the pixels of the canvas showing the cells (at least a pixel)
+        left = math.floor((cells.x() - self.origin_x) * self.zoom)
+        top = math.floor((cells.y() - self.origin_y) * self.zoom)
+        right = math.ceil((cells.x() + cells.width() - self.origin_x) * self.zoom)
+        bottom = math.ceil((cells.y() + cells.height() - self.origin_y) * self.zoom)
+        return QRect(left, top, max(1, right - left), max(1, bottom - top))
+
+    def setAnts(self, xs: np.ndarray, ys: np.ndarray):
+        # the cells of the ants before and after are repainted
+        rects = []
+        for ant_xs, ant_ys in ((self.ant_xs, self.ant_ys), (xs, ys)):
+            if ant_xs is not None:
+                rects += [QRect(x, y, 1, 1) for x, y in zip(ant_xs.tolist(), ant_ys.tolist())]
+        self.ant_xs = xs
+        self.ant_ys = ys
+        if len(rects) > self.max_dirty_rects:
+            self.update()
+        else:
+            self.update(self.cellsRegion(rects))
 
-    def clearAllCells(self):
-        self.cells.clear()
+    def setOverlay(self, lines: list[str]):
+        # only the overlay box is repainted (the old and the new one)
+        region = QRegion(self.overlayRect())
+        self.overlay_lines = lines
+        self.update(region + QRegion(self.overlayRect()))
+
+    def overlayRect(self) -> QRect:
+        if not self.overlay_lines:
+            return QRect()
+        metrics = self.fontMetrics()
+        width = max(metrics.horizontalAdvance(line) for line in self.overlay_lines)
+        return QRect(0, 0, width + 8, len(self.overlay_lines) * metrics.lineSpacing() + 8)
+
+    def repaint_grid(self):
         self.update()
 
     def paintEvent(self, event):
+        started = self.metrics.start(PHASE_PAINT)
         painter = QPainter(self)
-        painter.fillRect(self.rect(), QColor(self.Bg_color))
+        painter.fillRect(event.rect(), QColor(self.Bg_color))
 
         painter.setPen(Qt.PenStyle.NoPen)
 
-        for (x, y), color_idx in self.cells.items():
-            color = QColor(self.cell_colors[color_idx])
-            painter.setBrush(QBrush(color))
-            painter.drawRect(QRect(x * self.cell_size, y * self.cell_size, self.cell_size, self.cell_size))
+        if self.image is not None:
+            with self.grid_lock:
+                self.paintCells(painter, event)
+        if self.overlay_lines:
+            self.paintOverlay(painter)
+        painter.end()
+        self.metrics.stop(PHASE_PAINT, started)
+
+    def paintCells(self, painter: QPainter, event):
+        # only the cells of the repainted region are drawn (scaled, no smoothing, a cell stays a sharp square);
+        # zoomed out, the cells of a pyramid level, so the cost depends on the pixels, not on the grid size
+        level = self.viewLevel()
+        image = self.image if level == 0 else self.levelImage(level)
+        zoom = self.zoom * (1 << level)                 # pixels per cell of the level
+        origin_x = self.origin_x / (1 << level)
+        origin_y = self.origin_y / (1 << level)
+        for rect in event.region():
+            left = math.floor(rect.x() / zoom + origin_x)
+            top = math.floor(rect.y() / zoom + origin_y)
+            cells = QRect(left, top, math.ceil((rect.x() + rect.width()) / zoom + origin_x) - left,
+                          math.ceil((rect.y() + rect.height()) / zoom + origin_y) - top)
+            cells = cells.intersected(image.rect())
+            if cells.isEmpty():
+                continue
+            painter.drawImage(QRectF((cells.x() - origin_x) * zoom, (cells.y() - origin_y) * zoom,
+                                     cells.width() * zoom, cells.height() * zoom), image, QRectF(cells))
+
+        # all the ants at once
+        if self.ant_xs is not None:
+            size = max(self.zoom, 1.0)
+            painter.setBrush(QBrush(QColor(self.Ant_color)))
+            painter.drawRects([QRectF((x - self.origin_x) * self.zoom, (y - self.origin_y) * self.zoom, size, size)
+                               for x, y in zip(self.ant_xs.tolist(), self.ant_ys.tolist())])
+
+    def viewLevel(self) -> int:
+        # the pyramid level with a cell of at most a pixel (a level cell is 2^k x 2^k cells)
+        if self.zoom >= 1:
+            return 0
+        return min(math.floor(-math.log2(self.zoom)), self.pyramid.depth)
+
+    def levelImage(self, level: int) -> QImage:
+        # the level is brought up to date with the grid, its image shows the cells of the pyramid
+        cells = self.pyramid.level(level)
+        image = self.level_images.get(level)
+        if image is None:
+            height, width = cells.shape
+            image = QImage(cells.data, width, height, cells.strides[0], QImage.Format.Format_Indexed8)
+            image.setColorTable(self.colorTable(image))
+            self.level_images[level] = image
+        return image
+
+    def wheelEvent(self, event):
+        # a notch zooms by sqrt(2), the cell under the cursor stays where it is
+        notches = event.angleDelta().y() / 120
+        if self.grid is None or not notches:
+            return
+        self.zoomAt(event.position(), self.zoom * 2 ** (notches / 2))
+        event.accept()
+
+    def zoomAt(self, position: QPointF, zoom: float):
+        height, width = self.grid.shape
+        # at least a half of the canvas shows the grid when zoomed out the most
+        min_zoom = min(self.width() / width, self.height() / height, self.cell_size) / 2
+        zoom = round(min(max(zoom, min_zoom), self.max_zoom), 6)
+        self.origin_x += position.x() / self.zoom - position.x() / zoom
+        self.origin_y += position.y() / self.zoom - position.y() / zoom
+        self.zoom = zoom
+        self.clampView()
+
+    def clampView(self):
+        # a part of the grid stays in the view
+        height, width = self.grid.shape
+        view_width = self.width() / self.zoom
+        view_height = self.height() / self.zoom
+        self.origin_x = min(max(self.origin_x, -view_width / 2), width - view_width / 2)
+        self.origin_y = min(max(self.origin_y, -view_height / 2), height - view_height / 2)
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_start = (event.position(), self.origin_x, self.origin_y)
+
+    def mouseMoveEvent(self, event):
+        # the grid follows the cursor
+        if self._drag_start is None or self.grid is None:
+            return
+        position, origin_x, origin_y = self._drag_start
+        self.origin_x = origin_x - (event.position().x() - position.x()) / self.zoom
+        self.origin_y = origin_y - (event.position().y() - position.y()) / self.zoom
+        self.clampView()
+
+    def mouseReleaseEvent(self, event):
+        self._drag_start = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.resetView()
+
+    def paintOverlay(self, painter: QPainter):
+        # semi-transparent box with the lines of text
+        rect = self.overlayRect()
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 160))
+        painter.drawRect(rect)
+        painter.setPen(QColor("#FFFFFF"))
+        metrics = self.fontMetrics()
+        for i, line in enumerate(self.overlay_lines):
+            painter.drawText(4, 4 + i * metrics.lineSpacing() + metrics.ascent(), line)
 
 class RulesCanvas(QWidget):
     def __init__(self, _bg_color="#FFF", previous_placeholder: QWidget = None, parent=None):
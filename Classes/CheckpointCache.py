@@ -0,0 +1,142 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import CanonicalRules, canonical_rules
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "langtons_ant")
+DEFAULT_MAX_BYTES = 256 << 20
+
+
+class CheckpointCache:
+    """
+    On-disk cache of simulation checkpoints keyed by (canonical rule, grid size, step).
+
+    Only runs of a Langton's ant rule string from the start state (empty grid, ant in the
+    middle heading down) are cached. A checkpoint is stored in the canonical orientation
+    of its rule (see canonical_rules()), so a mirrored rule gets it mirrored about the start
+    column (the L <-> R swap draws the mirror image) and a rule repeating the same root is
+    served by any checkpoint of a multiple of its length (the colors taken modulo its
+    length). The checkpoints are the .npz states of EngineState, the least recently used
+    ones are deleted when the cache gets bigger than max_bytes.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, engine: AntEngine) -> bool:
+        """Stores the engine state, returns False when the rules can not be cached."""
+        canonical = self._canonical(engine.compiled.source)
+        if canonical is None or engine.steps == 0:
+            return False
+
+        path = self._path(canonical, engine.width, engine.height, engine.steps)
+        if os.path.exists(path):
+            self._touch(path)
+            return True
+
+        grid, x, direction = self._orient(engine.grid, engine.x, engine.direction, canonical.mirrored)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez_compressed(
+                file,
+                rules=np.array(canonical.rules),
+                grid=grid,
+                ant=np.array([x, engine.y, direction, engine.state], dtype=np.int64),
+                steps=np.array(engine.steps, dtype=np.int64)
+            )
+        # a checkpoint is never seen half written
+        os.replace(temporary, path)
+        self._evict()
+        return True
+
+    def restore(self, engine: AntEngine, max_steps: int | None = None) -> bool:
+        """
+        Moves the engine (in its start state) to the furthest cached step of its rules
+        (up to max_steps), returns False when there is no checkpoint for them.
+        """
+        canonical = self._canonical(engine.compiled.source)
+        if canonical is None:
+            return False
+
+        best = None
+        for path, repeats, steps in self._checkpoints(canonical, engine.width, engine.height):
+            if repeats % canonical.repeats == 0 and (max_steps is None or steps <= max_steps):
+                if best is None or steps > best[1]:
+                    best = (path, steps)
+        if best is None or best[1] <= engine.steps:
+            return False
+
+        path = best[0]
+        with np.load(path) as state:
+            # the colors of a longer repeat counted modulo the length of the rules
+            grid = state["grid"] % engine.compiled.colors
+            x, y, direction, ant_state = (int(value) for value in state["ant"])
+            steps = int(state["steps"])
+        grid, x, direction = self._orient(grid, x, direction, canonical.mirrored)
+        engine.restore(grid, x, y, direction, ant_state, steps)
+        self._touch(path)
+        return True
+
+    def _checkpoints(self, canonical: CanonicalRules, width: int, height: int) -> list[tuple[str, int, int]]:
+        # (path, repeats, steps) of the checkpoints of the root and the grid size
+        prefix = f"{self._name(canonical.root)}-"
+        found = []
+        for name in os.listdir(self.directory):
+            match = re.fullmatch(r"(\d+)-(\d+)x(\d+)-(\d+)\.npz", name[len(prefix):]) \
+                if name.startswith(prefix) else None
+            if match and (int(match[2]), int(match[3])) == (width, height):
+                found.append((os.path.join(self.directory, name), int(match[1]), int(match[4])))
+        return found
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+
+        # the least recently used first
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def _path(self, canonical: CanonicalRules, width: int, height: int, steps: int) -> str:
+        name = f"{self._name(canonical.root)}-{canonical.repeats}-{width}x{height}-{steps}.npz"
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _name(root: str) -> str:
+        # long roots would not fit into a file name
+        return root if len(root) <= 64 else hashlib.sha1(root.encode()).hexdigest()
+
+    @staticmethod
+    def _canonical(source: str) -> CanonicalRules | None:
+        # turmite tables are not cached
+        if not re.fullmatch(r"[RLUNrlun]+", source):
+            return None
+        return canonical_rules(source)
+
+    @staticmethod
+    def _orient(grid: np.ndarray, x: int, direction: int, mirrored: bool) -> tuple[np.ndarray, int, int]:
+        # mirror image about the start column (x = width // 2) when mirrored, the same both ways
+        if not mirrored:
+            return grid, x, int(direction)
+        width = grid.shape[1]
+        center = width // 2
+        columns = (2 * center - np.arange(width)) % width
+        return grid[:, columns], (2 * center - x) % width, (4 - int(direction)) % 4
+
+    @staticmethod
+    def _touch(path: str):
+        # the modification time is the last use
+        os.utime(path)
@@ -0,0 +1,48 @@
+import numpy as np
+
+# colors of the GUI, the headless runner renders with the same ones
+GRADIENT_START_COLOR = "#00FF00"
+GRADIENT_END_COLOR = "#0000FF"
+BACKGROUND_COLOR = "#F0F0F0"
+
+
+def color_gradient(color_start_hex: str, color_end_hex: str, steps: int) -> list[str]:
+    c_start = hex_to_rgb(color_start_hex)
+    c_end = hex_to_rgb(color_end_hex)
+
+    colors: list[str] = []
+    for i in range(steps):
+        t = i / (steps - 1)
+        r = lin_interpolation(c_start[0], c_end[0], t)
+        g = lin_interpolation(c_start[1], c_end[1], t)
+        b = lin_interpolation(c_start[2], c_end[2], t)
+        colors.append(f"#{r:02X}{g:02X}{b:02X}")
+
+    return colors
+
+def lin_interpolation(a, b, t):
+    return int(a + (b - a) * t)
+
+def get_middle_color(color_start_hex: str, color_end_hex: str) -> str:
+    color_start = hex_to_rgb(color_start_hex)
+    color_end = hex_to_rgb(color_end_hex)
+
+    r = (color_start[0] + color_end[0]) // 2
+    g = (color_start[1] + color_end[1]) // 2
+    b = (color_start[2] + color_end[2]) // 2
+
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+def hex_to_rgb(color_hex: str) -> tuple[int, int, int]:
+    # "#RRGGBB" or "#RGB"
+    color_hex = color_hex.lstrip("#")
+    if len(color_hex) == 3:
+        color_hex = "".join(c * 2 for c in color_hex)
+    return int(color_hex[0:2], 16), int(color_hex[2:4], 16), int(color_hex[4:6], 16)
+
+def color_palette(colors: list[str], background_hex: str = BACKGROUND_COLOR) -> np.ndarray:
+    # RGB of every cell color index (uint8, shape (len(colors), 3)), color 0 is the background like in GridCanvas
+    palette = np.array([hex_to_rgb(color) for color in colors], dtype=np.uint8).reshape(-1, 3)
+    if len(palette):
+        palette[0] = hex_to_rgb(background_hex)
+    return palette
@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.ZobristHash import ZobristHash
+
+
+@dataclass(frozen=True)
+class Cycle:
+    """The engine state repeats every period steps from the step pre_period on."""
+    pre_period: int             # engine step at which the state enters the cycle
+    period: int
+    found_at: int               # engine step at which the cycle was confirmed
+
+
+class CycleFinder:
+    """
+    Finds the recurrence of the whole engine state.
+
+    The grid wraps around, so the simulation is a finite deterministic machine and its
+    state has to repeat eventually. Brent's algorithm runs on the incrementally updated
+    Zobrist hashes of the state, the memory stays bounded (one saved hash and a copy of the
+    state the search started from). After a hash match the pre-period is found by stepping
+    two copies of the start state, one of them period steps ahead, side by side. The states
+    found are compared cell by cell, so a hash collision can not report a false cycle.
+
+    Once the cycle is known, advance() skips all the whole cycles without stepping.
+    """
+
+    def __init__(self, engine: AntEngine, chunk: int = 1 << 16, seed: int = 0x5EED):
+        if not engine.traceable or not engine.wraps:
+            raise ValueError("Cycles are found on the trace of a single ant on the wrapped grid only")
+
+        self.engine = engine
+        self.chunk = chunk                  # steps traced at once (memory of the recorded hashes)
+        self.seed = seed
+
+        self.cycle: Cycle | None = None
+        self._zobrist: ZobristHash | None = None
+        self._zobrist_for = None            # grid size and rules the hash keys were made for
+        self._start: AntEngine | None = None
+        self._steps_end = -1                # engine step the search state belongs to
+        self._grid_hash = 0
+
+        # Brent's algorithm, the saved hash is moved to the current state every power steps
+        self._saved_hash = 0
+        self._power = 1
+        self._lam = 0
+
+    def reset(self):
+        # the search starts again with the next observed steps
+        self.cycle = None
+        self._start = None
+        self._steps_end = -1
+
+    def _start_search(self):
+        # the search starts from the current engine state
+        engine = self.engine
+        if self._zobrist is None or self._zobrist_for != (engine.width, engine.height, engine.compiled):
+            self._zobrist = ZobristHash(engine.width, engine.height, engine.compiled, self.seed)
+            self._zobrist_for = (engine.width, engine.height, engine.compiled)
+        zobrist = self._zobrist
+
+        self.cycle = None
+        self._start = engine.copy()
+        self._steps_end = engine.steps
+        self._grid_hash = zobrist.grid_hash(self._start.grid)
+        self._saved_hash = self._state_hash(self._start, self._grid_hash)
+        self._power = 1
+        self._lam = 0
+
+    def advance(self, n: int) -> Cycle | None:
+        # steps the engine by n steps, the whole cycles are skipped once the cycle is known
+        if self.cycle is None or self._steps_end != self.engine.steps:
+            return self.observe(n)
+        self._skip(self.engine.steps + n)
+        return self.cycle
+
+    def observe(self, n: int) -> Cycle | None:
+        """Steps the engine by n steps while searching for the cycle, the rest after it is found is skipped."""
+        engine = self.engine
+        if self._steps_end != engine.steps:
+            # the engine was changed from outside, the search starts again
+            self._start_search()
+
+        target = engine.steps + n
+        while engine.steps < target:
+            if self.cycle is not None:
+                self._skip(target)
+                break
+
+            hashes, self._grid_hash = engine.trace_hashes(min(self.chunk, target - engine.steps),
+                                                          self._zobrist, self._grid_hash)
+            period = self._brent(hashes)
+            if period:
+                self.cycle = self._find_pre_period(period)
+                if self.cycle is None:
+                    # hash collision, the search goes on from here
+                    self._start_search()
+
+        self._steps_end = engine.steps
+        return self.cycle
+
+    def _skip(self, target: int):
+        # steps the engine to the target step, the whole cycles change nothing
+        engine = self.engine
+        cycle = self.cycle
+        if engine.steps < cycle.pre_period:
+            engine.step(min(target, cycle.pre_period) - engine.steps)
+        remaining = target - engine.steps
+        if remaining > 0:
+            engine.steps += remaining - remaining % cycle.period
+            engine.step(remaining % cycle.period)
+        self._steps_end = engine.steps
+
+    def _brent(self, hashes: np.ndarray) -> int:
+        # returns the period, or 0 when the hashes do not repeat (yet)
+        done = 0
+        while done < len(hashes):
+            segment = hashes[done:done + self._power - self._lam]
+            match = np.nonzero(segment == np.uint64(self._saved_hash))[0]
+            if len(match):
+                return self._lam + int(match[0]) + 1
+
+            done += len(segment)
+            self._lam += len(segment)
+            if self._lam == self._power:
+                self._saved_hash = int(hashes[done - 1])
+                self._power *= 2
+                self._lam = 0
+        return 0
+
+    def _find_pre_period(self, period: int) -> Cycle | None:
+        zobrist = self._zobrist
+        start = self._start
+
+        # the second copy runs period steps ahead of the first one
+        behind = start.copy()
+        ahead = start.copy()
+        behind_hash = zobrist.grid_hash(behind.grid)
+        _, ahead_hash = ahead.trace_hashes(period, zobrist, behind_hash)
+
+        pre_period = None
+        if self._state_hash(behind, behind_hash) == self._state_hash(ahead, ahead_hash):
+            pre_period = 0
+        while pre_period is None and behind.steps < self.engine.steps:
+            steps = min(self.chunk, self.engine.steps - behind.steps)
+            behind_hashes, behind_hash = behind.trace_hashes(steps, zobrist, behind_hash)
+            ahead_hashes, ahead_hash = ahead.trace_hashes(steps, zobrist, ahead_hash)
+            match = np.nonzero(behind_hashes == ahead_hashes)[0]
+            if len(match):
+                pre_period = behind.steps - steps + int(match[0]) + 1 - start.steps
+        if pre_period is None:
+            return None
+
+        # both states are compared exactly
+        behind = start.copy()
+        behind.step(pre_period)
+        ahead = behind.copy()
+        ahead.step(period)
+        if not self._same_state(behind, ahead):
+            return None
+
+        return Cycle(pre_period=start.steps + pre_period, period=period, found_at=self.engine.steps)
+
+    def _state_hash(self, engine: AntEngine, grid_hash: int) -> int:
+        return self._zobrist.state_hash(grid_hash, engine.x, engine.y,
+                                        engine.compiled.key(engine.state, engine.direction))
+
+    @staticmethod
+    def _same_state(a: AntEngine, b: AntEngine) -> bool:
+        return ((a.x, a.y, a.direction, a.state) == (b.x, b.y, b.direction, b.state)
+                and np.array_equal(a.grid, b.grid))
@@ -0,0 +1,36 @@
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.PackedEngine import create_engine
+from Classes.RuleCompiler import compile_source
+from Classes.SnapshotFile import SNAPSHOT_EXTENSION, is_snapshot, load_snapshot, save_snapshot
+
+
+def save_state(engine: AntEngine, path: str):
+    """
+    Saves the rules, the grid and the ant of the engine to a compressed .npz file, or to a
+    binary snapshot (see SnapshotFile) for a path ending with .lant.
+    """
+    if path.endswith(SNAPSHOT_EXTENSION):
+        save_snapshot(engine, path, compress=True)
+        return
+
+    np.savez_compressed(
+        path,
+        rules=np.array(engine.compiled.source),
+        grid=engine.grid,
+        ant=np.array([engine.x, engine.y, int(engine.direction), engine.state], dtype=np.int64),
+        steps=np.array(engine.steps, dtype=np.int64)
+    )
+
+
+def load_state(path: str) -> AntEngine:
+    if is_snapshot(path):
+        return load_snapshot(path)
+
+    with np.load(path) as state:
+        grid = state["grid"]
+        engine = create_engine(compile_source(str(state["rules"])), grid.shape[1], grid.shape[0])
+        x, y, direction, ant_state = (int(value) for value in state["ant"])
+        engine.restore(grid, x, y, direction, ant_state, int(state["steps"]))
+    return engine
@@ -0,0 +1,103 @@
+import time
+from typing import Callable
+
+MAX_STEP_RATE = 1e12            # [steps/s] the measured rate is clamped (a step function may not do the n steps)
+TIMER_RESOLUTION = 1e-6         # [s] shorter batches are measured as taking this long
+
+class FrameScheduler:
+    """
+    Frame-budgeted stepping.
+
+    The time is split into frames (1 / fps). In every frame the stepping gets a time budget
+    (budget_ratio of the frame, the rest is left to the GUI) and the frame ends with a
+    snapshot for the GUI. With steps_per_second set, a frame only does its share of the
+    target (steps_per_second / fps), without it the steps fill the whole budget (maximum
+    speed while staying at fps frames per second).
+
+    The steps are done in batches sized from the measured step rate, so a batch takes about
+    batch_time and the budget and the commands are checked often enough. The rate can at most
+    double per batch and is clamped to MAX_STEP_RATE, so a step function that returns at once
+    can not make the batches grow without bound.
+    """
+
+    def __init__(self, fps: float = 50, budget_ratio: float = 0.8, batch_time: float = 0.004,
+                 steps_per_second: float | None = None):
+        self.fps = fps
+        self.budget_ratio = budget_ratio
+        self.batch_time = batch_time
+        self.steps_per_second = steps_per_second    # None = maximum speed
+
+        self.step_rate = 1000.0                     # [steps/s] measured speed of the stepping itself
+        self.achieved_rate = 0.0                    # [steps/s] steps done per wall clock second
+        self._frame_start = time.perf_counter()
+        self._debt = 0.0                            # steps of the target not done yet (fractions)
+        self._rate_start = self._frame_start
+        self._rate_steps = 0
+
+    @property
+    def frame_time(self) -> float:
+        return 1 / self.fps
+
+    def restart(self):
+        # the target counts from now (after a pause or a speed change)
+        self._frame_start = time.perf_counter()
+        self._debt = 0.0
+        self._rate_start = self._frame_start
+        self._rate_steps = 0
+        self.achieved_rate = 0.0
+
+    def run_frame(self, step: Callable[[int], None], interrupted: Callable[[], bool] = lambda: False) -> int:
+        """
+        Steps in batches until the budget of the frame (or its share of the target) is used,
+        returns the steps done.
+        """
+        deadline = self._frame_start + self.frame_time * self.budget_ratio
+
+        if self.steps_per_second is None:
+            wanted = None
+        else:
+            # a slow frame can not be made up for more than one frame later
+            frame_steps = self.steps_per_second * self.frame_time
+            self._debt = min(self._debt + frame_steps, 2 * frame_steps)
+            wanted = int(self._debt)
+
+        done = 0
+        while not interrupted():
+            now = time.perf_counter()
+            if now >= deadline or (wanted is not None and done >= wanted):
+                break
+
+            batch = max(1, int(self.step_rate * min(self.batch_time, deadline - now)))
+            if wanted is not None:
+                batch = min(batch, wanted - done)
+            step(batch)
+            done += batch
+
+            elapsed = max(time.perf_counter() - now, TIMER_RESOLUTION)
+            # smoothed, a single slow batch (garbage collection) does not make the batches tiny
+            self.step_rate = min(0.7 * self.step_rate + 0.3 * batch / elapsed, 2 * self.step_rate, MAX_STEP_RATE)
+
+        self._debt -= done
+        self._measure(done)
+        return done
+
+    def wait_next_frame(self) -> float:
+        """Sleeps the rest of the frame (the frames do not drift), returns how late [s] the next frame starts."""
+        self._frame_start += self.frame_time
+        now = time.perf_counter()
+        if self._frame_start < now:
+            # late (a long frame), the next one starts now
+            lateness = now - self._frame_start
+            self._frame_start = now
+            return lateness
+        time.sleep(self._frame_start - now)
+        return 0.0
+
+    def _measure(self, steps: int):
+        # achieved steps per second over about half a second windows
+        self._rate_steps += steps
+        now = time.perf_counter()
+        if now - self._rate_start >= 0.5:
+            self.achieved_rate = self._rate_steps / (now - self._rate_start)
+            self._rate_start = now
+            self._rate_steps = 0
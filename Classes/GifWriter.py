@@ -0,0 +1,146 @@
+import struct
+from typing import BinaryIO
+
+import numpy as np
+
+GIF_HEADER = b"GIF89a"
+GIF_TRAILER = b"\x3b"
+
+_MAX_CODES = 4096                   # LZW codes are at most 12 bits
+
+
+class GifWriter:
+    """
+    Animated GIF writer using only the standard library (the LZW coder is in Python).
+
+    The frames are color indexes (uint8, shape (height, width)) with a palette of up to 256
+    RGB colors. The palette of the first frame is the global color table, a frame with
+    another palette gets its own local table. The animation loops forever by default.
+    """
+
+    def __init__(self, file: str | BinaryIO, width: int, height: int, fps: float, loops: int = 0):
+        if not 1 <= width <= 0xFFFF or not 1 <= height <= 0xFFFF:
+            raise ValueError("GIF size must be between 1x1 and 65535x65535")
+
+        self.width = width
+        self.height = height
+        self.delay = max(2, round(100 / fps))      # [1/100 s], the viewers slow down shorter delays
+        self.loops = loops
+        self.frames = 0
+        self.palette: np.ndarray | None = None      # the global color table
+
+        self._own_file = isinstance(file, str)
+        self._file: BinaryIO = open(file, "wb") if self._own_file else file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._own_file:
+            self._file.close()
+
+    def write_frame(self, image: np.ndarray, palette: np.ndarray):
+        image = np.asarray(image, dtype=np.uint8)
+        palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if image.shape != (self.height, self.width):
+            raise ValueError(f"Frame must have the shape ({self.height}, {self.width})")
+        if not 1 <= len(palette) <= 256:
+            raise ValueError("Palette must have 1 to 256 colors")
+
+        table_bits = max(1, int(len(palette) - 1).bit_length())
+        if self.frames == 0:
+            # logical screen with the global color table, the loop extension
+            self.palette = palette
+            self._file.write(GIF_HEADER)
+            self._file.write(struct.pack("<HHBBB", self.width, self.height, 0x80 | 0x70 | (table_bits - 1), 0, 0))
+            self._file.write(self._color_table(palette, table_bits))
+            self._file.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loops) + b"\x00")
+
+        # graphic control (the delay), the image descriptor (a local color table when the palette changed)
+        self._file.write(b"\x21\xf9\x04\x04" + struct.pack("<H", self.delay) + b"\x00\x00")
+        local = not np.array_equal(palette, self.palette)
+        self._file.write(b"\x2c" + struct.pack("<HHHHB", 0, 0, self.width, self.height,
+                                                0x80 | (table_bits - 1) if local else 0))
+        if local:
+            self._file.write(self._color_table(palette, table_bits))
+        else:
+            table_bits = max(1, int(len(self.palette) - 1).bit_length())
+
+        min_code_size = max(2, table_bits)
+        data = lzw_encode(image.tobytes(), min_code_size)
+        self._file.write(bytes([min_code_size]))
+        # data sub-blocks of up to 255 bytes
+        for start in range(0, len(data), 255):
+            block = data[start:start + 255]
+            self._file.write(bytes([len(block)]) + block)
+        self._file.write(b"\x00")
+        self.frames += 1
+
+    def close(self):
+        if self.frames == 0:
+            raise ValueError("No frame was written")
+        self._file.write(GIF_TRAILER)
+        if self._own_file:
+            self._file.close()
+
+    @staticmethod
+    def _color_table(palette: np.ndarray, table_bits: int) -> bytes:
+        # the table size is a power of two, the rest is black
+        table = np.zeros((1 << table_bits, 3), dtype=np.uint8)
+        table[:len(palette)] = palette
+        return table.tobytes()
+
+
+def lzw_encode(indexes: bytes, min_code_size: int) -> bytes:
+    """The GIF variant of LZW: variable code size up to 12 bits, codes packed from the least significant bit."""
+    clear = 1 << min_code_size
+    end = clear + 1
+    code_size = min_code_size + 1
+    next_code = end + 1
+    table: dict[int, int] = {}      # prefix code << 8 | index -> code
+    output = bytearray()
+    bits = clear                    # the clear code starts the stream
+    bit_count = code_size
+
+    prefix = indexes[0] if indexes else None
+    for index in indexes[1:]:
+        entry = prefix << 8 | index
+        code = table.get(entry)
+        if code is not None:
+            prefix = code
+            continue
+
+        bits |= prefix << bit_count
+        bit_count += code_size
+        if next_code < _MAX_CODES:
+            table[entry] = next_code
+            next_code += 1
+            # the decoder adds its entries one code later, so the size grows past a power of two
+            if next_code > 1 << code_size and code_size < 12:
+                code_size += 1
+        else:
+            # the table is full, it starts again
+            bits |= clear << bit_count
+            bit_count += code_size
+            table.clear()
+            next_code = end + 1
+            code_size = min_code_size + 1
+        prefix = index
+
+        while bit_count >= 8:
+            output.append(bits & 0xFF)
+            bits >>= 8
+            bit_count -= 8
+
+    if prefix is not None:
+        bits |= prefix << bit_count
+        bit_count += code_size
+    bits |= end << bit_count
+    bit_count += code_size
+    while bit_count > 0:
+        output.append(bits & 0xFF)
+        bits >>= 8
+        bit_count -= 8
+    return bytes(output)
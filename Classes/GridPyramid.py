@@ -0,0 +1,111 @@
+import numpy as np
+
+_BATCH_TILES = 256                  # tiles recomputed at once
+
+
+class GridPyramid:
+    """
+    Downscaled levels of the grid for the zoomed out views: level k has a cell for every
+    2^k x 2^k cells of the grid (level 0 is the grid itself), its color is the majority of
+    the 2 x 2 cells of the level below (a visited color wins a tie with the background).
+
+    The levels are updated lazily and incrementally: mark_dirty() only records the changed
+    tile_size x tile_size tiles of the grid (the dirty tiles of the snapshots), level()
+    recomputes the tiles of the asked level (and of the levels below it) that changed since.
+    The cost depends on the changed cells, not on the size of the grid.
+    """
+
+    def __init__(self, tile_size: int = 16):
+        self.tile_size = tile_size
+        self.grid: np.ndarray | None = None
+        self.levels: list[np.ndarray] = []          # levels[0] is the grid
+        self._dirty: list[np.ndarray] = []          # tiles (tile_size x tile_size cells of the level) to recompute
+
+    def set_grid(self, grid: np.ndarray):
+        # a new grid, all the levels (down to a single cell) are recomputed when they are asked for
+        self.grid = grid
+        self.levels = [grid]
+        self._dirty = [np.zeros(0, dtype=bool)]
+        height, width = grid.shape
+        while height > 1 or width > 1:
+            height, width = -(-height // 2), -(-width // 2)
+            self.levels.append(np.zeros((height, width), dtype=np.uint8))
+            self._dirty.append(np.ones((-(-height // self.tile_size), -(-width // self.tile_size)), dtype=bool))
+
+    @property
+    def depth(self) -> int:
+        # the highest level
+        return len(self.levels) - 1
+
+    def mark_dirty(self, dirty: np.ndarray | None = None):
+        # dirty tiles of the grid (bool (tiles_y, tiles_x)), None = everything
+        if dirty is None:
+            for mask in self._dirty[1:]:
+                mask[:] = True
+            return
+        for mask in self._dirty[1:]:
+            # a tile of a level covers 2 x 2 tiles of the level below
+            dirty = _any_blocks(dirty)
+            mask |= dirty[:mask.shape[0], :mask.shape[1]]
+
+    def level(self, k: int) -> np.ndarray:
+        """The cells of level k (clamped to the levels there are), up to date with the grid."""
+        k = max(0, min(k, self.depth))
+        for level in range(1, k + 1):
+            mask = self._dirty[level]
+            if mask.all():
+                self._update_all(level)
+                mask[:] = False
+                continue
+            tiles_y, tiles_x = np.nonzero(mask)
+            # in batches, the temporary arrays are about 16 times the cells of the batch
+            for start in range(0, len(tiles_y), _BATCH_TILES):
+                self._update_tiles(level, tiles_y[start:start + _BATCH_TILES], tiles_x[start:start + _BATCH_TILES])
+            mask[:] = False
+        return self.levels[k]
+
+    def _update_all(self, level: int):
+        # the whole level (a new grid), band by band of slices instead of the gathered tiles
+        source = self.levels[level - 1]
+        target = self.levels[level]
+        height, width = source.shape
+        band_rows = max(1, _BATCH_TILES * self.tile_size * self.tile_size // target.shape[1])
+        for top in range(0, target.shape[0], band_rows):
+            band = source[2 * top:2 * (top + band_rows)]
+            if len(band) % 2 or width % 2:
+                # the cells beyond the edge repeat the last ones
+                band = np.pad(band, ((0, len(band) % 2), (0, width % 2)), mode="edge")
+            target[top:top + band_rows] = majority(band[0::2, 0::2], band[0::2, 1::2], band[1::2, 0::2],
+                                                   band[1::2, 1::2])
+
+    def _update_tiles(self, level: int, tiles_y: np.ndarray, tiles_x: np.ndarray):
+        size = self.tile_size
+        source = self.levels[level - 1]
+        target = self.levels[level]
+
+        # the 2 * size x 2 * size source cells of every tile (the cells beyond the edge repeat the last ones)
+        offsets = np.arange(2 * size)
+        ys = np.minimum(tiles_y[:, None] * 2 * size + offsets, source.shape[0] - 1)
+        xs = np.minimum(tiles_x[:, None] * 2 * size + offsets, source.shape[1] - 1)
+        blocks = source[ys[:, :, None], xs[:, None, :]]
+        cells = majority(blocks[:, 0::2, 0::2], blocks[:, 0::2, 1::2], blocks[:, 1::2, 0::2], blocks[:, 1::2, 1::2])
+
+        ys = np.broadcast_to((tiles_y[:, None] * size + np.arange(size))[:, :, None], cells.shape)
+        xs = np.broadcast_to((tiles_x[:, None] * size + np.arange(size))[:, None, :], cells.shape)
+        inside = (ys < target.shape[0]) & (xs < target.shape[1])
+        target[ys[inside], xs[inside]] = cells[inside]
+
+
+def majority(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray) -> np.ndarray:
+    # the most frequent of the four colors, a non zero color before the background in a tie
+    values = np.stack((a, b, c, d))
+    scores = (values[:, None] == values[None]).sum(axis=1, dtype=np.uint8) * 2 + (values != 0)
+    return np.take_along_axis(values, scores.argmax(axis=0)[None], axis=0)[0]
+
+
+def _any_blocks(mask: np.ndarray) -> np.ndarray:
+    # OR of every 2 x 2 block (the last row and column may be single)
+    height, width = mask.shape
+    padded = np.zeros((height + height % 2, width + width % 2), dtype=bool)
+    padded[:height, :width] = mask
+    return padded[0::2, 0::2] | padded[0::2, 1::2] | padded[1::2, 0::2] | padded[1::2, 1::2]
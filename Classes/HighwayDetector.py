@@ -0,0 +1,315 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.UnboundedEngine import UnboundedAntEngine
+
+
+@dataclass(frozen=True)
+class Highway:
+    """
+    Periodic movement of the ant: the same sequence of step keys (ant state, direction and
+    cell color) repeats every period while the ant drifts by (drift_x, drift_y).
+    """
+    period: int
+    drift_x: int
+    drift_y: int
+    detected_at: int            # engine step at which the highway was confirmed
+    started_at: int             # engine step from which the recorded keys repeat with the period
+
+    # one period of the highway, starting at a step (detected_at + k * period)
+    keys: np.ndarray            # step key of every step of the period
+    offsets_x: np.ndarray       # cell of every step relative to the cell of the first step
+    offsets_y: np.ndarray
+
+    # steps to the previous / next visit of the same cell (0 = the cell is never visited before / after)
+    previous_visit: np.ndarray
+    next_visit: np.ndarray
+
+    @property
+    def drift(self) -> tuple[int, int]:
+        return self.drift_x, self.drift_y
+
+
+class HighwayDetector:
+    """
+    Watches the engine for a highway and extrapolates it.
+
+    The step keys are recorded while stepping through observe(). Once the last
+    confirm_periods periods of keys repeat with a period up to max_period (and the ant
+    moves away), the highway is reported. jump() then moves the engine to the target step
+    analytically; the written cells are filled in the grid lazily, when the grid is needed.
+    The jump stops before the highway runs into any cell that would change the periodic
+    pattern, on the wrapped grid its own trail too. The engine is an AntEngine or an
+    UnboundedAntEngine (nothing wraps around there).
+    """
+
+    def __init__(self, engine: AntEngine | UnboundedAntEngine, max_period: int = 2048, confirm_periods: int = 8,
+                 check_interval: int = 4096):
+        if not engine.traceable:
+            raise ValueError("Highways are detected on the trace of a single ant only")
+
+        self.engine = engine
+        self.max_period = max_period
+        self.confirm_periods = confirm_periods
+        self.check_interval = check_interval    # steps between the detection attempts
+
+        self.highway: Highway | None = None
+        self._keys = np.zeros(0, dtype=np.int32)
+        self._keys_end = -1                     # engine step just after the last recorded key
+        self._buffer_size = max_period * (confirm_periods + 4)
+        self._steps_since_check = 0
+
+    def reset(self):
+        self.highway = None
+        self._keys = np.zeros(0, dtype=np.int32)
+        self._keys_end = -1
+        self._steps_since_check = 0
+
+    def advance(self, n: int):
+        # steps the engine by n steps, jumps over the highway once there is one
+        target = self.engine.steps + n
+        while self.engine.steps < target:
+            if self.highway is not None and target - self.engine.steps >= self.highway.period:
+                if self.jump(target) == target:
+                    break
+                # the highway ran into its trail, back to plain stepping for a while
+                self.highway = None
+                self._steps_since_check = -16 * self.check_interval
+            self.observe(min(target - self.engine.steps, self.check_interval))
+
+    def observe(self, n: int) -> Highway | None:
+        return self.record(self.engine.trace(n))
+
+    def record(self, keys: np.ndarray) -> Highway | None:
+        """Takes the keys of the steps the engine has just done (engine.trace())."""
+        if self._keys_end != self.engine.steps - len(keys):
+            # the engine was stepped from outside, the recorded keys do not continue
+            self.reset()
+
+        self._keys = np.concatenate((self._keys, keys))[-self._buffer_size:]
+        self._keys_end = self.engine.steps
+
+        self._steps_since_check += len(keys)
+        if self.highway is None and self._steps_since_check >= self.check_interval:
+            self._steps_since_check = 0
+            self.highway = self._detect()
+        return self.highway
+
+    def _detect(self) -> Highway | None:
+        keys = self._keys
+        confirm = self.confirm_periods
+
+        for period in range(1, self.max_period + 1):
+            length = confirm * period
+            if length + period > len(keys):
+                break
+            if keys[-1] != keys[-1 - period] or keys[-2] != keys[-2 - period]:
+                continue
+            if not np.array_equal(keys[-length:], keys[-length - period:-period]):
+                continue
+
+            repeated = np.nonzero(np.asarray(keys[period:]) != np.asarray(keys[:-period]))[0]
+            verified = len(keys) - (repeated[-1] + 1 if len(repeated) else 0)
+            highway = self._make_highway(keys[-period:], period, self._keys_end - int(verified))
+            if highway is None:
+                continue
+
+            # all the cells visited again by the first period have to be visited by the confirmed part
+            if highway.previous_visit.max() + period > verified:
+                return None
+            return highway
+
+        return None
+
+    def _make_highway(self, keys: np.ndarray, period: int, started_at: int) -> Highway | None:
+        compiled = self.engine.compiled
+        offsets_x, offsets_y = self.engine.trace_positions(np.concatenate((keys, keys[:1])), 0, 0)
+        drift_x = int(offsets_x[-1])
+        drift_y = int(offsets_y[-1])
+        if drift_x == 0 and drift_y == 0:
+            # the ant does not move away, not a highway
+            return None
+        offsets_x = offsets_x[:-1]
+        offsets_y = offsets_y[:-1]
+
+        # previous / next visit of the same cell in the periodic movement, the cell of step j is
+        # visited by step i of the period p before if offset i = offset j + p * drift
+        cells = {}
+        for j, cell in enumerate(zip(offsets_x.tolist(), offsets_y.tolist())):
+            cells.setdefault(cell, []).append(j)
+
+        span = max(int(np.ptp(offsets_x)), int(np.ptp(offsets_y)))
+        max_periods = span // max(abs(drift_x), abs(drift_y)) + 2
+        previous_visit = np.zeros(period, dtype=np.int64)
+        next_visit = np.zeros(period, dtype=np.int64)
+        for j, cell in enumerate(zip(offsets_x.tolist(), offsets_y.tolist())):
+            for p in range(max_periods + 1):
+                earlier = [i for i in cells.get((cell[0] + p * drift_x, cell[1] + p * drift_y), ())
+                           if p > 0 or i < j]
+                if earlier:
+                    previous_visit[j] = p * period + j - max(earlier)
+                    break
+            for p in range(max_periods + 1):
+                later = [i for i in cells.get((cell[0] - p * drift_x, cell[1] - p * drift_y), ())
+                         if p > 0 or i > j]
+                if later:
+                    next_visit[j] = p * period + min(later) - j
+                    break
+
+        return Highway(
+            period=period,
+            drift_x=drift_x,
+            drift_y=drift_y,
+            detected_at=self.engine.steps,
+            started_at=started_at,
+            keys=keys.copy(),
+            offsets_x=offsets_x,
+            offsets_y=offsets_y,
+            previous_visit=previous_visit,
+            next_visit=next_visit
+        )
+
+    def jump(self, target_step: int) -> int:
+        """Moves the engine towards target_step along the highway, returns the step reached."""
+        engine = self.engine
+        highway = self.highway
+        if highway is None or self._keys_end != engine.steps or target_step <= engine.steps:
+            return engine.steps
+
+        # jumps start at the same phase of the period as the highway was recorded
+        phase = (engine.steps - highway.detected_at) % highway.period
+        if phase:
+            self.observe(min(highway.period - phase, target_step - engine.steps))
+            if engine.steps == target_step:
+                return engine.steps
+
+        # the ant has to be still on the highway, the steps observed since the last jump may have left it
+        length = (int(highway.previous_visit.max()) // highway.period + 1) * highway.period
+        if not np.array_equal(self._keys[-length:], np.tile(highway.keys, length // highway.period)):
+            return engine.steps
+
+        # the cells visited for the first time have to look like in the highway (empty),
+        # and no two of them can wrap around to the same cell
+        steps = self._valid_steps(target_step - engine.steps)
+        if steps <= 0:
+            return engine.steps
+
+        self._jump(steps)
+        return engine.steps
+
+    def _valid_steps(self, steps: int) -> int:
+        engine = self.engine
+        highway = self.highway
+        period = highway.period
+        compiled = engine.compiled
+        wraps = engine.wraps
+
+        first_visits = np.nonzero(highway.previous_visit == 0)[0]
+        first_colors = np.asarray(highway.keys[first_visits]) % compiled.colors
+
+        if wraps:
+            # cells of the highway already there (the verified periods before) are taken, kept sorted
+            # (the highway crosses a small part of the grid, so this does not grow with the grid size);
+            # on the plane the first visits are new cells anyway
+            width = engine.width
+            height = engine.height
+            past_periods = int(highway.previous_visit.max()) // period + 1
+            periods = np.arange(1, past_periods + 1)[:, None]
+            xs = (engine.x + highway.offsets_x[None, :] - periods * highway.drift_x).reshape(-1)
+            ys = (engine.y + highway.offsets_y[None, :] - periods * highway.drift_y).reshape(-1)
+            wrapped = (ys % height) * width + xs % width
+            unwrapped = (ys - ys.min()) * (int(np.ptp(xs)) + 1) + xs - xs.min()
+            if len(np.unique(wrapped)) != len(np.unique(unwrapped)):
+                # the highway already overlaps itself on the grid
+                return 0
+            taken = np.unique(wrapped)
+
+        # check the first visits period by period, in chunks growing up to about 1M cells
+        # (a highway that hits something soon is rejected cheaply)
+        periods_total = -(-steps // period)
+        max_chunk = max(1, (1 << 20) // max(1, len(first_visits)))
+        chunk = min(64, max_chunk)
+        start = 0
+        while start < periods_total:
+            periods = np.arange(start, min(start + chunk, periods_total))[:, None]
+            start += chunk
+            chunk = min(2 * chunk, max_chunk)
+            xs, ys = self._wrap(engine.x + highway.offsets_x[first_visits][None, :] + periods * highway.drift_x,
+                                engine.y + highway.offsets_y[first_visits][None, :] + periods * highway.drift_y)
+            step_of_visit = (periods * period + first_visits[None, :]).reshape(-1)
+
+            colors = engine.colors_at(xs.reshape(-1), ys.reshape(-1))
+            invalid = (colors != np.broadcast_to(first_colors, (len(periods), len(first_visits))).reshape(-1))
+            if wraps:
+                visited = (ys * width + xs).reshape(-1)
+                invalid |= np.isin(visited, taken)
+                _, first_index = np.unique(visited, return_index=True)
+                duplicate = np.ones(len(visited), dtype=bool)
+                duplicate[first_index] = False
+                invalid |= duplicate
+
+            bad = np.nonzero(invalid & (step_of_visit < steps))[0]
+            if len(bad):
+                # stop at the last full period before the collision
+                return int(step_of_visit[bad[0]]) // period * period
+            if wraps:
+                taken = np.union1d(taken, visited)
+
+        return steps
+
+    def _jump(self, steps: int):
+        engine = self.engine
+        highway = self.highway
+        compiled = engine.compiled
+        period = highway.period
+        start_x = engine.x
+        start_y = engine.y
+        write = np.asarray(compiled.step_write)[highway.keys]
+
+        def fill(grid: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            # the last visit of every cell decides its color, the periods are done in chunks of about 1M steps
+            written_xs = []
+            written_ys = []
+            periods_total = -(-steps // period)
+            chunk = max(1, (1 << 20) // period)
+            for first in range(0, periods_total, chunk):
+                periods = np.arange(first, min(first + chunk, periods_total))[:, None]
+                steps_of_visits = periods * period + np.arange(period)[None, :]
+                last = steps_of_visits < steps
+                last &= (highway.next_visit == 0) | (steps_of_visits + highway.next_visit >= steps)
+                xs, ys = self._wrap(start_x + highway.offsets_x + periods * highway.drift_x,
+                                    start_y + highway.offsets_y + periods * highway.drift_y)
+                xs = xs[last]
+                ys = ys[last]
+                grid[ys, xs] = np.broadcast_to(write, last.shape)[last]
+                written_xs.append(xs)
+                written_ys.append(ys)
+            return np.concatenate(written_ys), np.concatenate(written_xs)
+
+        engine.defer_fill(fill)
+
+        # ant state after the jump
+        periods, rest = divmod(steps, period)
+        last_key = int(highway.keys[(steps - 1) % period])
+        next_key = compiled.step_next_key[last_key]
+        x, y = self._wrap(int(start_x + periods * highway.drift_x + highway.offsets_x[rest]),
+                          int(start_y + periods * highway.drift_y + highway.offsets_y[rest]))
+        engine.x = x
+        engine.y = y
+        engine.direction = compiled.key_direction(next_key)
+        engine.state = compiled.key_state(next_key)
+        engine.steps += steps
+
+        # the recorded keys continue with the highway keys
+        self._keys = np.concatenate((self._keys, np.tile(highway.keys, min(periods, self.confirm_periods + 2)),
+                                     highway.keys[:rest]))[-self._buffer_size:]
+        self._keys_end = engine.steps
+
+    def _wrap(self, xs, ys):
+        # around the wrapped grid, the plane stays as it is
+        engine = self.engine
+        if not engine.wraps:
+            return xs, ys
+        return xs % engine.width, ys % engine.height
@@ -0,0 +1,413 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import CompiledRules
+from Classes.ZobristHash import ZobristHash
+
+
+class MacroAntEngine(AntEngine):
+    """
+    AntEngine that memoizes whole tile traversals.
+
+    The grid is split into tile_size x tile_size tiles, 2x2 tiles make a level 1 block,
+    2x2 level 1 blocks make a level 2 block and so on. Every tile/block content gets an id
+    and a traversal of the ant through it is stored as
+        (level, content id, ant entry cell, ant state and direction) ->
+        (content id after, exit cell, steps taken, ant state and direction)
+    in a bounded LRU cache. When the ant enters a tile state it has already seen, the whole
+    traversal is done in one lookup, a traversal of a block is made of the traversals of
+    its children, so the repeated structures (highways) are skipped in big jumps.
+    A single cached traversal of a big block stands for many steps, so the cache pays off
+    by the steps it skips, not by the number of the lookups that hit.
+
+    Block contents are written to the grid only when the grid is read, the step count
+    and the grid are exactly the same as with the plain AntEngine. When less than
+    min_hit_rate of the steps of a window come from the cache (chaotic phase of the ant),
+    the engine falls back to plain stepping for a while, longer after every failed window.
+    """
+
+    def __init__(self, rules: str | CompiledRules, width: int, height: int,
+                 tile_size: int = 16, max_levels: int = 8, cache_size: int = 1 << 18,
+                 max_traversal: int = 1 << 16):
+        if tile_size < 2:
+            raise ValueError("Tile size must be at least 2")
+
+        self.tile_size = tile_size
+        self.cache_size = cache_size
+        self.max_traversal = max_traversal      # longest plain traversal of a single tile
+
+        # the biggest blocks (roots) have to cover the grid evenly, the remaining right and
+        # bottom edge (when the tile size does not divide the grid size) is stepped plainly
+        self.levels = 0
+        while (self.levels < max_levels and
+               width % (tile_size << (self.levels + 1)) == 0 and height % (tile_size << (self.levels + 1)) == 0):
+            self.levels += 1
+        self.block_size = tile_size << self.levels
+        self.roots_per_row = width // self.block_size
+        self.roots_per_column = height // self.block_size
+        self.tiles_per_row = -(-width // tile_size)
+
+        # memoized traversals and interned contents (level 0 = tile bytes, level n = 4 child ids)
+        self._memo: OrderedDict[tuple[int, int, int, int], tuple[int, int, int, int, int]] = OrderedDict()
+        self._nodes: list[list] = [[] for _ in range(self.levels + 1)]
+        self._node_ids: list[dict] = [{} for _ in range(self.levels + 1)]
+        self._empty_nodes: list[int] = []
+
+        # content id of every root block and the id whose content is written in the grid
+        self._roots: list[int] = []
+        self._written_roots: list[int] = []
+
+        # plain stepping fallback when too few steps come from the cache
+        self.min_hit_rate = 0.5                 # of the steps of a window
+        self.window_steps = 1 << 14             # steps of the cache before it is judged
+        self.plain_chunk = 1 << 14              # plain steps after a failed window (doubled up to max_plain_chunk)
+        self.max_plain_chunk = 1 << 22
+        self._plain_steps_left = 0
+        self._next_plain_chunk = self.plain_chunk
+        self._window_hit_steps = 0              # steps done by cached traversals
+        self._window_plain_steps = 0            # steps done by _traverse()
+
+        # cache statistics
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        super().__init__(rules, width, height)
+
+    @property
+    def grid(self) -> np.ndarray:
+        self._flush()
+        return super().grid
+
+    @property
+    def cells(self) -> memoryview:
+        self._flush()
+        return super().cells
+
+    def set_rules(self, rules: str | CompiledRules):
+        super().set_rules(rules)
+        # cached traversals are only valid for the rules they were made with
+        self._memo.clear()
+
+    def reset(self):
+        # the grid is cleared, nothing is left to be written
+        self._roots = []
+        self._written_roots = []
+        super().reset()
+        self._clear_cache()
+
+    def restore(self, grid: np.ndarray, x: int, y: int, direction: int, state: int, steps: int):
+        super().restore(grid, x, y, direction, state, steps)
+        # every block is read from the new grid
+        self._refresh_tiles(np.ones((-(-self.height // self.tile_size), self.tiles_per_row), dtype=np.uint8))
+
+    def step_back(self, n: int = 1):
+        self._materialize()
+        self._flush()
+        super().step_back(n)
+        # the visited cells are not known, all the blocks are read again
+        self._refresh_tiles(np.ones((-(-self.height // self.tile_size), self.tiles_per_row), dtype=np.uint8))
+
+    def trace(self, n: int) -> np.ndarray:
+        self._materialize()
+        self._flush()
+        x = self.x
+        y = self.y
+        keys = super().trace(n)
+
+        xs, ys = self.trace_positions(keys, x, y)
+        self._refresh(ys % self.height, xs % self.width)
+        return keys
+
+    def trace_hashes(self, n: int, zobrist: ZobristHash, grid_hash: int) -> tuple[np.ndarray, int]:
+        self._materialize()
+        self._flush()
+        hashes, grid_hash = super().trace_hashes(n, zobrist, grid_hash)
+
+        # the visited cells are not known, all the blocks are read again
+        self._refresh_tiles(np.ones((-(-self.height // self.tile_size), self.tiles_per_row), dtype=np.uint8))
+        return hashes, grid_hash
+
+    def _materialize(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        if not self._pending_fills:
+            return []
+
+        self._flush()
+        written = super()._materialize()
+        for ys, xs in written:
+            self._refresh(ys, xs)
+        return written
+
+    def step(self, n: int = 1):
+        self._materialize()
+
+        compiled = self.compiled
+        size = self.block_size
+        levels = self.levels
+        width = self.width
+        height = self.height
+        covered_width = self.roots_per_row * size
+        covered_height = self.roots_per_column * size
+
+        remaining = n
+        while remaining > 0:
+            if self.x >= covered_width or self.y >= covered_height:
+                # edge cells are never part of a block
+                AntEngine.step(self, 1)
+                remaining -= 1
+                continue
+
+            if self._plain_steps_left > 0:
+                plain_steps = min(remaining, self._plain_steps_left)
+                self._plain_steps_left -= plain_steps
+                self._plain_step(plain_steps)
+                remaining -= plain_steps
+                continue
+
+            if sum(map(len, self._nodes)) > 4 * self.cache_size:
+                self._clear_cache()
+
+            root_x = self.x - self.x % size
+            root_y = self.y - self.y % size
+            root = (root_y // size) * self.roots_per_row + root_x // size
+
+            (self._roots[root], exit_x, exit_y, taken, key), _ = self._advance(
+                levels, self._roots[root], (self.y - root_y) * size + (self.x - root_x),
+                compiled.key(self.state, self.direction), remaining)
+
+            self.x = (root_x + exit_x) % width
+            self.y = (root_y + exit_y) % height
+            self.direction = compiled.key_direction(key)
+            self.state = compiled.key_state(key)
+            self.steps += taken
+            remaining -= taken
+
+    def _advance(self, level: int, node: int, entry: int, key: int, limit: int):
+        # moves the ant through the block until it leaves it or the step limit is reached,
+        # returns (new content id, exit x, exit y, steps taken, key) and if the ant has left the block
+        memo_key = (level, node, entry, key)
+        traversal = self._memo.get(memo_key)
+        if traversal is not None and traversal[3] <= limit:
+            self._memo.move_to_end(memo_key)
+            self.cache_hits += 1
+            self._window_hit_steps += traversal[3]
+            self._judge_window()
+            return traversal, True
+
+        self.cache_misses += 1
+        if level == 0:
+            traversal, complete = self._traverse(node, entry, key, min(limit, self.max_traversal))
+        else:
+            size = self.tile_size << level
+            half = size >> 1
+            children = list(self._nodes[level][node])
+            x = entry % size
+            y = entry // size
+            taken = 0
+            complete = False
+            while taken < limit:
+                child_x = half if x >= half else 0
+                child_y = half if y >= half else 0
+                child = (child_y // half) * 2 + child_x // half
+
+                (children[child], exit_x, exit_y, child_taken, key), child_complete = self._advance(
+                    level - 1, children[child], (y - child_y) * half + (x - child_x), key, limit - taken)
+
+                taken += child_taken
+                x = child_x + exit_x
+                y = child_y + exit_y
+                if not child_complete:
+                    break
+                if not (0 <= x < size and 0 <= y < size):
+                    complete = True
+                    break
+                if self._plain_steps_left:
+                    # the cache does not pay off, the ant stops here and steps plainly
+                    break
+
+            traversal = (self._intern(level, tuple(children)), x, y, taken, key)
+
+        if complete:
+            self._memo[memo_key] = traversal
+            if len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+        return traversal, complete
+
+    def _traverse(self, node: int, entry: int, key: int, limit: int):
+        # plain stepping inside a single tile, in tile local coordinates
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        dx = compiled.dx
+        dy = compiled.dy
+        size = self.tile_size
+        cells = bytearray(self._nodes[0][node])
+        x = entry % size
+        y = entry // size
+
+        taken = 0
+        while taken < limit:
+            i = y * size + x
+            k = key + cells[i]
+            cells[i] = step_write[k]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x += dx[direction]
+            y += dy[direction]
+            taken += 1
+            if not (0 <= x < size and 0 <= y < size):
+                self._window_plain_steps += taken
+                self._judge_window()
+                return (self._intern(0, bytes(cells)), x, y, taken, key), True
+
+        self._window_plain_steps += taken
+        self._judge_window()
+        return (self._intern(0, bytes(cells)), x, y, taken, key), False
+
+    def _judge_window(self):
+        # after window_steps steps, too few of them from the cache switch to plain stepping
+        window = self._window_hit_steps + self._window_plain_steps
+        if window < self.window_steps:
+            return
+        if self._window_hit_steps < self.min_hit_rate * window:
+            self._plain_steps_left = self._next_plain_chunk
+            self._next_plain_chunk = min(2 * self._next_plain_chunk, self.max_plain_chunk)
+        else:
+            self._next_plain_chunk = self.plain_chunk
+        self._window_hit_steps = 0
+        self._window_plain_steps = 0
+
+    def _plain_step(self, n: int):
+        # plain stepping directly in the grid, tiles touched by the ant are marked,
+        # so only their blocks have to be read back afterwards
+        self._flush()
+
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        next_x = self._next_x
+        next_y = self._next_y
+        cells = self._cells
+        width = self.width
+        size = self.tile_size
+        tiles_per_row = self.tiles_per_row
+        touched = bytearray(tiles_per_row * -(-self.height // size))
+        x = self.x
+        y = self.y
+        key = compiled.key(self.state, self.direction)
+
+        for _ in range(n):
+            i = y * width + x
+            touched[(y // size) * tiles_per_row + x // size] = 1
+            k = key + cells[i]
+            cells[i] = step_write[k]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x = next_x[direction][x]
+            y = next_y[direction][y]
+
+        self.x = x
+        self.y = y
+        self.direction = compiled.key_direction(key)
+        self.state = compiled.key_state(key)
+        self.steps += n
+
+        self._refresh_tiles(np.frombuffer(touched, dtype=np.uint8).reshape(-1, tiles_per_row))
+
+    def _refresh(self, ys: np.ndarray, xs: np.ndarray):
+        # the cells were written directly to the grid, read their blocks again
+        touched_tiles = np.zeros((-(-self.height // self.tile_size), self.tiles_per_row), dtype=np.uint8)
+        touched_tiles[ys // self.tile_size, xs // self.tile_size] = 1
+        self._refresh_tiles(touched_tiles)
+
+    def _refresh_tiles(self, touched_tiles: np.ndarray):
+        for root in range(len(self._roots)):
+            root_x = (root % self.roots_per_row) * self.block_size
+            root_y = (root // self.roots_per_row) * self.block_size
+            self._roots[root] = self._read(self.levels, self._roots[root], root_x, root_y, touched_tiles)
+        self._written_roots = self._roots.copy()
+
+    def _intern(self, level: int, content) -> int:
+        node = self._node_ids[level].get(content)
+        if node is None:
+            node = len(self._nodes[level])
+            self._nodes[level].append(content)
+            self._node_ids[level][content] = node
+        return node
+
+    def _clear_cache(self):
+        # ids are going to be reused, so the blocks have to be written to the grid first
+        self._flush()
+        self._memo.clear()
+        for level in range(self.levels + 1):
+            self._nodes[level].clear()
+            self._node_ids[level].clear()
+
+        self._empty_nodes = [self._intern(0, bytes(self.tile_size * self.tile_size))]
+        for level in range(1, self.levels + 1):
+            self._empty_nodes.append(self._intern(level, (self._empty_nodes[-1],) * 4))
+
+        self._roots = []
+        for root in range(self.roots_per_row * self.roots_per_column):
+            root_x = (root % self.roots_per_row) * self.block_size
+            root_y = (root // self.roots_per_row) * self.block_size
+            self._roots.append(self._read(self.levels, None, root_x, root_y, None))
+        self._written_roots = self._roots.copy()
+
+    def _read(self, level: int, node: int | None, x0: int, y0: int, touched_tiles: np.ndarray | None) -> int:
+        # builds the block content id from the grid (only the touched tiles are read again)
+        size = self.tile_size << level
+        if touched_tiles is not None:
+            tile_x = x0 // self.tile_size
+            tile_y = y0 // self.tile_size
+            tiles = size // self.tile_size
+            if not touched_tiles[tile_y:tile_y + tiles, tile_x:tile_x + tiles].any():
+                return node
+
+        if level == 0:
+            tile = self._grid[y0:y0 + size, x0:x0 + size]
+            if not tile.any():
+                return self._empty_nodes[0]
+            return self._intern(0, tile.tobytes())
+
+        if touched_tiles is None and not self._grid[y0:y0 + size, x0:x0 + size].any():
+            return self._empty_nodes[level]
+
+        half = size >> 1
+        children = self._nodes[level][node] if node is not None else (None,) * 4
+        return self._intern(level, (
+            self._read(level - 1, children[0], x0, y0, touched_tiles),
+            self._read(level - 1, children[1], x0 + half, y0, touched_tiles),
+            self._read(level - 1, children[2], x0, y0 + half, touched_tiles),
+            self._read(level - 1, children[3], x0 + half, y0 + half, touched_tiles)
+        ))
+
+    def _flush(self):
+        for root, node in enumerate(self._roots):
+            if node != self._written_roots[root]:
+                root_x = (root % self.roots_per_row) * self.block_size
+                root_y = (root // self.roots_per_row) * self.block_size
+                self._write(self.levels, node, self._written_roots[root], root_x, root_y)
+                self._written_roots[root] = node
+
+    def _write(self, level: int, node: int, written_node: int, x0: int, y0: int):
+        # writes the block content to the grid, blocks that did not change are skipped
+        if node == written_node:
+            return
+
+        if level == 0:
+            size = self.tile_size
+            self._grid[y0:y0 + size, x0:x0 + size] = np.frombuffer(
+                self._nodes[0][node], dtype=np.uint8).reshape(size, size)
+            return
+
+        half = (self.tile_size << level) >> 1
+        children = self._nodes[level][node]
+        written_children = self._nodes[level][written_node]
+        self._write(level - 1, children[0], written_children[0], x0, y0)
+        self._write(level - 1, children[1], written_children[1], x0 + half, y0)
+        self._write(level - 1, children[2], written_children[2], x0, y0 + half)
+        self._write(level - 1, children[3], written_children[3], x0 + half, y0 + half)
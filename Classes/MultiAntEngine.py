@@ -0,0 +1,203 @@
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import CompiledRules, Directions
+
+
+class MultiAntEngine(AntEngine):
+    """
+    Many ants on one grid, all of them make one step every tick (steps counts the ticks).
+
+    The ants are kept in NumPy arrays (positions and step keys) and every tick is done with
+    vectorized gathers and scatters on the grid. Ants sharing a cell in a tick act in the
+    order of their index: an ant reads the color written by the ants with a lower index on
+    the same cell, so the result is the same as stepping the ants one by one.
+
+    x, y, direction and state are the ones of the first ant. The steps are not traced (there
+    is no single trajectory), the highway, cycle and trajectory log code does not take it.
+    """
+
+    traceable = False
+
+    def __init__(self, rules: str | CompiledRules, width: int, height: int, ants: int = 1, seed: int = 0):
+        if ants < 1:
+            raise ValueError("At least 1 ant is needed")
+
+        self.ant_count = ants
+        self.seed = seed
+        self._xs = np.zeros(ants, dtype=np.int64)
+        self._ys = np.zeros(ants, dtype=np.int64)
+        self._keys = np.zeros(ants, dtype=np.int64)
+        self._owners = np.zeros(width * height, dtype=np.int64)
+
+        super().__init__(rules, width, height)
+
+    @property
+    def xs(self) -> np.ndarray:
+        return self._read_only(self._xs)
+
+    @property
+    def ys(self) -> np.ndarray:
+        return self._read_only(self._ys)
+
+    @property
+    def directions(self) -> np.ndarray:
+        return (self._keys // self.compiled.colors) % 4
+
+    @property
+    def states(self) -> np.ndarray:
+        return self._keys // (4 * self.compiled.colors)
+
+    @property
+    def ant_positions(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.xs, self.ys
+
+    def copy(self) -> "MultiAntEngine":
+        engine = MultiAntEngine(self.compiled, self.width, self.height, self.ant_count, self.seed)
+        engine._grid[:] = self.grid
+        engine.place(self._xs, self._ys, self.directions, self.states)
+        engine.steps = self.steps
+        return engine
+
+    def set_rules(self, rules: str | CompiledRules):
+        old_colors = self.compiled.colors
+        super().set_rules(rules)
+        compiled = self.compiled
+
+        # the step tables as arrays for the vectorized lookups
+        self._step_write = np.asarray(compiled.step_write, dtype=np.uint8)
+        self._step_next_key = np.asarray(compiled.step_next_key, dtype=np.int64)
+        key_directions = (np.arange(len(compiled.step_write)) // compiled.colors) % 4
+        self._key_dx = np.asarray(compiled.dx, dtype=np.int64)[key_directions]
+        self._key_dy = np.asarray(compiled.dy, dtype=np.int64)[key_directions]
+
+        # the ants keep their state and direction
+        directions = (self._keys // old_colors) % 4
+        states = np.minimum(self._keys // (4 * old_colors), compiled.states - 1)
+        self._keys = (states * 4 + directions) * compiled.colors
+
+    def reset(self):
+        super().reset()
+
+        # the first ant starts like the single one (in the middle heading down), the others
+        # at random cells with random directions
+        rng = np.random.default_rng(self.seed)
+        xs = rng.integers(0, self.width, size=self.ant_count)
+        ys = rng.integers(0, self.height, size=self.ant_count)
+        directions = rng.integers(0, 4, size=self.ant_count)
+        xs[0] = self.width // 2
+        ys[0] = self.height // 2
+        directions[0] = Directions.ANT_DOWN
+        self.place(xs, ys, directions)
+
+    def place(self, xs, ys, directions, states=None):
+        # puts the ants on the grid (the number of ants can change)
+        xs = np.asarray(xs, dtype=np.int64) % self.width
+        ys = np.asarray(ys, dtype=np.int64) % self.height
+        directions = np.asarray(directions, dtype=np.int64) % 4
+        states = np.zeros(len(xs), dtype=np.int64) if states is None else np.asarray(states, dtype=np.int64)
+        if not len(xs) == len(ys) == len(directions) == len(states) or len(xs) < 1:
+            raise ValueError("Every ant needs a position and a direction")
+        if states.min() < 0 or states.max() >= self.compiled.states:
+            raise ValueError("Ant state out of range")
+
+        self.ant_count = len(xs)
+        self._xs = xs
+        self._ys = ys
+        self._keys = (states * 4 + directions) * self.compiled.colors
+        self._update_first_ant()
+
+    def step(self, n: int = 1):
+        if self._pending_fills:
+            self._materialize()
+
+        grid = self._grid.reshape(-1)
+        step_write = self._step_write
+        step_next_key = self._step_next_key
+        width = self.width
+        height = self.height
+        ants = np.arange(self.ant_count)
+
+        # the ant that wrote its index to a cell last, the ants sharing a cell are found without sorting
+        owners = self._owners
+
+        for _ in range(n):
+            cells = self._ys * width + self._xs
+            owners[cells] = ants
+
+            if np.array_equal(owners[cells], ants):
+                self._step_ants(grid, cells, slice(None), step_write, step_next_key)
+            else:
+                rank = self._cell_ranks(cells)
+                for r in range(int(rank.max()) + 1):
+                    self._step_ants(grid, cells, np.nonzero(rank == r)[0], step_write, step_next_key)
+
+            self._xs = (self._xs + self._key_dx[self._keys]) % width
+            self._ys = (self._ys + self._key_dy[self._keys]) % height
+
+        self.steps += n
+        self._update_first_ant()
+
+    def step_back(self, n: int = 1):
+        # the ticks undone in the reverse order: all the ants move back, then the ants sharing a cell
+        # undo their steps from the highest index
+        self._check_step_back(n)
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        grid = self._grid.reshape(-1)
+        step_back_write = np.asarray(compiled.step_back_write, dtype=np.uint8)
+        step_back_key = np.asarray(compiled.step_back_key, dtype=np.int64)
+        width = self.width
+        height = self.height
+        ants = np.arange(self.ant_count)
+        owners = self._owners
+
+        for _ in range(n):
+            self._xs = (self._xs - self._key_dx[self._keys]) % width
+            self._ys = (self._ys - self._key_dy[self._keys]) % height
+            cells = self._ys * width + self._xs
+            owners[cells] = ants
+
+            if np.array_equal(owners[cells], ants):
+                self._step_ants(grid, cells, slice(None), step_back_write, step_back_key)
+            else:
+                rank = self._cell_ranks(cells[::-1])[::-1]
+                for r in range(int(rank.max()) + 1):
+                    self._step_ants(grid, cells, np.nonzero(rank == r)[0], step_back_write, step_back_key)
+
+        self.steps -= n
+        self._update_first_ant()
+
+    def _step_ants(self, grid: np.ndarray, cells: np.ndarray, ants, step_write: np.ndarray,
+                   step_next_key: np.ndarray):
+        # the ants given are on distinct cells
+        cells = cells[ants]
+        keys = self._keys[ants] + grid[cells]
+        grid[cells] = step_write[keys]
+        self._keys[ants] = step_next_key[keys]
+
+    @staticmethod
+    def _cell_ranks(cells: np.ndarray) -> np.ndarray:
+        # rank of every ant among the ants on its cell (in the index order)
+        ants = np.arange(len(cells))
+        order = np.argsort(cells, kind="stable")
+        sorted_cells = cells[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_cells[1:] != sorted_cells[:-1]
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = ants - np.maximum.accumulate(np.where(first, ants, 0))
+        return rank
+
+    def _update_first_ant(self):
+        self.x = int(self._xs[0])
+        self.y = int(self._ys[0])
+        self.direction = self.compiled.key_direction(int(self._keys[0]))
+        self.state = self.compiled.key_state(int(self._keys[0]))
+
+    @staticmethod
+    def _read_only(array: np.ndarray) -> np.ndarray:
+        view = array.view()
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,331 @@
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import CompiledRules, Directions, compile_rules
+from Classes.ZobristHash import ZobristHash
+
+_BAND_BYTES = 1 << 24               # packed bytes unpacked / counted at once
+
+# set bits of every byte value, for numpy without bitwise_count
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1, dtype=np.uint8)
+
+
+class PackedAntEngine(AntEngine):
+    """
+    AntEngine of the two-colour rules keeping 8 cells per byte.
+
+    A row is packed into ceil(width / 8) bytes, the most significant bit first (the layout
+    of the 1-bit snapshot rows), a step flips the bit of its cell in place. The rows are
+    kept 4-byte aligned (the scan lines of a 1-bit QImage), the padding stays clear. A 100k x 100k
+    grid takes 1.25 GB instead of 10 GB. The cells are unpacked only when they are read:
+    grid_view reads the packed rows as a grid (PackedGrid, only the cells read are unpacked),
+    rows() unpacks just the rows asked for (exports of the big grids) and grid unpacks a new
+    byte per cell copy of the whole grid (small grids only).
+    """
+
+    def __init__(self, rules: str | CompiledRules, width: int, height: int):
+        self.row_bytes = -(-width // 8)
+        super().__init__(rules, width, height)
+
+    def _allocate(self):
+        stride = -(-self.width // 32) * 4
+        self._bits = bytearray(stride * self.height)
+        self._rows = np.frombuffer(self._bits, dtype=np.uint8).reshape(self.height, stride)
+        self._packed = self._rows[:, :self.row_bytes]
+
+        # byte offset of every row and byte, bit (by the byte value) and mask of every column, for the stepping loop
+        self._row_start = [y * stride for y in range(self.height)]
+        self._byte_x = [x >> 3 for x in range(self.width)]
+        bit_tables = [[value >> (7 - shift) & 1 for value in range(256)] for shift in range(8)]
+        self._bit_x = [bit_tables[x & 7] for x in range(self.width)]
+        self._mask_x = [0x80 >> (x & 7) for x in range(self.width)]
+        self._no_mask_x = [0] * self.width
+
+    @property
+    def packed(self) -> np.ndarray:
+        # read-only view of the packed rows, uint8 shape (height, row_bytes)
+        self._materialize()
+        view = self._packed.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def memory(self) -> int:
+        # bytes of the packed rows
+        return len(self._bits)
+
+    @property
+    def grid(self) -> np.ndarray:
+        # a byte per cell copy, unpacked band by band
+        grid = np.empty((self.height, self.width), dtype=np.uint8)
+        band_rows = max(1, _BAND_BYTES // self.row_bytes)
+        for top in range(0, self.height, band_rows):
+            grid[top:top + band_rows] = self.rows(top, top + band_rows)
+        grid.flags.writeable = False
+        return grid
+
+    @property
+    def grid_view(self) -> "PackedGrid":
+        # the aligned rows (with their padding), contiguous for an image of them
+        self._materialize()
+        rows = self._rows.view()
+        rows.flags.writeable = False
+        return PackedGrid(rows, self.width)
+
+    @property
+    def cells(self) -> memoryview:
+        return memoryview(self.grid).cast("B")
+
+    def rows(self, top: int, bottom: int) -> np.ndarray:
+        self._materialize()
+        return np.unpackbits(self._packed[top:bottom], axis=1, count=self.width)
+
+    def colors_at(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.grid_view[ys, xs]
+
+    def population(self) -> int:
+        # popcount of the packed bytes, band by band (the padding bits of the rows are never set)
+        self._materialize()
+        flat = self._rows.reshape(-1)
+        count = 0
+        for start in range(0, len(flat), _BAND_BYTES):
+            band = flat[start:start + _BAND_BYTES]
+            if hasattr(np, "bitwise_count"):
+                count += int(np.bitwise_count(band).sum(dtype=np.int64))
+            else:
+                count += int(_POPCOUNT[band].sum(dtype=np.int64))
+        return count
+
+    def copy(self) -> "PackedAntEngine":
+        engine = PackedAntEngine(self.compiled, self.width, self.height)
+        engine.restore_packed(self.packed, self.x, self.y, self.direction, self.state, self.steps)
+        return engine
+
+    def restore(self, grid: np.ndarray, x: int, y: int, direction: int, state: int, steps: int):
+        if grid.shape != (self.height, self.width):
+            raise ValueError(f"Grid size {grid.shape[1]}x{grid.shape[0]} does not match {self.width}x{self.height}")
+        band_rows = max(1, _BAND_BYTES // self.width)
+        packed = np.empty((self.height, self.row_bytes), dtype=np.uint8)
+        for top in range(0, self.height, band_rows):
+            packed[top:top + band_rows] = np.packbits(grid[top:top + band_rows] != 0, axis=1)
+        self.restore_packed(packed, x, y, direction, state, steps)
+
+    def restore_packed(self, packed: np.ndarray, x: int, y: int, direction: int, state: int, steps: int):
+        # the same as restore() with the rows already packed (e.g. the rows of a 1-bit snapshot)
+        if packed.shape != self._packed.shape:
+            raise ValueError(f"Packed rows {packed.shape} do not match {self._packed.shape}")
+        self._pending_fills.clear()
+        self._packed[:] = packed
+        if self.width % 8:
+            # the padding bits stay clear for the population count
+            self._packed[:, -1] &= (0xFF << (8 - self.width % 8)) & 0xFF
+        self._restore_ant(x, y, direction, state, steps)
+
+    def map_packed(self, path: str, offset: int, x: int, y: int, direction: int, state: int, steps: int):
+        # map_cells() of the packed rows (those of a 1-bit snapshot), the rows of the file have no padding,
+        # so the width has to be a multiple of 32
+        if self.row_bytes % 4:
+            raise ValueError(f"Packed rows of width {self.width} can not be mapped, it is not a multiple of 32")
+        rows = np.asarray(np.memmap(path, dtype=np.uint8, mode="c", offset=offset,
+                                    shape=(self.height, self.row_bytes)))
+        self._pending_fills.clear()
+        self._bits = memoryview(rows).cast("B")
+        self._rows = rows
+        self._packed = rows
+        self._restore_ant(x, y, direction, state, steps)
+
+    def set_rules(self, rules: str | CompiledRules):
+        if not isinstance(rules, CompiledRules):
+            rules = compile_rules(rules)
+        if rules.colors > 2:
+            raise ValueError(f"Packed grid needs two colours, the rules have {rules.colors}")
+        super().set_rules(rules)
+        # the loop flips the cell (xor with the mask of its column) when the written color differs from the read one
+        self._flips = [self._mask_x if write != k % rules.colors else self._no_mask_x
+                       for k, write in enumerate(rules.step_write)]
+        self._back_flips = [self._mask_x if write != k % rules.colors else self._no_mask_x
+                            for k, write in enumerate(rules.step_back_write)]
+
+    def reset(self):
+        self.x = self.width // 2
+        self.y = self.height // 2
+        self.direction = Directions.ANT_DOWN
+        self.state = 0
+        self.steps = 0
+
+        self._pending_fills.clear()
+        self._packed.fill(0)
+
+    def _materialize(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        written = []
+        while self._pending_fills:
+            written.append(self._pending_fills.pop(0)(_PackedCells(self._packed)))
+        return written
+
+    def step(self, n: int = 1):
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        flips = self._flips
+        next_x = self._next_x
+        next_y = self._next_y
+        row_start = self._row_start
+        byte_x = self._byte_x
+        bit_x = self._bit_x
+        bits = self._bits
+        x = self.x
+        y = self.y
+        direction = self.direction
+        key = compiled.key(self.state, direction)
+
+        for _ in range(n):
+            i = row_start[y] + byte_x[x]
+            k = key + bit_x[x][bits[i]]
+            bits[i] ^= flips[k][x]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x = next_x[direction][x]
+            y = next_y[direction][y]
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+
+    def step_back(self, n: int = 1):
+        self._check_step_back(n)
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_back_direction = compiled.step_back_direction
+        step_back_key = compiled.step_back_key
+        flips = self._back_flips
+        next_x = self._next_x
+        next_y = self._next_y
+        row_start = self._row_start
+        byte_x = self._byte_x
+        bit_x = self._bit_x
+        bits = self._bits
+        x = self.x
+        y = self.y
+        direction = int(self.direction)
+        key = compiled.key(self.state, direction)
+
+        for _ in range(n):
+            x = next_x[direction ^ 2][x]
+            y = next_y[direction ^ 2][y]
+            i = row_start[y] + byte_x[x]
+            k = key + bit_x[x][bits[i]]
+            bits[i] ^= flips[k][x]
+            key = step_back_key[k]
+            direction = step_back_direction[k]
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps -= n
+
+    def trace(self, n: int) -> np.ndarray:
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        flips = self._flips
+        next_x = self._next_x
+        next_y = self._next_y
+        row_start = self._row_start
+        byte_x = self._byte_x
+        bit_x = self._bit_x
+        bits = self._bits
+        x = self.x
+        y = self.y
+        direction = self.direction
+        key = compiled.key(self.state, direction)
+        keys = np.zeros(n, dtype=np.int32)
+        recorded = memoryview(keys)
+
+        for t in range(n):
+            i = row_start[y] + byte_x[x]
+            k = key + bit_x[x][bits[i]]
+            recorded[t] = k
+            bits[i] ^= flips[k][x]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x = next_x[direction][x]
+            y = next_y[direction][y]
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+        return keys
+
+    def trace_hashes(self, n: int, zobrist: ZobristHash, grid_hash: int) -> tuple[np.ndarray, int]:
+        x = self.x
+        y = self.y
+        return self.hashes_of_trace(self.trace(n), x, y, zobrist, grid_hash)
+
+
+class PackedGrid:
+    """
+    Cells of the packed rows read like a uint8 grid (grid[y, x]) without unpacking the rest:
+    grid[ys, xs] with index arrays gathers the cells, slices unpack the cells of the rows and
+    columns asked for, np.asarray() unpacks everything.
+    """
+
+    def __init__(self, packed: np.ndarray, width: int):
+        self.packed = packed            # uint8 (height, at least ceil(width / 8)), the most significant bit first
+        self.shape = (packed.shape[0], width)
+        self.dtype = np.dtype(np.uint8)
+        self.ndim = 2
+
+    def __getitem__(self, index) -> np.ndarray:
+        ys, xs = index if isinstance(index, tuple) else (index, slice(None))
+        if isinstance(ys, slice) and isinstance(xs, slice):
+            start, stop, step = xs.indices(self.shape[1])
+            if step != 1:
+                return self[ys, :][:, xs]
+            stop = max(start, stop)
+            first = start >> 3
+            cells = np.unpackbits(self.packed[ys, first:-(-stop // 8)], axis=1)
+            return cells[:, start - 8 * first:stop - 8 * first]
+        xs = np.asarray(xs)
+        return (self.packed[ys, xs >> 3] >> (7 - (xs & 7)).astype(np.uint8)) & 1
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        cells = np.unpackbits(self.packed, axis=1, count=self.shape[1])
+        return cells if dtype is None else cells.astype(dtype)
+
+
+class _PackedCells(PackedGrid):
+    """grid[ys, xs] reads and writes of the deferred fills on the packed rows."""
+
+    def __init__(self, packed: np.ndarray):
+        super().__init__(packed, packed.shape[1] * 8)
+
+    def __setitem__(self, index: tuple[np.ndarray, np.ndarray], colors):
+        ys, xs = np.broadcast_arrays(*index)
+        colors = np.broadcast_to(np.asarray(colors) != 0, xs.shape)
+        columns = xs >> 3
+        masks = (0x80 >> (xs & 7)).astype(np.uint8)
+        # several cells can share a byte, ufunc.at applies all of them
+        np.bitwise_or.at(self.packed, (ys[colors], columns[colors]), masks[colors])
+        np.bitwise_and.at(self.packed, (ys[~colors], columns[~colors]), ~masks[~colors])
+
+
+def create_engine(rules: str | CompiledRules, width: int, height: int) -> AntEngine:
+    # the packed grid for the two-colour rules, a byte per cell otherwise
+    if not isinstance(rules, CompiledRules):
+        rules = compile_rules(rules)
+    if rules.colors <= 2:
+        return PackedAntEngine(rules, width, height)
+    return AntEngine(rules, width, height)
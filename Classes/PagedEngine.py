@@ -0,0 +1,421 @@
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import CompiledRules, DIRECTION_DX, DIRECTION_DY, Directions
+from Classes.ZobristHash import ZobristHash
+
+
+class PagedAntEngine(AntEngine):
+    """
+    AntEngine with the grid in a memory-mapped file, for the grids larger than the memory.
+
+    The file keeps the grid in tile_size x tile_size tiles, every tile a contiguous block
+    (tile-major order). The ant steps in a bytearray copy of its tile, a bounded LRU cache
+    keeps the cache_tiles recently visited tiles in memory and the evicted ones are written
+    back to the file. When the ant enters a tile, the next tile in its direction is
+    prefetched (madvise(MADV_WILLNEED) asks the OS to read it ahead without waiting), so the
+    memory used is the cache and whatever the OS keeps of the file.
+
+    Without a path the file is a temporary one, deleted by close().
+    """
+
+    def __init__(self, rules: str | CompiledRules, width: int, height: int, path: str | None = None,
+                 tile_size: int = 256, cache_tiles: int = 64):
+        if tile_size < 64 or tile_size & (tile_size - 1):
+            raise ValueError("Tile size must be a power of two of at least 64")
+        if width % tile_size or height % tile_size:
+            raise ValueError(f"Grid size must be a multiple of the tile size {tile_size}")
+        if cache_tiles < 1:
+            raise ValueError("At least 1 cached tile is needed")
+
+        self.tile_size = tile_size
+        self.cache_tiles = cache_tiles
+        self.tiles_x = width // tile_size
+        self.tiles_y = height // tile_size
+        self._temporary = path is None
+        if path is None:
+            descriptor, path = tempfile.mkstemp(suffix=".grid")
+            os.close(descriptor)
+        self.path = path
+        self._file = open(path, "w+b")
+        self._map: mmap.mmap | None = None
+
+        # tile index -> cells of the tile (bytearray, cell [y, x] at y * tile_size + x), the least recently used first
+        self._cache: OrderedDict[int, bytearray] = OrderedDict()
+        self._dirty: set[int] = set()
+
+        # cache statistics
+        self.tile_hits = 0
+        self.tile_misses = 0
+
+        super().__init__(rules, width, height)
+
+    def _allocate(self):
+        # a sparse file of zeros, the OS gives the pages out as they are touched
+        self._file.truncate(0)
+        self._file.truncate(self.width * self.height)
+        self._map = mmap.mmap(self._file.fileno(), self.width * self.height)
+        self._tiles = np.frombuffer(self._map, dtype=np.uint8).reshape(self.tiles_y, self.tiles_x,
+                                                                        self.tile_size, self.tile_size)
+        self._grid = None
+
+    def close(self):
+        # the memory map is released, a temporary file is deleted
+        if self._map is None:
+            return
+        self._tiles = None
+        self._cache.clear()
+        self._dirty.clear()
+        self._map.close()
+        self._map = None
+        self._file.close()
+        if self._temporary:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def memory(self) -> int:
+        # bytes of the cached tiles (the pages of the file are up to the OS)
+        return len(self._cache) * self.tile_size * self.tile_size
+
+    @property
+    def grid(self) -> np.ndarray:
+        # a copy of the whole grid, rows() reads a part of it
+        grid = self.rows(0, self.height)
+        grid.flags.writeable = False
+        return grid
+
+    @property
+    def cells(self) -> memoryview:
+        return memoryview(self.grid).cast("B")
+
+    def rows(self, top: int, bottom: int) -> np.ndarray:
+        self._materialize()
+        self.flush()
+        tile = self.tile_size
+        top = max(0, top)
+        bottom = min(bottom, self.height)
+        first = top // tile
+        band = self._tiles[first:-(-bottom // tile)].transpose(0, 2, 1, 3).reshape(-1, self.width)
+        return band[top - first * tile:bottom - first * tile]
+
+    def colors_at(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        self._materialize()
+        self.flush()
+        return _PagedCells(self._tiles)[ys, xs]
+
+    def restore(self, grid: np.ndarray, x: int, y: int, direction: int, state: int, steps: int):
+        if grid.shape != (self.height, self.width):
+            raise ValueError(f"Grid size {grid.shape[1]}x{grid.shape[0]} does not match {self.width}x{self.height}")
+        self._pending_fills.clear()
+        self._cache.clear()
+        self._dirty.clear()
+        tile = self.tile_size
+        for tile_y in range(self.tiles_y):
+            rows = np.asarray(grid[tile_y * tile:(tile_y + 1) * tile])
+            self._tiles[tile_y] = rows.reshape(tile, self.tiles_x, tile).transpose(1, 0, 2)
+        self.x = int(x)
+        self.y = int(y)
+        self.direction = Directions(int(direction))
+        self.state = int(state)
+        self.steps = int(steps)
+
+    def reset(self):
+        self.x = self.width // 2
+        self.y = self.height // 2
+        self.direction = Directions.ANT_DOWN
+        self.state = 0
+        self.steps = 0
+
+        self._pending_fills.clear()
+        self._cache.clear()
+        self._dirty.clear()
+        # a new sparse file instead of writing zeros over all of it
+        self._tiles = None
+        self._map.close()
+        self._allocate()
+
+    def flush(self):
+        # the cached tiles changed since they were read are written to the file (they stay cached)
+        for index in self._dirty:
+            self._write_back(index, self._cache[index])
+        self._dirty.clear()
+
+    def sync(self):
+        # flush() and the file written to the disk
+        self.flush()
+        self._map.flush()
+
+    def _write_back(self, index: int, cells: bytearray):
+        tile = self.tile_size
+        self._tiles[index // self.tiles_x, index % self.tiles_x] = \
+            np.frombuffer(cells, dtype=np.uint8).reshape(tile, tile)
+
+    def _load(self, index: int, direction: int) -> bytearray:
+        # a tile missing in the cache read from the file (the ant enters it heading in the direction)
+        self.tile_misses += 1
+        tile_y, tile_x = divmod(index, self.tiles_x)
+        cells = bytearray(self._tiles[tile_y, tile_x])
+        cache = self._cache
+        cache[index] = cells
+        if len(cache) > self.cache_tiles:
+            evicted, evicted_cells = cache.popitem(last=False)
+            if evicted in self._dirty:
+                self._dirty.discard(evicted)
+                self._write_back(evicted, evicted_cells)
+
+        # the ant is likely to go on into new tiles, the next one is asked for ahead
+        self._prefetch((tile_x + DIRECTION_DX[direction]) % self.tiles_x,
+                       (tile_y + DIRECTION_DY[direction]) % self.tiles_y)
+        return cells
+
+    def _prefetch(self, tile_x: int, tile_y: int):
+        # the OS starts reading the tile in the background (only where madvise is available)
+        index = tile_y * self.tiles_x + tile_x
+        if index not in self._cache and hasattr(mmap, "MADV_WILLNEED"):
+            size = self.tile_size * self.tile_size
+            self._map.madvise(mmap.MADV_WILLNEED, index * size, size)
+
+    def _materialize(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        written = []
+        if self._pending_fills:
+            # the fills write into the file, the cached tiles are read again
+            self.flush()
+            self._cache.clear()
+        while self._pending_fills:
+            written.append(self._pending_fills.pop(0)(_PagedCells(self._tiles)))
+        return written
+
+    def step(self, n: int = 1):
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        dx = DIRECTION_DX
+        dy = DIRECTION_DY
+        tile = self.tile_size
+        inside = tile - 1
+        outside = -tile                 # bits set for the coordinates outside of a tile
+        tiles_x = self.tiles_x
+        cache = self._cache
+        touch = cache.move_to_end
+        mark_dirty = self._dirty.add
+        hits = 0
+        x = self.x
+        y = self.y
+        direction = int(self.direction)
+        key = compiled.key(self.state, direction)
+
+        done = 0
+        while done < n:
+            # the tile of the ant, looked up here (a chaotic ant crosses the tile edges often)
+            left_x = x - (x & inside)
+            top_y = y - (y & inside)
+            index = (top_y // tile) * tiles_x + left_x // tile
+            cells = cache.get(index)
+            if cells is None:
+                cells = self._load(index, direction)
+            else:
+                touch(index)
+                hits += 1
+            mark_dirty(index)
+            x -= left_x
+            y -= top_y
+
+            # the steps inside of the tile, the loop is the same as the one of AntEngine
+            left = n - done
+            taken = left
+            for t in range(left):
+                i = y * tile + x
+                k = key + cells[i]
+                cells[i] = step_write[k]
+                key = step_next_key[k]
+                direction = step_direction[k]
+                x += dx[direction]
+                y += dy[direction]
+                if (x | y) & outside:
+                    taken = t + 1
+                    break
+
+            done += taken
+            x = (x + left_x) % self.width
+            y = (y + top_y) % self.height
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+        self.tile_hits += hits
+
+    def step_back(self, n: int = 1):
+        self._check_step_back(n)
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_back_write = compiled.step_back_write
+        step_back_direction = compiled.step_back_direction
+        step_back_key = compiled.step_back_key
+        dx = DIRECTION_DX
+        dy = DIRECTION_DY
+        tile = self.tile_size
+        inside = tile - 1
+        outside = -tile
+        tiles_x = self.tiles_x
+        cache = self._cache
+        touch = cache.move_to_end
+        mark_dirty = self._dirty.add
+        hits = 0
+        direction = int(self.direction)
+        key = compiled.key(self.state, direction)
+        # the cell of the last step, the ant moves back before every step
+        x = (self.x - dx[direction]) % self.width
+        y = (self.y - dy[direction]) % self.height
+
+        done = 0
+        while done < n:
+            left_x = x - (x & inside)
+            top_y = y - (y & inside)
+            index = (top_y // tile) * tiles_x + left_x // tile
+            cells = cache.get(index)
+            if cells is None:
+                cells = self._load(index, direction ^ 2)
+            else:
+                touch(index)
+                hits += 1
+            mark_dirty(index)
+            x -= left_x
+            y -= top_y
+
+            left = n - done
+            taken = left
+            for t in range(left):
+                i = y * tile + x
+                k = key + cells[i]
+                cells[i] = step_back_write[k]
+                key = step_back_key[k]
+                direction = step_back_direction[k]
+                x -= dx[direction]
+                y -= dy[direction]
+                if (x | y) & outside:
+                    taken = t + 1
+                    break
+
+            done += taken
+            x = (x + left_x) % self.width
+            y = (y + top_y) % self.height
+
+        # the ant stays on the cell of the last undone step
+        self.x = (x + dx[direction]) % self.width
+        self.y = (y + dy[direction]) % self.height
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps -= n
+        self.tile_hits += hits
+
+    def trace(self, n: int) -> np.ndarray:
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        dx = DIRECTION_DX
+        dy = DIRECTION_DY
+        tile = self.tile_size
+        inside = tile - 1
+        outside = -tile
+        tiles_x = self.tiles_x
+        cache = self._cache
+        touch = cache.move_to_end
+        mark_dirty = self._dirty.add
+        hits = 0
+        x = self.x
+        y = self.y
+        direction = int(self.direction)
+        key = compiled.key(self.state, direction)
+        keys = np.zeros(n, dtype=np.int32)
+        recorded = memoryview(keys)
+
+        done = 0
+        while done < n:
+            # the tile of the ant, looked up here (a chaotic ant crosses the tile edges often)
+            left_x = x - (x & inside)
+            top_y = y - (y & inside)
+            index = (top_y // tile) * tiles_x + left_x // tile
+            cells = cache.get(index)
+            if cells is None:
+                cells = self._load(index, direction)
+            else:
+                touch(index)
+                hits += 1
+            mark_dirty(index)
+            x -= left_x
+            y -= top_y
+
+            left = n - done
+            taken = left
+            for t in range(done, n):
+                i = y * tile + x
+                k = key + cells[i]
+                recorded[t] = k
+                cells[i] = step_write[k]
+                key = step_next_key[k]
+                direction = step_direction[k]
+                x += dx[direction]
+                y += dy[direction]
+                if (x | y) & outside:
+                    taken = t + 1 - done
+                    break
+
+            done += taken
+            x = (x + left_x) % self.width
+            y = (y + top_y) % self.height
+
+        self.x = x
+        self.y = y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+        self.tile_hits += hits
+        return keys
+
+    def trace_hashes(self, n: int, zobrist: ZobristHash, grid_hash: int) -> tuple[np.ndarray, int]:
+        x = self.x
+        y = self.y
+        return self.hashes_of_trace(self.trace(n), x, y, zobrist, grid_hash)
+
+
+class _PagedCells:
+    """grid[ys, xs] reads and writes of the deferred fills on the tiles of the file."""
+
+    def __init__(self, tiles: np.ndarray):
+        self._tiles = tiles
+        tiles_y, tiles_x, tile, _ = tiles.shape
+        self.shape = (tiles_y * tile, tiles_x * tile)
+
+    def _index(self, index: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarray, ...]:
+        ys, xs = (np.asarray(coordinates) for coordinates in index)
+        tile = self._tiles.shape[2]
+        return ys // tile, xs // tile, ys % tile, xs % tile
+
+    def __getitem__(self, index: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+        return self._tiles[self._index(index)]
+
+    def __setitem__(self, index: tuple[np.ndarray, np.ndarray], colors):
+        self._tiles[self._index(index)] = colors
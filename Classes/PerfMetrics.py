@@ -0,0 +1,144 @@
+import csv
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+# phases timed by the GUI, the worker and the headless runner
+PHASE_STEP = "step"                     # stepping of a frame / chunk (ant_loop)
+PHASE_PUBLISH = "publish"               # snapshot of the worker (dirty tiles)
+PHASE_REPAINT = "repaint"               # ant_repaint_grid() on the GUI thread
+PHASE_LABEL = "label"                   # the step count label text
+PHASE_PAINT = "paint"                   # GridCanvas.paintEvent
+PHASE_CHECKPOINT = "checkpoint"         # snapshots saved by the headless runner
+TIMER_LATENESS = "timer_lateness"       # repaint timer ticks later than its period
+FRAME_LATENESS = "frame_lateness"       # worker frames starting later than planned
+
+
+class PerfMetrics:
+    """
+    Low overhead timers of the phases of the simulation, steps/s and their time series.
+
+    Disabled, start() only checks a flag and returns None, stop() of None returns at once,
+    so the timers can stay in the code. Enabled, every sample_every-th call of a phase is
+    timed and the last window durations of every phase are kept for the percentiles.
+    sample() adds a row of the summary to the time series (at most every interval
+    seconds), export() writes the rows as CSV or JSON.
+
+    The worker and the GUI thread time different phases, a deque append is atomic, so no
+    lock is needed.
+    """
+
+    def __init__(self, enabled: bool = False, sample_every: int = 1, window: int = 512, interval: float = 1.0):
+        self.enabled = enabled
+        self.sample_every = sample_every
+        self.window = window
+        self.interval = interval
+        self.rows: list[dict] = []
+        self.reset()
+
+    def reset(self):
+        self._calls: dict[str, int] = {}
+        self._durations: dict[str, deque] = {}
+        self._started = time.perf_counter()
+        self._steps = 0
+        self._sample_time = self._started
+        self._sample_steps = 0
+        self.rows = []
+
+    def start(self, phase: str) -> float | None:
+        if not self.enabled:
+            return None
+        calls = self._calls.get(phase, 0) + 1
+        self._calls[phase] = calls
+        if calls % self.sample_every:
+            return None
+        return time.perf_counter()
+
+    def stop(self, phase: str, started: float | None):
+        if started is not None:
+            self.add(phase, time.perf_counter() - started)
+
+    def add(self, phase: str, seconds: float):
+        # a duration measured by the caller (e.g. a lateness)
+        durations = self._durations.get(phase)
+        if durations is None:
+            durations = self._durations[phase] = deque(maxlen=self.window)
+        durations.append(seconds)
+
+    def count_steps(self, steps: int):
+        if self.enabled:
+            self._steps += steps
+
+    @property
+    def phases(self) -> list[str]:
+        return list(self._durations)
+
+    def percentiles(self, phase: str, percents: tuple[float, ...] = (50, 95, 99)) -> list[float] | None:
+        # [s] of the last window durations, None before the first one
+        durations = self._durations.get(phase)
+        if not durations:
+            return None
+        return np.percentile(np.fromiter(durations, dtype=float), percents).tolist()
+
+    def sample(self, memory_per_cell: float | None = None, force: bool = False) -> dict | None:
+        """Adds a row to the time series when interval passed since the last one (or forced), returns it."""
+        now = time.perf_counter()
+        if not self.enabled or (not force and now - self._sample_time < self.interval):
+            return None
+
+        elapsed = now - self._sample_time
+        row = {
+            "time": round(now - self._started, 3),
+            "steps": self._steps,
+            "steps_per_second": (self._steps - self._sample_steps) / elapsed if elapsed > 0 else 0.0,
+        }
+        for phase in self.phases:
+            p50, p95, p99 = self.percentiles(phase)
+            row[f"{phase}_p50_ms"] = 1000 * p50
+            row[f"{phase}_p95_ms"] = 1000 * p95
+            row[f"{phase}_p99_ms"] = 1000 * p99
+        if memory_per_cell is not None:
+            row["memory_per_cell"] = memory_per_cell
+
+        self._sample_time = now
+        self._sample_steps = self._steps
+        self.rows.append(row)
+        return row
+
+    def export(self, path: str):
+        # JSON for a .json path, CSV otherwise (the columns of all the rows)
+        if path.endswith(".json"):
+            with open(path, "w") as file:
+                json.dump(self.rows, file, indent=1)
+            return
+
+        columns = list(dict.fromkeys(column for row in self.rows for column in row))
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+def overlay_lines(row: dict) -> list[str]:
+    # the row of sample() as the text lines of the canvas overlay
+    lines = [f"{row['steps_per_second']:,.0f} steps/s"]
+    for phase in (PHASE_STEP, PHASE_PUBLISH, PHASE_REPAINT, PHASE_LABEL, PHASE_PAINT, TIMER_LATENESS, FRAME_LATENESS):
+        if f"{phase}_p50_ms" in row:
+            lines.append(f"{phase}: {row[f'{phase}_p50_ms']:.2f} / {row[f'{phase}_p95_ms']:.2f} / "
+                         f"{row[f'{phase}_p99_ms']:.2f} ms")
+    if "memory_per_cell" in row:
+        lines.append(f"memory: {row['memory_per_cell']:.3g} B/cell")
+    return lines
+
+
+def memory_per_cell(engine) -> float | None:
+    # bytes of the cell storage per grid cell (per cell of the allocated tiles range of the unbounded grid)
+    if hasattr(engine, "width"):
+        return engine.memory / (engine.width * engine.height)
+    bounds = engine.tile_bounds
+    if bounds is None:
+        return None
+    min_x, min_y, max_x, max_y = bounds
+    return engine.memory / ((max_x - min_x + 1) * (max_y - min_y + 1) * engine.tile_size * engine.tile_size)
@@ -0,0 +1,83 @@
+from typing import BinaryIO, Callable
+
+import numpy as np
+
+from Classes.PngWriter import BAND_BYTES, write_png_rows
+
+Rows = Callable[[int, int], np.ndarray]     # rows(top, bottom) -> cells, uint8 shape (rows, width)
+
+
+def visited_bounds(width: int, height: int, rows: Rows,
+                   band_rows: int | None = None) -> tuple[int, int, int, int] | None:
+    """(left, top, right, bottom) of the cells with a non zero color (right and bottom exclusive), None without them."""
+    band_rows = band_rows or max(1, BAND_BYTES // width)
+    columns = np.zeros(width, dtype=bool)
+    top = bottom = None
+    for first in range(0, height, band_rows):
+        band = rows(first, min(first + band_rows, height))
+        visited_rows = np.flatnonzero(band.any(axis=1))
+        if not len(visited_rows):
+            continue
+        if top is None:
+            top = first + int(visited_rows[0])
+        bottom = first + int(visited_rows[-1]) + 1
+        columns |= band.any(axis=0)
+    if top is None:
+        return None
+    visited_columns = np.flatnonzero(columns)
+    return int(visited_columns[0]), top, int(visited_columns[-1]) + 1, bottom
+
+
+def block_mean(image: np.ndarray, factor: int) -> np.ndarray:
+    # mean of every factor x factor block (the blocks of the last row and column may be smaller)
+    height, width = image.shape[:2]
+    sums = np.add.reduceat(image.astype(np.uint32), np.arange(0, height, factor), axis=0)
+    sums = np.add.reduceat(sums, np.arange(0, width, factor), axis=1)
+    counts = np.outer(np.diff(np.append(np.arange(0, height, factor), height)),
+                      np.diff(np.append(np.arange(0, width, factor), width)))
+    if image.ndim == 3:
+        counts = counts[..., None]
+    return ((sums + counts // 2) // counts).astype(np.uint8)
+
+
+def export_png(file: str | BinaryIO, width: int, height: int, rows: Rows, palette: np.ndarray, scale: int = 1,
+               crop: bool = False, downsample: int = 1, max_size: int | None = None) -> tuple[int, int]:
+    """
+    Writes the grid (cells of rows(top, bottom)) as PNG band by band, the memory does not
+    depend on the size of the grid. With crop, only the bounding box of the visited cells
+    is written (the grid is read twice). A downsampled image has a pixel of the mean color
+    of every downsample x downsample block of cells (RGB), for the previews of the grids
+    too large to be seen at a pixel per cell, max_size downsamples (more) until the longer
+    side of the image (before scaling) fits. Returns the size of the image.
+    """
+    if scale < 1 or downsample < 1:
+        raise ValueError("Scale and downsample must be at least 1")
+    palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+
+    left, top, right, bottom = 0, 0, width, height
+    if crop:
+        # an empty grid is written as its first cell
+        left, top, right, bottom = visited_bounds(width, height, rows) or (0, 0, 1, 1)
+        width, height = right - left, bottom - top
+
+        def cropped(first: int, last: int) -> np.ndarray:
+            return rows(top + first, top + last)[:, left:right]
+        cells = cropped
+    else:
+        cells = rows
+
+    if max_size is not None:
+        downsample = max(downsample, -(-max(width, height) // max_size))
+    if downsample == 1:
+        write_png_rows(file, width, height, cells, palette, scale)
+        return width * scale, height * scale
+
+    def preview(first: int, last: int) -> np.ndarray:
+        # the rows of the preview, downsample rows of cells each
+        return block_mean(palette[cells(first * downsample, min(last * downsample, height))], downsample)
+
+    preview_width, preview_height = -(-width // downsample), -(-height // downsample)
+    # the RGB sums of a band of cells (uint32) are about the size of a band of write_png_rows()
+    band_rows = max(1, BAND_BYTES // (12 * width * downsample))
+    write_png_rows(file, preview_width, preview_height, preview, None, scale, band_rows)
+    return preview_width * scale, preview_height * scale
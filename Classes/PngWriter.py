@@ -0,0 +1,178 @@
+import struct
+import zlib
+from typing import BinaryIO, Callable
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# color types of the IHDR chunk
+COLOR_TYPE_RGB = 2
+COLOR_TYPE_INDEXED = 3
+
+BAND_BYTES = 1 << 24                # pixel bytes of a band of write_png_rows()
+
+
+class PngWriter:
+    """
+    Streaming PNG writer using only zlib from the standard library.
+
+    Rows are compressed as they are written, so an image does not have to be in memory
+    at once. With a palette (up to 256 RGB colors) the rows are color indexes (uint8,
+    shape (rows, width)) and the PNG is indexed, without it the rows are RGB (shape
+    (rows, width, 3)).
+    """
+
+    def __init__(self, file: str | BinaryIO, width: int, height: int, palette: np.ndarray | None = None,
+                 compression_level: int = 6, chunk_size: int = 1 << 16):
+        if width < 1 or height < 1:
+            raise ValueError("Image size must be at least 1x1")
+        if palette is not None and not 1 <= len(palette) <= 256:
+            raise ValueError("Palette must have 1 to 256 colors")
+
+        self.width = width
+        self.height = height
+        self.palette = None if palette is None else np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        self.chunk_size = chunk_size                # IDAT chunks are written when this much data is compressed
+        self.rows_written = 0
+
+        self._own_file = isinstance(file, str)
+        self._file: BinaryIO = open(file, "wb") if self._own_file else file
+        self._compressor = zlib.compressobj(compression_level)
+        self._pending: list[bytes] = []
+        self._pending_size = 0
+
+        self._file.write(PNG_SIGNATURE)
+        self._write_header_chunks()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._own_file:
+            self._file.close()
+
+    def _write_header_chunks(self):
+        color_type = COLOR_TYPE_RGB if self.palette is None else COLOR_TYPE_INDEXED
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, color_type, 0, 0, 0))
+        if self.palette is not None:
+            self.write_chunk(b"PLTE", self.palette.tobytes())
+
+    def write_chunk(self, chunk_type: bytes, data: bytes):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def write_rows(self, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=np.uint8)
+        row_shape = (self.width,) if self.palette is not None else (self.width, 3)
+        if rows.shape[1:] != row_shape:
+            raise ValueError(f"Rows must have the shape (n, {', '.join(map(str, row_shape))})")
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError("More rows than the image height")
+
+        self._add(self._compressor.compress(filter_rows(rows)))
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"Only {self.rows_written} of {self.height} rows were written")
+
+        self._add(self._compressor.flush())
+        self._flush_chunks(force=True)
+        self.write_chunk(b"IEND", b"")
+        if self._own_file:
+            self._file.close()
+
+    def _add(self, data: bytes):
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        self._flush_chunks()
+
+    def _flush_chunks(self, force: bool = False):
+        if self._pending_size >= self.chunk_size or (force and self._pending_size):
+            self.write_chunk(b"IDAT", b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+
+class ApngWriter(PngWriter):
+    """
+    Animated PNG (APNG) writer, the frames are whole images written one by one.
+
+    The number of frames is not known until close(), so the file has to be seekable: the
+    animation control chunk is written with 0 frames and updated at the end. The first
+    frame is the IDAT image (shown by the viewers without APNG support), the next ones
+    are fdAT chunks.
+    """
+
+    def __init__(self, file: str | BinaryIO, width: int, height: int, fps: float, palette: np.ndarray | None = None,
+                 loops: int = 0, compression_level: int = 6):
+        super().__init__(file, width, height, palette, compression_level)
+        self.delay_ms = max(1, round(1000 / fps))
+        self.loops = loops                      # 0 = forever
+        self.frames = 0
+        self._sequence = 0                      # sequence number of the fcTL and fdAT chunks
+        self._compression_level = compression_level
+        self._control_offset = self._file.tell()
+        self.write_chunk(b"acTL", struct.pack(">II", 0, loops))
+
+    def write_frame(self, image: np.ndarray):
+        image = np.asarray(image, dtype=np.uint8)
+        shape = (self.height, self.width) if self.palette is not None else (self.height, self.width, 3)
+        if image.shape != shape:
+            raise ValueError(f"Frame must have the shape ({', '.join(map(str, shape))})")
+
+        # frame control: the whole image at (0, 0), no disposal, no blending
+        self.write_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._sequence, self.width, self.height, 0, 0,
+                                              self.delay_ms, 1000, 0, 0))
+        self._sequence += 1
+        data = zlib.compress(filter_rows(image), self._compression_level)
+        if self.frames == 0:
+            self.write_chunk(b"IDAT", data)
+        else:
+            self.write_chunk(b"fdAT", struct.pack(">I", self._sequence) + data)
+            self._sequence += 1
+        self.frames += 1
+
+    def close(self):
+        if self.frames == 0:
+            raise ValueError("No frame was written")
+        self.write_chunk(b"IEND", b"")
+        self._file.seek(self._control_offset)
+        self.write_chunk(b"acTL", struct.pack(">II", self.frames, self.loops))
+        self._file.seek(0, 2)
+        if self._own_file:
+            self._file.close()
+
+
+def filter_rows(rows: np.ndarray) -> bytes:
+    # every row starts with its filter type (0 = none)
+    filtered = np.zeros((len(rows), rows[0].size + 1 if len(rows) else 1), dtype=np.uint8)
+    filtered[:, 1:] = rows.reshape(len(rows), -1)
+    return filtered.tobytes()
+
+
+def write_png(file: str | BinaryIO, image: np.ndarray, palette: np.ndarray | None = None, scale: int = 1,
+              band_rows: int | None = None):
+    """Writes a whole image (color indexes with a palette, RGB without), each pixel scaled to scale x scale."""
+    height, width = image.shape[:2]
+    write_png_rows(file, width, height, lambda top, bottom: image[top:bottom], palette, scale, band_rows)
+
+
+def write_png_rows(file: str | BinaryIO, width: int, height: int, rows: Callable[[int, int], np.ndarray],
+                   palette: np.ndarray | None = None, scale: int = 1, band_rows: int | None = None):
+    # the same as write_png(), the image rows top to bottom (exclusive) are asked for by rows(top, bottom)
+    if band_rows is None:
+        # a scaled band is about BAND_BYTES, whatever the width of the image
+        band_rows = max(1, BAND_BYTES // (width * scale * scale * (1 if palette is not None else 3)))
+    with PngWriter(file, width * scale, height * scale, palette) as writer:
+        for top in range(0, height, band_rows):
+            band = rows(top, min(top + band_rows, height))
+            if scale > 1:
+                band = np.repeat(np.repeat(band, scale, axis=0), scale, axis=1)
+            writer.write_rows(band)
@@ -0,0 +1,154 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from Classes.GifWriter import GifWriter
+from Classes.PngWriter import ApngWriter
+
+RECORD_EXTENSIONS = (".gif", ".png", ".apng", ".rgb", ".raw")
+
+
+class RawWriter:
+    """
+    Raw RGB24 frames one after another (for ffmpeg or another encoder later), the size, the
+    frame rate and the frame count are written to a JSON file next to them at the end.
+
+        ffmpeg -f rawvideo -pix_fmt rgb24 -s WIDTHxHEIGHT -r FPS -i run.rgb run.mp4
+    """
+
+    def __init__(self, path: str, width: int, height: int, fps: float):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = 0
+        self._file = open(path, "wb")
+
+    def write_frame(self, image: np.ndarray):
+        if image.shape != (self.height, self.width, 3):
+            raise ValueError(f"Frame must have the shape ({self.height}, {self.width}, 3)")
+        self._file.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+        with open(self.path + ".json", "w") as file:
+            json.dump({"width": self.width, "height": self.height, "fps": self.fps, "frames": self.frames,
+                       "pix_fmt": "rgb24"}, file, indent=1)
+
+
+class Recorder:
+    """
+    Records the grid into an animation, the format is given by the extension of the path:
+    animated GIF (.gif), animated PNG (.png, .apng) or raw RGB frames (.rgb, .raw).
+
+    offer() only copies the cells (a byte per cell) and the palette into a bounded queue,
+    the colorizing and the encoding are done on a background thread. When the encoder is
+    queue_size frames behind, a new frame is dropped (drop=True, the GUI does not wait)
+    or offer() waits for it (drop=False, the headless runner records every frame). A frame
+    is recorded every every_steps steps (due()), or every offered frame with 0.
+    """
+
+    def __init__(self, path: str, fps: float = 25, every_steps: int = 0, scale: int = 1, queue_size: int = 8,
+                 drop: bool = True):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in RECORD_EXTENSIONS:
+            raise ValueError(f"Unknown recording format '{extension}' ({', '.join(RECORD_EXTENSIONS)})")
+        if fps <= 0 or every_steps < 0 or scale < 1:
+            raise ValueError("The frame rate and the scale must be positive, the steps between frames at least 0")
+
+        self.path = path
+        self.fps = fps
+        self.every_steps = every_steps
+        self.scale = scale
+        self.drop = drop
+        self.format = {".gif": "gif", ".png": "apng", ".apng": "apng"}.get(extension, "raw")
+        self.recorded = 0                   # frames encoded
+        self.dropped = 0                    # frames offered while the queue was full
+        self.error: Exception | None = None
+        self._writer: GifWriter | ApngWriter | RawWriter | None = None
+        self._next_step: int | None = None
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="Recorder", daemon=True)
+        self._thread.start()
+
+    def due(self, steps: int) -> bool:
+        # a frame is wanted at the step (the first one always)
+        if not self.every_steps or self._next_step is None:
+            return True
+        return steps >= self._next_step
+
+    def offer(self, grid: np.ndarray, palette: np.ndarray, steps: int = 0) -> bool:
+        """Queues a frame of the grid (color indexes, shape (height, width)), False if it was not taken."""
+        if self.error is not None or not self.due(steps):
+            return False
+        frame = (np.array(grid, dtype=np.uint8), np.array(palette, dtype=np.uint8).reshape(-1, 3))
+        if self.drop:
+            try:
+                self._queue.put_nowait(frame)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            self._queue.put(frame)
+
+        if self.every_steps:
+            self._next_step = (steps // self.every_steps + 1) * self.every_steps
+        return True
+
+    def close(self):
+        """Encodes the queued frames and finishes the file, raises the error of the encoder (if any)."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            if self._writer is not None and self.error is None:
+                try:
+                    self._writer.close()
+                except (OSError, ValueError) as e:
+                    self.error = e
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        # the encoder thread, after an error the frames are only taken out of the queue
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._encode(*item)
+                self.recorded += 1
+            except (OSError, ValueError, IndexError) as e:
+                self.error = e
+
+    def _encode(self, grid: np.ndarray, palette: np.ndarray):
+        if self.scale > 1:
+            grid = np.repeat(np.repeat(grid, self.scale, axis=0), self.scale, axis=1)
+        height, width = grid.shape
+
+        if self._writer is None:
+            if self.format == "gif":
+                self._writer = GifWriter(self.path, width, height, self.fps)
+            elif self.format == "apng":
+                # RGB frames, the palette may change between the frames
+                self._writer = ApngWriter(self.path, width, height, self.fps)
+            else:
+                self._writer = RawWriter(self.path, width, height, self.fps)
+
+        if self.format == "gif":
+            # the GIF keeps the color indexes, the palette is its color table
+            self._writer.write_frame(grid, palette)
+        else:
+            self._writer.write_frame(palette[grid])
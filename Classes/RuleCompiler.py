@@ -0,0 +1,243 @@
+import re
+from dataclasses import dataclass
+from enum import IntEnum
+
+
+class Directions(IntEnum):
+    ANT_UP      = 0
+    ANT_RIGHT   = 1
+    ANT_DOWN    = 2
+    ANT_LEFT    = 3
+
+
+# Ant's movement for every direction (indexed by Directions)
+DIRECTION_DX = (0, 1, 0, -1)
+DIRECTION_DY = (-1, 0, 1, 0)
+
+# Turn as a direction delta (new_direction = (direction + turn) % 4)
+TURN_NONE   = 0
+TURN_RIGHT  = 1
+TURN_UTURN  = 2
+TURN_LEFT   = 3
+
+TURN_SYMBOLS = {"N": TURN_NONE, "R": TURN_RIGHT, "U": TURN_UTURN, "L": TURN_LEFT}
+
+# Turn codes used by the common turmite notation {{{write, turn, next_state}, ...}, ...}
+TURMITE_TURN_CODES = {1: TURN_NONE, 2: TURN_RIGHT, 4: TURN_UTURN, 8: TURN_LEFT}
+
+MAX_COLORS = 256
+
+
+@dataclass(frozen=True)
+class CompiledRules:
+    """
+    Flat transition tables for the stepping loop.
+
+    Rule tables are indexed by  state * colors + color.
+    Step tables are indexed by the step key  (state * 4 + direction) * colors + color,
+    so one lookup gives everything the ant needs for the next step.
+
+    Step back tables are indexed by the step key after a step plus the color it wrote,
+    they give the color read, the direction and the step key (color 0) before the step.
+    They are empty when two steps end the same way (the rules are not reversible).
+    """
+    source: str
+    colors: int
+    states: int
+
+    # rule tables
+    write: tuple[int, ...]
+    turn: tuple[int, ...]
+    next_state: tuple[int, ...]
+
+    # step tables
+    step_write: tuple[int, ...]
+    step_direction: tuple[int, ...]
+    step_next_key: tuple[int, ...]
+
+    # movement for every direction
+    dx: tuple[int, ...] = DIRECTION_DX
+    dy: tuple[int, ...] = DIRECTION_DY
+
+    # step back tables
+    step_back_write: tuple[int, ...] = ()
+    step_back_direction: tuple[int, ...] = ()
+    step_back_key: tuple[int, ...] = ()
+
+    @property
+    def reversible(self) -> bool:
+        return bool(self.step_back_key)
+
+    def key(self, state: int, direction: int) -> int:
+        # step key of a cell with color 0
+        return (state * 4 + direction) * self.colors
+
+    def key_state(self, key: int) -> int:
+        return key // (4 * self.colors)
+
+    def key_direction(self, key: int) -> Directions:
+        return Directions((key // self.colors) % 4)
+
+
+def compile_rules(rules: str) -> CompiledRules:
+    """Compiles a Langton's ant rule string (one of R, L, U, N per color), e.g. "RLLR"."""
+    rules = rules.upper()
+    if not re.fullmatch(r"[RLUN]+", rules):
+        raise ValueError(f"Invalid ant's rules: '{rules}' (R, L, U, N options available only)")
+    if len(rules) < 2 or len(rules) > MAX_COLORS:
+        raise ValueError(f"Rules length must be between 2 and {MAX_COLORS}")
+
+    colors = len(rules)
+    table = [[((color + 1) % colors, TURN_SYMBOLS[rule], 0) for color, rule in enumerate(rules)]]
+    return _compile_table(rules, table)
+
+
+@dataclass(frozen=True)
+class CanonicalRules:
+    """
+    Canonical form of a Langton's ant rule string: rules == root * repeats, mirrored if swapped L <-> R.
+
+    The repeats of a root step the ant the same way (the colors are only counted modulo a
+    bigger number) and a mirrored rule draws the mirror image of the pattern.
+    """
+    root: str
+    repeats: int
+    mirrored: bool
+
+    @property
+    def rules(self) -> str:
+        # the rule string in the canonical orientation
+        return self.root * self.repeats
+
+
+def mirror_rules(rules: str) -> str:
+    # L <-> R, the U-turn and no turn stay
+    return rules.upper().translate(str.maketrans("LR", "RL"))
+
+
+def rules_root(rules: str) -> str:
+    # the shortest rule string whose repeats give the rules, e.g. "RL" for "RLRL"
+    rules = rules.upper()
+    for length in range(1, len(rules) // 2 + 1):
+        if len(rules) % length == 0 and rules[:length] * (len(rules) // length) == rules:
+            return rules[:length]
+    return rules
+
+
+def canonical_rules(rules: str) -> CanonicalRules:
+    """The root or its mirror, whichever is smaller, e.g. "LR" x 2 mirrored for "RLRL"."""
+    root = rules_root(rules)
+    repeats = len(rules) // len(root)
+    mirrored = mirror_rules(root)
+    if mirrored < root:
+        return CanonicalRules(root=mirrored, repeats=repeats, mirrored=True)
+    return CanonicalRules(root=root, repeats=repeats, mirrored=False)
+
+
+def compile_turmite(table) -> CompiledRules:
+    """
+    Compiles a general turmite, table[state][color] = (write_color, turn, next_state).
+    The turn is either a symbol (R, L, U, N) or a turmite notation code (1, 2, 4, 8).
+    A string in the turmite notation, e.g. "{{{1, 2, 0}, {0, 8, 0}}}", is also accepted.
+    """
+    if isinstance(table, str):
+        source = table
+        table = parse_turmite(table)
+    else:
+        source = repr(table)
+
+    parsed = []
+    for transitions in table:
+        parsed_state = []
+        for write, turn, next_state in transitions:
+            if isinstance(turn, str):
+                if turn.upper() not in TURN_SYMBOLS:
+                    raise ValueError(f"Unknown turn symbol: '{turn}'")
+                turn = TURN_SYMBOLS[turn.upper()]
+            elif turn in TURMITE_TURN_CODES:
+                turn = TURMITE_TURN_CODES[turn]
+            else:
+                raise ValueError(f"Unknown turn code: {turn}")
+            parsed_state.append((int(write), turn, int(next_state)))
+        parsed.append(parsed_state)
+
+    return _compile_table(source, parsed)
+
+
+def compile_source(source: str) -> CompiledRules:
+    """Compiles the source of CompiledRules back, a rule string or a turmite table string."""
+    if re.fullmatch(r"[RLUNrlun]+", source):
+        return compile_rules(source)
+    return compile_turmite(source)
+
+
+def parse_turmite(text: str) -> list[list[tuple[int, int, int]]]:
+    numbers = [int(n) for n in re.findall(r"\d+", text)]
+    states = max(1, text.count("{{"))
+    if not numbers or len(numbers) % (3 * states):
+        raise ValueError(f"Invalid turmite table: '{text}'")
+
+    colors = len(numbers) // (3 * states)
+    triples = [tuple(numbers[i:i + 3]) for i in range(0, len(numbers), 3)]
+    return [triples[s * colors:(s + 1) * colors] for s in range(states)]
+
+
+def _compile_table(source: str, table: list[list[tuple[int, int, int]]]) -> CompiledRules:
+    states = len(table)
+    colors = len(table[0]) if states else 0
+    if states < 1 or colors < 2:
+        raise ValueError("Turmite needs at least 1 state and 2 colors")
+    if colors > MAX_COLORS:
+        raise ValueError(f"Maximum {MAX_COLORS} colors are supported")
+    if any(len(transitions) != colors for transitions in table):
+        raise ValueError("Every state needs a transition for every color")
+
+    write, turn, next_state = [], [], []
+    for transitions in table:
+        for w, t, s in transitions:
+            if not 0 <= w < colors:
+                raise ValueError(f"Written color {w} is out of range")
+            if not 0 <= s < states:
+                raise ValueError(f"Next state {s} is out of range")
+            write.append(w)
+            turn.append(t % 4)
+            next_state.append(s)
+
+    step_write, step_direction, step_next_key = [], [], []
+    for state in range(states):
+        for direction in range(4):
+            for color in range(colors):
+                r = state * colors + color
+                new_direction = (direction + turn[r]) % 4
+                step_write.append(write[r])
+                step_direction.append(new_direction)
+                step_next_key.append((next_state[r] * 4 + new_direction) * colors)
+
+    # every step key after a step with the written color has to come from a single step key,
+    # the Langton's ant rules always do (the written color is the read one + 1)
+    size = len(step_write)
+    back_from = [-1] * size
+    for k in range(size):
+        after = step_next_key[k] + step_write[k]
+        if back_from[after] >= 0:
+            back_from = []
+            break
+        back_from[after] = k
+    step_back_write = tuple(k % colors for k in back_from)
+    step_back_direction = tuple((k // colors) % 4 for k in back_from)
+    step_back_key = tuple(k - k % colors for k in back_from)
+
+    return CompiledRules(
+        source=source,
+        colors=colors,
+        states=states,
+        write=tuple(write),
+        turn=tuple(turn),
+        next_state=tuple(next_state),
+        step_write=tuple(step_write),
+        step_direction=tuple(step_direction),
+        step_next_key=tuple(step_next_key),
+        step_back_write=step_back_write,
+        step_back_direction=step_back_direction,
+        step_back_key=step_back_key
+    )
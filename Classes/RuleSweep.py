@@ -0,0 +1,325 @@
+import os
+import sqlite3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import astuple, dataclass, fields, replace
+from typing import Callable, Iterator
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.HighwayDetector import HighwayDetector
+from Classes.RuleCompiler import mirror_rules
+
+# classes of the rules
+HIGHWAY = "highway"             # the ant builds a highway
+CYCLE = "cycle"                 # the torus comes back to its start state
+SYMMETRIC = "symmetric"         # the pattern keeps growing mirror symmetric
+CHAOTIC = "chaotic"             # none of the above within the step budget
+
+
+@dataclass(frozen=True)
+class RuleResult:
+    """Class and metrics of a rule after the step budget of the sweep."""
+    rules: str
+    classification: str
+    steps: int                  # steps run (less than the budget when the class is settled earlier)
+    highway_at: int | None      # step from which the ant moves along the highway
+    highway_period: int | None
+    drift_x: int | None
+    drift_y: int | None
+    cycle_period: int | None    # steps after which the torus is back in the start state
+    visited_cells: int          # cells the ant has stepped on
+    colored_cells: int          # cells with a non zero color at the end
+    # bounding box of the visited cells relative to the start cell (not wrapped around the grid)
+    min_x: int
+    min_y: int
+    max_x: int
+    max_y: int
+
+
+def rule_count(min_length: int, max_length: int) -> int:
+    # all the [LR] rules of the lengths
+    return sum(1 << length for length in range(min_length, max_length + 1))
+
+
+def rule_at(index: int, min_length: int = 2) -> str:
+    # one rule of every mirror pair (the canonical one, starting with L), the shorter rules
+    # first, the rules of a length in binary order (R = 0, L = 1)
+    length = min_length
+    while index >= 1 << (length - 1):
+        index -= 1 << (length - 1)
+        length += 1
+    return "L" + "".join("RL"[(index >> (length - 2 - i)) & 1] for i in range(length - 1))
+
+
+def mirror_result(result: RuleResult) -> RuleResult:
+    # the mirrored rule (L <-> R) draws the mirror image about the start column
+    return replace(
+        result,
+        rules=mirror_rules(result.rules),
+        drift_x=-result.drift_x if result.drift_x is not None else None,
+        min_x=-result.max_x,
+        max_x=-result.min_x
+    )
+
+
+def is_symmetric(grid: np.ndarray) -> bool:
+    # the colored cells (cropped to their bounding box) are the same mirrored along an axis or a diagonal
+    colored = grid != 0
+    rows = np.nonzero(colored.any(axis=1))[0]
+    columns = np.nonzero(colored.any(axis=0))[0]
+    if not len(rows):
+        return False
+    pattern = grid[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+
+    mirrored = [pattern[::-1], pattern[:, ::-1], pattern[::-1, ::-1]]
+    if pattern.shape[0] == pattern.shape[1]:
+        mirrored += [pattern.T, pattern[::-1, ::-1].T]
+    return any(np.array_equal(pattern, other) for other in mirrored)
+
+
+def classify_rule(rules: str, steps: int, width: int = 512, height: int = 512, chunk: int = 1 << 14) -> RuleResult:
+    """
+    Runs the rule from the empty grid for up to steps steps and classifies it.
+
+    The metrics come from the traced step keys of every chunk (numpy, no per step Python).
+    The Langton's ants are reversible, so on the torus the state can only repeat by coming
+    back to the start state (empty grid, ant in the start cell heading down); that is
+    checked exactly for every step. The symmetry is checked in the second half of the run,
+    at the last visit of the start cell in a chunk, where the symmetric rules are mostly
+    symmetric; the grid of that step is the chunk end grid with the later writes undone.
+    """
+    engine = AntEngine(rules, width, height)
+    compiled = engine.compiled
+    highways = HighwayDetector(engine)
+
+    write = np.asarray(compiled.step_write)
+    next_key = np.asarray(compiled.step_next_key)
+    step_direction = np.asarray(compiled.step_direction)
+    dx = np.asarray(compiled.dx)
+    dy = np.asarray(compiled.dy)
+    start_key = compiled.key(engine.state, engine.direction)
+    start_x = engine.x
+    start_y = engine.y
+
+    visited = np.zeros(width * height, dtype=bool)
+    x = 0                                   # ant position relative to the start cell, not wrapped
+    y = 0
+    colored = 0
+    min_x = min_y = max_x = max_y = 0
+    cycle_period = None
+    symmetric_checks = 0
+    symmetric_hits = 0
+
+    while engine.steps < steps and cycle_period is None and highways.highway is None:
+        chunk_start = engine.steps
+        keys = engine.trace(min(chunk, steps - engine.steps))
+        highways.record(keys)
+
+        # cell of every step and the ant position after every step
+        xs, ys = engine.trace_positions(keys, x, y)
+        directions = step_direction[keys]
+        after_xs = xs + dx[directions]
+        after_ys = ys + dy[directions]
+        x = int(after_xs[-1])
+        y = int(after_ys[-1])
+        cells = ((ys + start_y) % height) * width + (xs + start_x) % width
+        visited[cells] = True
+        min_x = min(min_x, int(xs.min()))
+        min_y = min(min_y, int(ys.min()))
+        max_x = max(max_x, int(xs.max()))
+        max_y = max(max_y, int(ys.max()))
+
+        # colored cells after every step
+        written = write[keys]
+        colored_after = colored + np.cumsum((written != 0).astype(np.int64) - (keys % compiled.colors != 0))
+        colored = int(colored_after[-1])
+
+        at_start = (after_xs % width == 0) & (after_ys % height == 0)
+        back = np.nonzero(at_start & (next_key[keys] == start_key) & (colored_after == 0))[0]
+        if len(back):
+            cycle_period = chunk_start + int(back[0]) + 1
+            break
+
+        at_start = np.nonzero(at_start)[0]
+        if 2 * engine.steps > steps and len(at_start):
+            # the grid after the last visit of the start cell: every later written cell gets
+            # the color it had before its first later write
+            last = int(at_start[-1])
+            later_cells, first_write = np.unique(cells[last + 1:], return_index=True)
+            grid = engine.grid.reshape(-1).copy()
+            grid[later_cells] = keys[last + 1:][first_write] % compiled.colors
+            symmetric_checks += 1
+            symmetric_hits += is_symmetric(grid.reshape(height, width))
+
+    highway = highways.highway
+    if highway is not None:
+        classification = HIGHWAY
+    elif cycle_period is not None:
+        classification = CYCLE
+    elif symmetric_checks and 2 * symmetric_hits >= symmetric_checks:
+        classification = SYMMETRIC
+    else:
+        classification = CHAOTIC
+
+    return RuleResult(
+        rules=rules,
+        classification=classification,
+        steps=engine.steps,
+        highway_at=highway.started_at if highway else None,
+        highway_period=highway.period if highway else None,
+        drift_x=highway.drift_x if highway else None,
+        drift_y=highway.drift_y if highway else None,
+        cycle_period=cycle_period,
+        visited_cells=int(np.count_nonzero(visited)),
+        colored_cells=colored,
+        min_x=min_x,
+        min_y=min_y,
+        max_x=max_x,
+        max_y=max_y
+    )
+
+
+def classify_shard(shard: int, start: int, stop: int, min_length: int, steps: int, width: int,
+                   height: int) -> tuple[int, list[RuleResult]]:
+    # run in the worker processes, the rules are indexes of the mirror pairs, both rules get a result
+    results = []
+    for index in range(start, stop):
+        result = classify_rule(rule_at(index, min_length), steps, width, height)
+        results += [result, mirror_result(result)]
+    return shard, results
+
+
+class SweepStore:
+    """
+    Results of a sweep in an SQLite database.
+
+    A shard is marked done in the same transaction as its results are written, so an
+    interrupted sweep resumes with the shards not done. The settings of the sweep are kept
+    too, a store can not be continued with other settings (the shards would not match).
+    """
+
+    def __init__(self, path: str, settings: dict[str, int]):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        columns = ", ".join(field.name for field in fields(RuleResult))
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value INTEGER)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS shards (shard INTEGER PRIMARY KEY)")
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS results ({columns}, PRIMARY KEY (rules))")
+
+            saved = dict(self._db.execute("SELECT name, value FROM settings"))
+            if not saved:
+                self._db.executemany("INSERT INTO settings VALUES (?, ?)", settings.items())
+        if saved and saved != settings:
+            self._db.close()
+            raise ValueError(f"'{path}' is a sweep with other settings: {saved}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def done_shards(self) -> set[int]:
+        return {shard for shard, in self._db.execute("SELECT shard FROM shards")}
+
+    def add_shard(self, shard: int, results: list[RuleResult]):
+        placeholders = ", ".join("?" * len(fields(RuleResult)))
+        with self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO results VALUES ({placeholders})", map(astuple, results))
+            self._db.execute("INSERT OR IGNORE INTO shards VALUES (?)", (shard,))
+
+    def results(self, classification: str | None = None) -> Iterator[RuleResult]:
+        if classification is None:
+            rows = self._db.execute("SELECT * FROM results")
+        else:
+            rows = self._db.execute("SELECT * FROM results WHERE classification = ?", (classification,))
+        for row in rows:
+            yield RuleResult(*row)
+
+    def class_counts(self) -> dict[str, int]:
+        return dict(self._db.execute("SELECT classification, COUNT(*) FROM results GROUP BY classification"))
+
+
+class RuleSweep:
+    """
+    Classifies all the [LR] rules of the lengths min_length to max_length.
+
+    Only one rule of every mirror pair is run, the other one gets the mirrored result. The
+    pairs are split into shards of shard_size pairs, the shards are run on a process pool
+    (all the cores by default) and their results are streamed into the store as they come.
+    Only a few shards per worker are queued at a time, so the memory does not grow with the
+    rule space. The shards already in the store are skipped.
+    """
+
+    def __init__(self, store_path: str, steps: int, width: int = 512, height: int = 512, min_length: int = 2,
+                 max_length: int = 20, shard_size: int = 256, workers: int | None = None):
+        if not 1 <= min_length <= max_length:
+            raise ValueError("Invalid rule lengths")
+
+        self.steps = steps
+        self.width = width
+        self.height = height
+        self.min_length = min_length
+        self.max_length = max_length
+        self.shard_size = shard_size
+        self.workers = workers or os.cpu_count() or 1
+        self.store = SweepStore(store_path, {
+            "steps": steps,
+            "width": width,
+            "height": height,
+            "min_length": min_length,
+            "max_length": max_length,
+            "shard_size": shard_size
+        })
+
+    @property
+    def total(self) -> int:
+        # mirror pairs
+        return rule_count(self.min_length, self.max_length) // 2
+
+    @property
+    def shard_count(self) -> int:
+        return -(-self.total // self.shard_size)
+
+    def remaining_shards(self) -> list[int]:
+        done = self.store.done_shards()
+        return [shard for shard in range(self.shard_count) if shard not in done]
+
+    def run(self, progress: Callable[[int, int], None] | None = None):
+        """Runs the remaining shards, progress(shards done, shard count) is called after every shard."""
+        shards = self.remaining_shards()
+        remaining = iter(shards)
+        done = self.shard_count - len(shards)
+
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        pending = set()
+        try:
+            while True:
+                while len(pending) < 2 * self.workers:
+                    shard = next(remaining, None)
+                    if shard is None:
+                        break
+                    start = shard * self.shard_size
+                    stop = min(start + self.shard_size, self.total)
+                    pending.add(pool.submit(classify_shard, shard, start, stop, self.min_length, self.steps,
+                                            self.width, self.height))
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self.store.add_shard(*future.result())
+                    done += 1
+                    if progress is not None:
+                        progress(done, self.shard_count)
+        finally:
+            # on an interruption the queued shards are dropped, the store resumes with them
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def close(self):
+        self.store.close()
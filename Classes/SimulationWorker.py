@@ -0,0 +1,269 @@
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from Classes.FrameScheduler import FrameScheduler
+from Classes.PerfMetrics import FRAME_LATENESS, PHASE_PUBLISH, PHASE_STEP, PerfMetrics
+from Classes.TileSignatures import TileSignatures
+
+TRACKED_STEPS = 1024            # least steps between the ant positions the changed cells are bounded by
+TRACKED_CHUNKS = 16             # most chunks a frame is stepped in (every chunk costs a call of step)
+MAX_TRACKED_ANTS = 64           # with more ants, every tile is a candidate
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    State of the simulation published by the worker, the arrays are read-only.
+
+    grid is a view of the engine cells themselves (no copy, engine.grid_view: the packed
+    engines give a PackedGrid), they do not change while grid_lock is held; dirty are the
+    tiles changed since the last snapshot read by the GUI.
+    """
+    grid: np.ndarray
+    dirty: np.ndarray | None    # bool (tiles_y, tiles_x) of dirty_tile_size tiles, None = everything
+    ant_xs: np.ndarray
+    ant_ys: np.ndarray
+    direction: int
+    state: int
+    steps: int
+    version: int                # number of the snapshot, grows with every publish
+
+
+class SimulationWorker:
+    """
+    Steps the engine on its own thread, frame by frame (FrameScheduler).
+
+    The engine is only touched by the worker thread, the GUI talks to it through commands
+    (start, pause, speed, or any function run on the worker thread) and reads the
+    snapshots. A snapshot is published at the end of every frame. The cells are not copied,
+    the snapshot grid is the engine grid and the changed tiles are found by their signatures
+    (TileSignatures) on the worker thread. The worker writes the cells only holding grid_lock
+    (a chunk of steps or a command at a time), the GUI holds it while reading them
+    (snapshot() and the painting of the canvas), so a read never sees the cells change. The
+    cells read may be a few chunks ahead of the snapshot, the tiles changed meanwhile are
+    dirty in the next one.
+
+    The frames are stepped in a few chunks (of at least TRACKED_STEPS steps): an ant writes only
+    the cells at most that many cells away from where the chunk started, so only the tiles around the
+    ants are hashed instead of the whole grid. The commands may write anywhere, after them
+    every tile is hashed.
+
+    A command or a frame that raises pauses the worker, its exception is kept in error for
+    the GUI (the thread keeps taking the commands).
+
+    The frames are timed by metrics (stepping, publishing and lateness of the frames).
+    """
+
+    def __init__(self, engine, step: Callable[[int], None] | None = None,
+                 scheduler: FrameScheduler | None = None, dirty_tile_size: int = 16,
+                 metrics: PerfMetrics | None = None):
+        self.engine = engine
+        self.step = step if step is not None else engine.step
+        self.scheduler = scheduler if scheduler is not None else FrameScheduler()
+        self.metrics = metrics if metrics is not None else PerfMetrics()
+
+        self._running = False
+        self._commands: queue.Queue = queue.Queue()
+        self.error: Exception | None = None         # the last failure of a command or a frame, the worker pauses on it
+
+        self._lock = threading.RLock()
+        self._snapshot: Snapshot | None = None      # the last published snapshot
+        self._read_version = 0                      # version of the last snapshot read by the GUI
+        self._version = 0                           # number of the published snapshots
+        self._signatures = TileSignatures(dirty_tile_size)
+        self._candidates: np.ndarray | None = None  # tiles the ants may have written since the last publish, None = any
+
+        self._thread = threading.Thread(target=self._run, name="SimulationWorker", daemon=True)
+        self._thread.start()
+
+    # --- commands (any thread)
+
+    def start(self):
+        self._commands.put(lambda: self._set_running(True))
+
+    def pause(self):
+        self._commands.put(lambda: self._set_running(False))
+
+    def set_speed(self, steps_per_second: float | None):
+        # None = maximum speed at the scheduler frame rate
+        def command():
+            self.scheduler.steps_per_second = steps_per_second
+            self.scheduler.restart()
+        self._commands.put(command)
+
+    def set_fps(self, fps: float):
+        def command():
+            self.scheduler.fps = fps
+            self.scheduler.restart()
+        self._commands.put(command)
+
+    def call(self, function: Callable, *args):
+        # runs the function on the worker thread (e.g. changes of the engine) and publishes the result
+        def command():
+            self._candidates = None
+            function(*args)
+            self._publish()
+        self._commands.put(command)
+
+    def set_engine(self, engine, step: Callable[[int], None] | None = None):
+        def command():
+            self.engine = engine
+            self.step = step if step is not None else engine.step
+            self._signatures.reset()
+            self._candidates = None
+            self._publish()
+        self._commands.put(command)
+
+    def stop(self):
+        self._commands.put(None)
+        self._thread.join()
+
+    def wait(self):
+        # blocks until all the commands sent so far are done (or the thread is gone)
+        done = threading.Event()
+        self._commands.put(done.set)
+        while not done.wait(0.1):
+            if not self._thread.is_alive():
+                return
+
+    # --- snapshots (GUI thread)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def achieved_rate(self) -> float:
+        # [steps/s]
+        return self.scheduler.achieved_rate if self._running else 0.0
+
+    @property
+    def grid_lock(self) -> threading.RLock:
+        # held while the cells of the snapshots are read, the worker does not write them meanwhile
+        return self._lock
+
+    @contextmanager
+    def snapshot(self):
+        # the dirty tiles of the next snapshot start from this one, its grid does not change inside
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                self._read_version = snapshot.version
+            yield snapshot
+
+    # --- worker thread
+
+    def _set_running(self, running: bool):
+        self._running = running
+        self.scheduler.restart()
+
+    def _run(self):
+        while True:
+            # waits for a command while paused
+            try:
+                command = self._commands.get(block=not self._running)
+                while True:
+                    if command is None:
+                        return
+                    try:
+                        with self._lock:
+                            command()
+                    except Exception as e:
+                        self._fail(e)
+                    command = self._commands.get_nowait()
+            except queue.Empty:
+                pass
+
+            if not self._running:
+                continue
+            try:
+                self._run_frame()
+            except Exception as e:
+                self._fail(e)
+
+    def _run_frame(self):
+        # a frame of stepping (cut short by a new command), its snapshot and the rest of the frame for the GUI
+        scheduler = self.scheduler
+        metrics = self.metrics
+        started = metrics.start(PHASE_STEP)
+        steps = scheduler.run_frame(self._step_tracked, lambda: not self._commands.empty())
+        metrics.stop(PHASE_STEP, started)
+        metrics.count_steps(steps)
+
+        started = metrics.start(PHASE_PUBLISH)
+        self._publish()
+        metrics.stop(PHASE_PUBLISH, started)
+        if self._commands.empty():
+            lateness = scheduler.wait_next_frame()
+            if metrics.enabled:
+                metrics.add(FRAME_LATENESS, lateness)
+
+    def _fail(self, error: Exception):
+        # the engine may be left anywhere, the next snapshot hashes every tile
+        self.error = error
+        self._candidates = None
+        self._set_running(False)
+
+    def _step_tracked(self, n: int):
+        # steps in chunks, the tiles within the reach of the ants of every chunk are the candidates
+        done = 0
+        size = max(TRACKED_STEPS, -(-n // TRACKED_CHUNKS))
+        while done < n:
+            chunk = min(n - done, size)
+            ant_xs, ant_ys = self.engine.ant_positions
+            with self._lock:
+                self.step(chunk)
+            done += chunk
+            if self._candidates is not None:
+                self._mark_reach(ant_xs, ant_ys, chunk)
+
+    def _mark_reach(self, ant_xs: np.ndarray, ant_ys: np.ndarray, steps: int):
+        # the tiles at most steps cells from the ants (wrapped around the grid)
+        candidates = self._candidates
+        if len(ant_xs) > MAX_TRACKED_ANTS:
+            self._candidates = None
+            return
+        tile = self._signatures.tile
+        tiles_y, tiles_x = candidates.shape
+        for x, y in zip(np.asarray(ant_xs).tolist(), np.asarray(ant_ys).tolist()):
+            rows = np.arange((y - steps) // tile, (y + steps) // tile + 1)
+            columns = np.arange((x - steps) // tile, (x + steps) // tile + 1)
+            if len(rows) >= tiles_y and len(columns) >= tiles_x:
+                self._candidates = None
+                return
+            candidates[np.ix_(np.unique(rows % tiles_y), np.unique(columns % tiles_x))] = True
+
+    def _publish(self):
+        engine = self.engine
+        with self._lock:
+            # the deferred writes of the engine are done here
+            grid = engine.grid_view
+        dirty = self._signatures.changed(grid, self._candidates)
+        tile = self._signatures.tile
+        self._candidates = np.zeros((-(-grid.shape[0] // tile), -(-grid.shape[1] // tile)), dtype=bool)
+
+        ant_xs, ant_ys = engine.ant_positions
+        with self._lock:
+            previous = self._snapshot
+            if previous is not None and previous.version > self._read_version:
+                # the GUI has not read the previous snapshot, its dirty tiles are added
+                if previous.dirty is None or dirty is None or previous.dirty.shape != dirty.shape:
+                    dirty = None
+                else:
+                    dirty |= previous.dirty
+            self._snapshot = Snapshot(grid=grid, dirty=None if dirty is None else self._read_only(dirty),
+                                      ant_xs=self._read_only(np.array(ant_xs)),
+                                      ant_ys=self._read_only(np.array(ant_ys)), direction=int(engine.direction),
+                                      state=int(engine.state), steps=engine.steps, version=self._version + 1)
+            self._version = self._snapshot.version
+
+    @staticmethod
+    def _read_only(array: np.ndarray) -> np.ndarray:
+        view = array.view()
+        view.flags.writeable = False
+        return view
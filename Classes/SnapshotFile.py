@@ -0,0 +1,261 @@
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.PackedEngine import PackedAntEngine, create_engine
+from Classes.RuleCompiler import compile_source
+
+SNAPSHOT_MAGIC = b"LANT"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".lant"
+
+# flags of the header
+FLAG_COMPRESSED = 1
+
+# magic, version, flags, width, height, x, y, direction, bits per cell, state, steps, colors,
+# length of the rules, palette colors, rows per tile, header size (the cells start there)
+_HEADER = struct.Struct("<4sHHIIqqBBIQIIIIQ")
+_DATA_ALIGNMENT = 64
+_BAND_CELLS = 1 << 22               # cells packed / unpacked at once
+
+
+@dataclass(frozen=True)
+class SnapshotHeader:
+    """Everything of a snapshot except the cells."""
+    version: int
+    compressed: bool
+    width: int
+    height: int
+    x: int
+    y: int
+    direction: int
+    state: int
+    steps: int
+    colors: int
+    bits: int                       # bits per cell, ceil(log2(colors))
+    rules: str
+    palette: np.ndarray | None      # RGB (uint8, shape (colors, 3)) of the GUI that saved it
+    tile_rows: int                  # rows per compressed tile
+    data_offset: int
+
+    @property
+    def row_bytes(self) -> int:
+        # every row starts at a byte boundary
+        return -(-self.width * self.bits // 8)
+
+
+def cell_bits(colors: int) -> int:
+    return max(1, (colors - 1).bit_length())
+
+
+def pack_rows(rows: np.ndarray, bits: int) -> np.ndarray:
+    # (n, width) cells -> (n, row bytes), the cells packed most significant bit first
+    if bits == 8:
+        return rows
+    if 8 % bits == 0:
+        # whole cells in a byte, shifted into place
+        per_byte = 8 // bits
+        width = rows.shape[1]
+        padded = np.zeros((len(rows), -(-width // per_byte) * per_byte), dtype=np.uint8)
+        padded[:, :width] = rows
+        shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+        return np.bitwise_or.reduce(padded.reshape(len(rows), -1, per_byte) << shifts, axis=2)
+    planes = (rows[:, :, None] >> np.arange(bits - 1, -1, -1, dtype=np.uint8)) & 1
+    return np.packbits(planes.reshape(len(rows), -1), axis=1)
+
+
+def unpack_rows(packed: np.ndarray, width: int, bits: int) -> np.ndarray:
+    if bits == 8:
+        return np.array(packed)
+    if 8 % bits == 0:
+        # every byte looked up as its cells
+        return _unpack_table(bits)[packed].reshape(len(packed), -1)[:, :width]
+    planes = np.unpackbits(packed, axis=1, count=width * bits).reshape(len(packed), width, bits)
+    weights = (1 << np.arange(bits - 1, -1, -1)).astype(np.uint8)
+    return (planes * weights).sum(axis=2, dtype=np.uint8)
+
+
+def _unpack_table(bits: int) -> np.ndarray:
+    # cells of every byte value, shape (256, 8 // bits)
+    shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+    return (np.arange(256, dtype=np.uint8)[:, None] >> shifts) & ((1 << bits) - 1)
+
+
+def save_snapshot(engine: AntEngine, path: str, palette: np.ndarray | None = None, compress: bool = False,
+                  tile_rows: int = 256, compression_level: int = 6):
+    """
+    Saves the engine into the binary snapshot format: the header (rules, grid size, ant,
+    steps, optional palette) followed by the bit-packed rows of the cells. Compressed, the
+    rows are split into tiles of tile_rows rows compressed one by one, with their offsets
+    in a table in front of them.
+    """
+    compiled = engine.compiled
+    bits = cell_bits(compiled.colors)
+    rules = compiled.source.encode()
+    palette = None if palette is None else np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+    palette_bytes = b"" if palette is None else palette.tobytes()
+
+    header_size = _HEADER.size + len(rules) + len(palette_bytes)
+    data_offset = -(-header_size // _DATA_ALIGNMENT) * _DATA_ALIGNMENT
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, FLAG_COMPRESSED if compress else 0,
+                          engine.width, engine.height, engine.x, engine.y, int(engine.direction), bits,
+                          engine.state, engine.steps, compiled.colors, len(rules),
+                          0 if palette is None else len(palette), tile_rows, data_offset)
+
+    def packed_rows(top: int, bottom: int) -> np.ndarray:
+        # the packed engine has the rows of a 1-bit snapshot already, others are packed band by band
+        if isinstance(engine, PackedAntEngine):
+            return engine.packed[top:bottom]
+        return pack_rows(engine.rows(top, bottom), bits)
+
+    # written next to the file and moved over it, an engine may be mapped on the old one
+    band_rows = max(1, _BAND_CELLS // engine.width)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(header + rules + palette_bytes)
+        file.write(bytes(data_offset - header_size))
+
+        if not compress:
+            for top in range(0, engine.height, band_rows):
+                file.write(packed_rows(top, top + band_rows).tobytes())
+        else:
+            # the offsets (relative to the data offset) of every tile and of the end
+            tiles = -(-engine.height // tile_rows)
+            table_size = 8 * (tiles + 1)
+            offsets = [table_size]
+            file.write(bytes(table_size))
+            for top in range(0, engine.height, tile_rows):
+                tile = zlib.compress(packed_rows(top, top + tile_rows).tobytes(), compression_level)
+                file.write(tile)
+                offsets.append(offsets[-1] + len(tile))
+            file.seek(data_offset)
+            file.write(np.array(offsets, dtype="<u8").tobytes())
+    os.replace(temporary, path)
+
+
+def read_header(path: str) -> SnapshotHeader:
+    with open(path, "rb") as file:
+        fixed = file.read(_HEADER.size)
+        if len(fixed) < _HEADER.size or fixed[:4] != SNAPSHOT_MAGIC:
+            raise ValueError(f"'{path}' is not a snapshot")
+        (_, version, flags, width, height, x, y, direction, bits, state, steps, colors, rules_size,
+         palette_size, tile_rows, data_offset) = _HEADER.unpack(fixed)
+        if version > SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot version {version} is newer than the supported {SNAPSHOT_VERSION}")
+
+        rules = file.read(rules_size).decode()
+        palette = None
+        if palette_size:
+            palette = np.frombuffer(file.read(3 * palette_size), dtype=np.uint8).reshape(-1, 3)
+
+    return SnapshotHeader(version=version, compressed=bool(flags & FLAG_COMPRESSED), width=width, height=height,
+                          x=x, y=y, direction=direction, state=state, steps=steps, colors=colors, bits=bits,
+                          rules=rules, palette=palette, tile_rows=tile_rows, data_offset=data_offset)
+
+
+def is_snapshot(path: str) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+class SnapshotReader:
+    """
+    Reads the cells of a snapshot from the memory-mapped file.
+
+    Opening only reads the header, the rows are unpacked when they are asked for, so even a
+    huge snapshot opens instantly and a part of it can be read without the rest.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header = read_header(path)
+        header = self.header
+        self._data = np.memmap(path, dtype=np.uint8, mode="r", offset=header.data_offset)
+        self._offsets = None
+        if header.compressed:
+            tiles = -(-header.height // header.tile_rows)
+            self._offsets = self._data[:8 * (tiles + 1)].view("<u8")
+
+    def rows(self, top: int, bottom: int) -> np.ndarray:
+        # cells of the rows top to bottom (exclusive), uint8 shape (rows, width)
+        return unpack_rows(self.packed_rows(top, bottom), self.header.width, self.header.bits)
+
+    def packed_rows(self, top: int, bottom: int) -> np.ndarray:
+        # the rows as they are stored, uint8 shape (rows, row bytes)
+        header = self.header
+        top = max(0, top)
+        bottom = min(bottom, header.height)
+        if not header.compressed:
+            return self._data[top * header.row_bytes:bottom * header.row_bytes].reshape(-1, header.row_bytes)
+
+        bands = []
+        for tile in range(top // header.tile_rows, -(-bottom // header.tile_rows)):
+            start = int(self._offsets[tile])
+            packed = zlib.decompress(self._data[start:int(self._offsets[tile + 1])])
+            rows = np.frombuffer(packed, dtype=np.uint8).reshape(-1, header.row_bytes)
+            first = tile * header.tile_rows
+            bands.append(rows[max(top - first, 0):bottom - first])
+        return np.concatenate(bands)
+
+    def grid(self) -> np.ndarray:
+        # the whole grid, the mapped file itself with 8 bits per cell, unpacked band by band otherwise
+        header = self.header
+        if header.bits == 8 and not header.compressed:
+            return self._data[:header.width * header.height].reshape(header.height, header.width)
+
+        grid = np.empty((header.height, header.width), dtype=np.uint8)
+        band_rows = max(1, _BAND_CELLS // header.width)
+        if header.compressed:
+            band_rows = max(header.tile_rows, band_rows // header.tile_rows * header.tile_rows)
+        for top in range(0, header.height, band_rows):
+            grid[top:top + band_rows] = self.rows(top, top + band_rows)
+        return grid
+
+    def close(self):
+        # the file is unmapped when the last view of it is gone
+        self._data = None
+        self._offsets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_snapshot(path: str, engine: AntEngine | None = None) -> AntEngine:
+    """
+    Loads the snapshot into the engine (of the same size), or a new engine (packed for two colours).
+
+    The cells of an uncompressed snapshot stored as the engine keeps them (1-bit rows of a
+    packed engine of a width multiple of 32, a byte per cell of a plain AntEngine) are not
+    read, the engine is backed by a copy-on-write mapping of the file. The others are
+    unpacked (or decompressed tile by tile) into the engine.
+    """
+    with SnapshotReader(path) as reader:
+        header = reader.header
+        if engine is None:
+            engine = create_engine(compile_source(header.rules), header.width, header.height)
+        else:
+            engine.set_rules(compile_source(header.rules))
+        if (engine.width, engine.height) != (header.width, header.height):
+            raise ValueError(f"Snapshot size {header.width}x{header.height} does not match "
+                             f"{engine.width}x{engine.height}")
+
+        ant = (header.x, header.y, header.direction, header.state, header.steps)
+        packed = isinstance(engine, PackedAntEngine) and header.bits == 1
+        if not header.compressed and packed and engine.row_bytes % 4 == 0:
+            # the engine steps on the mapped rows, the pages are read when the ant gets to them
+            engine.map_packed(path, header.data_offset, *ant)
+        elif not header.compressed and type(engine) is AntEngine and header.bits == 8:
+            engine.map_cells(path, header.data_offset, *ant)
+        elif packed:
+            # the 1-bit rows are copied as they are
+            engine.restore_packed(reader.packed_rows(0, header.height), *ant)
+        else:
+            engine.restore(reader.grid(), *ant)
+    return engine
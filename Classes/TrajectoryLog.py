@@ -0,0 +1,256 @@
+import bisect
+import json
+import os
+import queue
+import threading
+import zlib
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import Directions, compile_source
+from Classes.SnapshotFile import load_snapshot, save_snapshot
+
+LOG_VERSION = 1
+LOG_INDEX = "index.json"
+LOG_SYMBOLS = "symbols.bin"
+
+
+class TrajectoryWriter:
+    """
+    Records a run into a log directory: the color read by every step (the symbol of the step,
+    it selects the turn and the written color, so the run can be replayed from it), full grid
+    keyframes and an index of both.
+
+    The symbols are collected in chunks of chunk_steps steps, a chunk is compressed with zlib
+    (two-colour rules are bit-packed first, a bit per step) and appended to symbols.bin. A
+    keyframe (a compressed snapshot) is saved at the start and at every multiple of
+    keyframe_every steps. The compression and the writes are done on a background thread,
+    advance() only queues a copy of the symbols and of the keyframe engines, it waits only
+    when the writer is queue_size items behind.
+    """
+
+    def __init__(self, engine: AntEngine, path: str, keyframe_every: int = 1 << 24, chunk_steps: int = 1 << 20,
+                 queue_size: int = 16, compression_level: int = 6):
+        if keyframe_every < 1 or chunk_steps < 1:
+            raise ValueError("Keyframe and chunk steps must be at least 1")
+        if not engine.traceable or not engine.wraps:
+            raise ValueError("Only the run of a single ant on the wrapped grid can be logged")
+
+        self.engine = engine
+        self.path = path
+        self.keyframe_every = keyframe_every
+        self.chunk_steps = chunk_steps
+        self.compression_level = compression_level
+        os.makedirs(path, exist_ok=True)
+
+        compiled = engine.compiled
+        self._index = {
+            "version": LOG_VERSION,
+            "rules": compiled.source,
+            "width": engine.width,
+            "height": engine.height,
+            "colors": compiled.colors,
+            "start": engine.steps,
+            "chunks": [],               # [first step, steps, offset in symbols.bin, compressed size]
+            "keyframes": [],            # [step, snapshot file name]
+        }
+        self._symbols = open(os.path.join(path, LOG_SYMBOLS), "wb")
+        self._pending: list[np.ndarray] = []     # symbols of the chunk being collected
+        self._pending_steps = 0
+        self._pending_start = engine.steps
+        self.error: Exception | None = None
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="TrajectoryWriter", daemon=True)
+        self._thread.start()
+        self._queue.put(("keyframe", engine.copy()))
+
+    def advance(self, n: int):
+        # steps the engine by n steps (every step traced, highways are not extrapolated)
+        engine = self.engine
+        colors = engine.compiled.colors
+        while n > 0:
+            count = min(n, self.keyframe_every - engine.steps % self.keyframe_every,
+                        self.chunk_steps - self._pending_steps)
+            self._pending.append((engine.trace(count) % colors).astype(np.uint8))
+            self._pending_steps += count
+            n -= count
+
+            keyframe = engine.steps % self.keyframe_every == 0
+            if keyframe or self._pending_steps == self.chunk_steps:
+                self._flush_chunk()
+            if keyframe:
+                self._queue.put(("keyframe", engine.copy()))
+
+    def close(self):
+        """Writes the rest of the symbols and the index, raises the error of the writer thread (if any)."""
+        if self._thread.is_alive():
+            self._flush_chunk()
+            self._queue.put(None)
+            self._thread.join()
+            self._symbols.close()
+            if self.error is None:
+                self._write_index()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _flush_chunk(self):
+        if self._pending_steps:
+            self._queue.put(("symbols", self._pending_start, np.concatenate(self._pending)))
+        self._pending = []
+        self._pending_start = self.engine.steps
+        self._pending_steps = 0
+
+    def _run(self):
+        # the writer thread, after an error the items are only taken out of the queue
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                if item[0] == "symbols":
+                    self._write_chunk(item[1], item[2])
+                else:
+                    self._write_keyframe(item[1])
+            except (OSError, ValueError) as e:
+                self.error = e
+
+    def _write_chunk(self, step: int, symbols: np.ndarray):
+        data = np.packbits(symbols) if self._index["colors"] == 2 else symbols
+        compressed = zlib.compress(data.tobytes(), self.compression_level)
+        self._index["chunks"].append([step, len(symbols), self._symbols.tell(), len(compressed)])
+        self._symbols.write(compressed)
+
+    def _write_keyframe(self, engine: AntEngine):
+        name = f"keyframe-{engine.steps}.lant"
+        save_snapshot(engine, os.path.join(self.path, name), compress=True)
+        self._index["keyframes"].append([engine.steps, name])
+        # the symbols before the keyframe are on the disk, a log cut short is readable up to it
+        self._symbols.flush()
+        self._write_index()
+
+    def _write_index(self):
+        temporary = os.path.join(self.path, LOG_INDEX + ".tmp")
+        with open(temporary, "w") as file:
+            json.dump(self._index, file)
+        os.replace(temporary, os.path.join(self.path, LOG_INDEX))
+
+
+class TrajectoryLog:
+    """
+    A log directory of TrajectoryWriter. seek() loads the nearest keyframe before the step
+    and replays only the symbols after it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(os.path.join(path, LOG_INDEX)) as file:
+                index = json.load(file)
+            if index["version"] != LOG_VERSION:
+                raise ValueError(f"Unsupported trajectory log version {index['version']}")
+            self.compiled = compile_source(index["rules"])
+            self.width = index["width"]
+            self.height = index["height"]
+            self.start = index["start"]
+            self._chunks = [tuple(chunk) for chunk in index["chunks"]]
+            self._keyframes = [tuple(keyframe) for keyframe in index["keyframes"]]
+        except (KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"'{path}' is not a trajectory log") from e
+        if not self._keyframes:
+            raise ValueError(f"Trajectory log '{path}' has no keyframe")
+
+        # the log ends with the last chunk written before the last keyframe (or after it)
+        self.end = self.start
+        for step, steps, _, _ in self._chunks:
+            if step != self.end:
+                break
+            self.end = step + steps
+
+    @property
+    def keyframe_steps(self) -> list[int]:
+        return [step for step, _ in self._keyframes]
+
+    def symbols(self, start: int, stop: int) -> np.ndarray:
+        """Symbols (colors read) of the steps start to stop (exclusive)."""
+        if not self.start <= start <= stop <= self.end:
+            raise ValueError(f"Steps {start} to {stop} are not in the log ({self.start} to {self.end})")
+        parts = []
+        first = bisect.bisect_right([chunk[0] for chunk in self._chunks], start) - 1
+        with open(os.path.join(self.path, LOG_SYMBOLS), "rb") as file:
+            for step, steps, offset, size in self._chunks[max(first, 0):]:
+                if step >= stop:
+                    break
+                file.seek(offset)
+                data = np.frombuffer(zlib.decompress(file.read(size)), dtype=np.uint8)
+                if self.compiled.colors == 2:
+                    data = np.unpackbits(data, count=steps)
+                parts.append(data[max(start - step, 0):stop - step])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+
+    def seek(self, step: int, engine: AntEngine | None = None, replay_steps: int = 1 << 20) -> AntEngine:
+        """The state at the step: the nearest keyframe loaded into the engine (or a new one) and the rest replayed."""
+        if not self.start <= step <= self.end:
+            raise ValueError(f"Step {step} is not in the log ({self.start} to {self.end})")
+        keyframe_step, name = self._keyframes[bisect.bisect_right(self.keyframe_steps, step) - 1]
+        engine = load_snapshot(os.path.join(self.path, name), engine)
+        for start in range(keyframe_step, step, replay_steps):
+            replay(engine, self.symbols(start, min(start + replay_steps, step)))
+        return engine
+
+
+def replay(engine: AntEngine, symbols: np.ndarray):
+    """
+    Steps the engine by the logged symbols without the stepping loop. The step keys of the
+    single state rules are a cumulative sum of the turns (numpy), the cells written are
+    found from the positions and only the last write of every cell is done.
+    """
+    n = len(symbols)
+    if not n:
+        return
+    compiled = engine.compiled
+    symbols = symbols.astype(np.int64)
+
+    if compiled.states == 1:
+        turns = np.asarray(compiled.turn)[symbols]
+        directions = (int(engine.direction) + np.concatenate(([0], np.cumsum(turns[:-1])))) % 4
+        keys = directions * compiled.colors + symbols
+    else:
+        # the state is not known without the ones before it
+        step_next_key = compiled.step_next_key
+        keys = np.empty(n, dtype=np.int64)
+        key = compiled.key(engine.state, engine.direction)
+        for t, color in enumerate(symbols.tolist()):
+            keys[t] = key + color
+            key = step_next_key[key + color]
+
+    xs, ys = engine.trace_positions(np.append(keys, 0), engine.x, engine.y)
+    xs %= engine.width
+    ys %= engine.height
+    cells = ys[:-1] * engine.width + xs[:-1]
+    _, last = np.unique(cells[::-1], return_index=True)
+    last = n - 1 - last
+    written_ys = ys[last]
+    written_xs = xs[last]
+    colors = np.asarray(compiled.step_write, dtype=np.uint8)[keys[last]]
+
+    def fill(grid: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        grid[written_ys, written_xs] = colors
+        return written_ys, written_xs
+
+    engine.defer_fill(fill)
+    key = compiled.step_next_key[int(keys[-1])]
+    engine.x = int(xs[-1])
+    engine.y = int(ys[-1])
+    engine.direction = Directions(compiled.key_direction(key))
+    engine.state = compiled.key_state(key)
+    engine.steps += n
@@ -0,0 +1,379 @@
+from typing import Callable
+
+import numpy as np
+
+from Classes.AntEngine import trace_positions
+from Classes.RuleCompiler import CompiledRules, Directions, compile_rules
+
+TILE_SIZE = 64
+
+
+class UnboundedAntEngine:
+    """
+    Langton's ant (turmite) on an unbounded grid.
+
+    The plane is stored in tile_size x tile_size uint8 tiles kept in a dict keyed by the
+    tile coordinates (x // tile_size, y // tile_size). A tile is allocated when the ant
+    enters it for the first time (its first write), so the memory scales with the visited
+    area, not with the bounding rectangle. The ant starts at (0, 0) heading down,
+    coordinates can be negative.
+
+    grid is a dense copy of the viewport (the bounding box of the written cells when no
+    viewport is set), so the engine can be shown like the wrapped one.
+
+    The ant is traced like on the wrapped grid (trace(), trace_positions(), colors_at() and the
+    deferred fills), so the highways are detected and extrapolated on the plane too.
+    """
+
+    traceable = True            # trace() follows the ant (the highways), there is no trace_hashes()
+    wraps = False               # the state is not finite, no cycles and no trajectory log
+
+    def __init__(self, rules: str | CompiledRules, tile_size: int = TILE_SIZE):
+        if tile_size < 1:
+            raise ValueError("Tile size must be at least 1")
+
+        self.tile_size = tile_size
+        self._tiles: dict[tuple[int, int], bytearray] = {}
+
+        # allocated tiles range (tile coordinates, inclusive), tracked as the tiles are allocated
+        self.tile_bounds: tuple[int, int, int, int] | None = None
+        # range of the non zero cells seen so far and the tiles entered since (only they can extend it)
+        self._bounds: tuple[int, int, int, int] | None = None
+        self._entered_tiles: set[tuple[int, int]] = set()
+
+        self.viewport: tuple[int, int, int, int] | None = None     # x, y, width, height
+
+        self.compiled: CompiledRules = compile_rules("RL")
+        self.x = 0
+        self.y = 0
+        self.direction = Directions.ANT_DOWN
+        self.state = 0
+        self.steps = 0
+
+        # cell writes computed ahead (highway extrapolation), fill(cells) gets the cells as cells[ys, xs]
+        self._pending_fills: list[Callable[["_UnboundedCells"], tuple[np.ndarray, np.ndarray]]] = []
+
+        self.set_rules(rules)
+        self.reset()
+
+    @property
+    def rules(self) -> str:
+        return self.compiled.source
+
+    @property
+    def tiles(self) -> dict[tuple[int, int], np.ndarray]:
+        # read-only views of the allocated tiles (tile[y, x])
+        self._materialize()
+        return {position: self._tile_view(tile) for position, tile in self._tiles.items()}
+
+    @property
+    def memory(self) -> int:
+        # bytes allocated for the cells
+        self._materialize()
+        return len(self._tiles) * self.tile_size * self.tile_size
+
+    @property
+    def bounding_box(self) -> tuple[int, int, int, int] | None:
+        # (min x, min y, max x, max y) of the written (non zero) cells, None for an empty grid; only the
+        # tiles entered since the last call are searched, a cell written back to 0 stays inside
+        self._materialize()
+        size = self.tile_size
+        bounds = self._bounds
+        for tx, ty in self._entered_tiles:
+            ys, xs = np.nonzero(self._tile_view(self._tiles[(tx, ty)]))
+            if not len(xs):
+                continue
+            tile_bounds = (tx * size + int(xs.min()), ty * size + int(ys.min()),
+                           tx * size + int(xs.max()), ty * size + int(ys.max()))
+            if bounds is None:
+                bounds = tile_bounds
+            else:
+                bounds = (min(bounds[0], tile_bounds[0]), min(bounds[1], tile_bounds[1]),
+                          max(bounds[2], tile_bounds[2]), max(bounds[3], tile_bounds[3]))
+        self._bounds = bounds
+        self._entered_tiles.clear()
+        return bounds
+
+    @property
+    def grid(self) -> np.ndarray:
+        x0, y0, width, height = self._grid_rect()
+        return self.window(x0, y0, width, height)
+
+    @property
+    def grid_view(self) -> np.ndarray:
+        return self.grid
+
+    @property
+    def ant_positions(self) -> tuple[np.ndarray, np.ndarray]:
+        # relative to the shown grid
+        x0, y0, _, _ = self._grid_rect()
+        return np.array([self.x - x0]), np.array([self.y - y0])
+
+    def set_viewport(self, x: int, y: int, width: int, height: int):
+        self.viewport = (x, y, width, height)
+
+    def window(self, x0: int, y0: int, width: int, height: int) -> np.ndarray:
+        """Dense copy of the cells in the rectangle, window[y - y0, x - x0]."""
+        self._materialize()
+        size = self.tile_size
+        window = np.zeros((height, width), dtype=np.uint8)
+        for ty in range(y0 // size, (y0 + height - 1) // size + 1):
+            for tx in range(x0 // size, (x0 + width - 1) // size + 1):
+                tile = self._tiles.get((tx, ty))
+                if tile is None:
+                    continue
+                # overlap of the tile and the window
+                left = max(x0, tx * size)
+                right = min(x0 + width, (tx + 1) * size)
+                top = max(y0, ty * size)
+                bottom = min(y0 + height, (ty + 1) * size)
+                window[top - y0:bottom - y0, left - x0:right - x0] = \
+                    self._tile_view(tile)[top - ty * size:bottom - ty * size, left - tx * size:right - tx * size]
+        return window
+
+    def colors_at(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        # colors of the cells (xs[i], ys[i]), 0 outside the allocated tiles
+        self._materialize()
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        colors = np.zeros(xs.shape, dtype=np.uint8)
+        for position, indices in self._tile_groups(xs, ys):
+            tile = self._tiles.get(position)
+            if tile is not None:
+                colors[indices] = self._tile_view(tile)[ys[indices] % self.tile_size, xs[indices] % self.tile_size]
+        return colors
+
+    def defer_fill(self, fill: Callable[["_UnboundedCells"], tuple[np.ndarray, np.ndarray]]):
+        # fill(cells) writes cells[ys, xs] = colors and returns the (ys, xs) of the written cells
+        self._pending_fills.append(fill)
+
+    def trace_positions(self, keys: np.ndarray, x: int, y: int) -> tuple[np.ndarray, np.ndarray]:
+        # cells visited by the traced steps starting at (x, y)
+        return trace_positions(self.compiled, keys, x, y)
+
+    def set_rules(self, rules: str | CompiledRules):
+        if not isinstance(rules, CompiledRules):
+            rules = compile_rules(rules)
+        self.compiled = rules
+
+    def reset(self):
+        self.x = 0
+        self.y = 0
+        self.direction = Directions.ANT_DOWN
+        self.state = 0
+        self.steps = 0
+
+        self._pending_fills.clear()
+        self._tiles.clear()
+        self.tile_bounds = None
+        self._bounds = None
+        self._entered_tiles.clear()
+
+    def step(self, n: int = 1):
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        dx = compiled.dx
+        dy = compiled.dy
+        tiles = self._tiles
+        entered_tiles = self._entered_tiles
+        size = self.tile_size
+        tile_x, x = divmod(self.x, size)
+        tile_y, y = divmod(self.y, size)
+        tile = tiles.get((tile_x, tile_y))
+        if tile is None:
+            tile = self._allocate(tile_x, tile_y)
+        entered_tiles.add((tile_x, tile_y))
+        direction = self.direction
+        key = compiled.key(self.state, direction)
+
+        # x, y are the coordinates inside the current tile, the dict is only used at the tile edges
+        for _ in range(n):
+            i = y * size + x
+            k = key + tile[i]
+            tile[i] = step_write[k]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x += dx[direction]
+            y += dy[direction]
+            if not (0 <= x < size and 0 <= y < size):
+                tile_x += x // size
+                tile_y += y // size
+                x %= size
+                y %= size
+                tile = tiles.get((tile_x, tile_y))
+                if tile is None:
+                    tile = self._allocate(tile_x, tile_y)
+                entered_tiles.add((tile_x, tile_y))
+
+        self.x = tile_x * size + x
+        self.y = tile_y * size + y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+
+    def step_back(self, n: int = 1):
+        # undoes the last n steps (see AntEngine.step_back), the undone cells are in the allocated tiles
+        compiled = self.compiled
+        if not compiled.reversible:
+            raise ValueError(f"Rules '{compiled.source}' are not reversible")
+        if not 0 <= n <= self.steps:
+            raise ValueError(f"Can not step back {n} steps from step {self.steps}")
+        if self._pending_fills:
+            self._materialize()
+
+        step_back_write = compiled.step_back_write
+        step_back_direction = compiled.step_back_direction
+        step_back_key = compiled.step_back_key
+        dx = compiled.dx
+        dy = compiled.dy
+        tiles = self._tiles
+        entered_tiles = self._entered_tiles
+        size = self.tile_size
+        direction = int(self.direction)
+        key = compiled.key(self.state, direction)
+        tile_x, x = divmod(self.x, size)
+        tile_y, y = divmod(self.y, size)
+        tile = tiles.get((tile_x, tile_y))
+        entered_tiles.add((tile_x, tile_y))
+
+        for _ in range(n):
+            x -= dx[direction]
+            y -= dy[direction]
+            if not (0 <= x < size and 0 <= y < size):
+                tile_x += x // size
+                tile_y += y // size
+                x %= size
+                y %= size
+                tile = tiles[(tile_x, tile_y)]
+                entered_tiles.add((tile_x, tile_y))
+            i = y * size + x
+            k = key + tile[i]
+            tile[i] = step_back_write[k]
+            key = step_back_key[k]
+            direction = step_back_direction[k]
+
+        self.x = tile_x * size + x
+        self.y = tile_y * size + y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps -= n
+
+    def trace(self, n: int) -> np.ndarray:
+        """Same as step(n), but returns the step key (ant state, direction and cell color) of every step."""
+        if self._pending_fills:
+            self._materialize()
+
+        compiled = self.compiled
+        step_write = compiled.step_write
+        step_direction = compiled.step_direction
+        step_next_key = compiled.step_next_key
+        dx = compiled.dx
+        dy = compiled.dy
+        tiles = self._tiles
+        entered_tiles = self._entered_tiles
+        size = self.tile_size
+        tile_x, x = divmod(self.x, size)
+        tile_y, y = divmod(self.y, size)
+        tile = tiles.get((tile_x, tile_y))
+        if tile is None:
+            tile = self._allocate(tile_x, tile_y)
+        entered_tiles.add((tile_x, tile_y))
+        direction = self.direction
+        key = compiled.key(self.state, direction)
+        keys = np.zeros(n, dtype=np.int32)
+        recorded = memoryview(keys)
+
+        for t in range(n):
+            i = y * size + x
+            k = key + tile[i]
+            recorded[t] = k
+            tile[i] = step_write[k]
+            key = step_next_key[k]
+            direction = step_direction[k]
+            x += dx[direction]
+            y += dy[direction]
+            if not (0 <= x < size and 0 <= y < size):
+                tile_x += x // size
+                tile_y += y // size
+                x %= size
+                y %= size
+                tile = tiles.get((tile_x, tile_y))
+                if tile is None:
+                    tile = self._allocate(tile_x, tile_y)
+                entered_tiles.add((tile_x, tile_y))
+
+        self.x = tile_x * size + x
+        self.y = tile_y * size + y
+        self.direction = Directions(direction)
+        self.state = compiled.key_state(key)
+        self.steps += n
+        return keys
+
+    def _materialize(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        written = []
+        while self._pending_fills:
+            written.append(self._pending_fills.pop(0)(_UnboundedCells(self)))
+        return written
+
+    def _tile_groups(self, xs: np.ndarray, ys: np.ndarray):
+        # (tile position, indices of its cells) of every tile the cells (xs[i], ys[i]) are in
+        tile_xs = xs.reshape(-1) // self.tile_size
+        tile_ys = ys.reshape(-1) // self.tile_size
+        if not len(tile_xs):
+            return
+        # the cells sorted by their tile (a highway gives long sorted runs, cheap for the stable sort)
+        tile_keys = (tile_ys - tile_ys.min()) * (int(tile_xs.max() - tile_xs.min()) + 1) + tile_xs - tile_xs.min()
+        order = np.argsort(tile_keys, kind="stable")
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(tile_keys[order])) + 1, [len(order)]))
+        for start, end in zip(starts[:-1].tolist(), starts[1:].tolist()):
+            first = order[start]
+            yield (int(tile_xs[first]), int(tile_ys[first])), np.unravel_index(order[start:end], xs.shape)
+
+    def _allocate(self, tile_x: int, tile_y: int) -> bytearray:
+        tile = bytearray(self.tile_size * self.tile_size)
+        self._tiles[(tile_x, tile_y)] = tile
+
+        if self.tile_bounds is None:
+            self.tile_bounds = (tile_x, tile_y, tile_x, tile_y)
+        else:
+            min_x, min_y, max_x, max_y = self.tile_bounds
+            self.tile_bounds = (min(min_x, tile_x), min(min_y, tile_y), max(max_x, tile_x), max(max_y, tile_y))
+        return tile
+
+    def _grid_rect(self) -> tuple[int, int, int, int]:
+        if self.viewport is not None:
+            return self.viewport
+        bounds = self.bounding_box
+        if bounds is None:
+            return self.x, self.y, 1, 1
+        return bounds[0], bounds[1], bounds[2] - bounds[0] + 1, bounds[3] - bounds[1] + 1
+
+    def _tile_view(self, tile: bytearray) -> np.ndarray:
+        view = np.frombuffer(tile, dtype=np.uint8).reshape(self.tile_size, self.tile_size)
+        view.flags.writeable = False
+        return view
+
+
+class _UnboundedCells:
+    """The cells of the plane as cells[ys, xs] = colors for the deferred fills, the tiles are allocated as written."""
+
+    def __init__(self, engine: UnboundedAntEngine):
+        self.engine = engine
+
+    def __setitem__(self, index: tuple[np.ndarray, np.ndarray], colors):
+        engine = self.engine
+        size = engine.tile_size
+        ys, xs = (np.asarray(i) for i in index)
+        colors = np.broadcast_to(np.asarray(colors, dtype=np.uint8), xs.shape)
+        for position, indices in engine._tile_groups(xs, ys):
+            tile = engine._tiles.get(position)
+            if tile is None:
+                tile = engine._allocate(*position)
+            engine._entered_tiles.add(position)
+            cells = np.frombuffer(tile, dtype=np.uint8).reshape(size, size)
+            cells[ys[indices] % size, xs[indices] % size] = colors[indices]
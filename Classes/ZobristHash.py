@@ -0,0 +1,44 @@
+import numpy as np
+
+from Classes.RuleCompiler import CompiledRules
+
+HASH_MASK = (1 << 64) - 1
+
+
+class ZobristHash:
+    """
+    64-bit hash of the simulation state (grid, ant position, direction and state).
+
+    Every cell has a random key and every color a random multiplier (0 for the empty color),
+    the grid hash is the sum of cell_key * color_key over the cells (mod 2^64). A written cell
+    changes the sum by one product, so the hash is updated in O(1) per step. The ant adds
+    cell_key(ant cell) * ant_key(state, direction) on top of the grid hash.
+    """
+
+    def __init__(self, width: int, height: int, compiled: CompiledRules, seed: int = 0x5EED):
+        rng = np.random.default_rng(seed)
+        self.width = width
+        self.height = height
+
+        self.cell_keys = rng.integers(0, HASH_MASK, size=width * height, dtype=np.uint64, endpoint=True)
+        self.color_keys = rng.integers(1, HASH_MASK, size=compiled.colors, dtype=np.uint64, endpoint=True)
+        self.color_keys[0] = 0
+
+        # memoryview items are plain Python ints, that is what the stepping loop needs
+        self.cell_keys_view = memoryview(self.cell_keys)
+
+        # hash change of the cell for every step key (color written - color read), indexed by the step key
+        color_keys = self.color_keys.tolist()
+        self.write_deltas = [(color_keys[write] - color_keys[k % compiled.colors]) & HASH_MASK
+                             for k, write in enumerate(compiled.step_write)]
+
+        # ant state and direction, indexed by the step key of the empty color (the key kept by the loop)
+        ant_keys = rng.integers(1, HASH_MASK, size=compiled.states * 4, dtype=np.uint64, endpoint=True).tolist()
+        self.ant_keys = [ant_keys[k // compiled.colors] for k in range(len(compiled.step_write))]
+
+    def grid_hash(self, grid: np.ndarray) -> int:
+        # full computation, the uint64 arithmetic wraps around (mod 2^64)
+        return int(np.sum(self.cell_keys * self.color_keys[grid.reshape(-1)], dtype=np.uint64))
+
+    def state_hash(self, grid_hash: int, x: int, y: int, key: int) -> int:
+        return (grid_hash + int(self.cell_keys[y * self.width + x]) * self.ant_keys[key]) & HASH_MASK
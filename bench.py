@@ -0,0 +1,223 @@
+"""
+Benchmarks of the stepping, the rendering and the palette code, the results go to a JSON
+file with the machine metadata; compare flags the regressions against a baseline file.
+
+    python bench.py run --out baseline.json
+    python bench.py run --out current.json
+    python bench.py compare baseline.json current.json --threshold 10
+
+The Qt parts run on the offscreen platform (no window is shown).
+"""
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+
+from Classes.Benchmark import (
+    BenchmarkResult,
+    compare_results,
+    load_results,
+    machine_metadata,
+    measure,
+    save_results
+)
+
+BENCHMARK_RULES = ["RL", "RLLR", "LRRRRRLLR", "RRLLLRLLLRRR", "LLRRRLRLRLLRRLRLRRLR"]
+
+
+def bench_ant_loop(main, quick: bool) -> list[BenchmarkResult]:
+    # the stepping kernel behind ant_loop(), highways are stepped (extrapolating them would skip the kernel)
+    results = []
+    steps = 50_000 if quick else 200_000
+    for size in (64, 512) if quick else (64, 512, 2048):
+        for rules in BENCHMARK_RULES:
+            compiled = main.compile_rules(rules)
+            set_grid_size(main, size, compiled.colors)
+            main.reinit_ant(compiled)
+            seconds = measure(lambda: main.ant_loop(steps), repeat=3, min_time=0)
+            results.append(BenchmarkResult("ant_loop", {"rules": len(rules), "grid": size}, steps / seconds,
+                                           "steps/s", True))
+    return results
+
+
+def bench_macro_highway(main, quick: bool) -> list[BenchmarkResult]:
+    # the RL highway (from step 11000) stepped by the macro engine and by the plain one
+    from Classes.AntEngine import AntEngine
+    from Classes.MacroEngine import MacroAntEngine
+
+    results = []
+    steps = 20_000 if quick else 30_000
+    for name, engine_class in (("macro", MacroAntEngine), ("plain", AntEngine)):
+        engine = engine_class("RL", 4096, 4096)
+        engine.step(11_000)
+        seconds = measure(lambda: engine.step(steps), repeat=3, min_time=0)
+        results.append(BenchmarkResult("macro_highway", {"engine": name, "grid": 4096}, steps / seconds,
+                                       "steps/s", True))
+    return results
+
+
+def bench_reinit_ant(main, quick: bool) -> list[BenchmarkResult]:
+    results = []
+    for size in (64, 512) if quick else (64, 512, 2048):
+        for rules in ("RL", "RLLR"):
+            compiled = main.compile_rules(rules)
+            set_grid_size(main, size, compiled.colors)
+            results.append(BenchmarkResult("reinit_ant", {"rules": len(rules), "grid": size},
+                                           measure(lambda: main.reinit_ant(compiled)), "s", False))
+    return results
+
+
+def bench_grid_paint(main, quick: bool) -> list[BenchmarkResult]:
+    # a full frame of the grid canvas with the visited part of the grid colored
+    from PySide6.QtGui import QImage
+
+    canvas = main.grid_canvas
+    height, width = main.grid_height, main.grid_width
+    target = QImage(canvas.size(), QImage.Format.Format_ARGB32)
+    canvas.setColors(main.COLORS)
+    rng = np.random.default_rng(0)
+    results = []
+    for fraction in (0, 0.1, 1) if quick else (0, 0.01, 0.1, 0.5, 1):
+        visited = int(fraction * width * height)
+        grid = np.zeros(width * height, dtype=np.uint8)
+        grid[rng.choice(width * height, visited, replace=False)] = rng.integers(1, len(main.COLORS), visited)
+        canvas.setGrid(grid.reshape(height, width))
+        results.append(BenchmarkResult("GridCanvas.paintEvent", {"grid": f"{width}x{height}", "visited": visited},
+                                       measure(lambda: canvas.render(target)), "s", False))
+    return results
+
+
+def bench_rules_paint(main, quick: bool) -> list[BenchmarkResult]:
+    from PySide6.QtGui import QImage
+
+    canvas = main.rules_canvas
+    target = QImage(canvas.size(), QImage.Format.Format_ARGB32)
+    results = []
+    for length in (2, 20) if quick else (2, 10, 20):
+        rules = ("RL" * length)[:length]
+        canvas.addRules(rules, main.color_gradient(main.gradient_starting_color, main.gradient_ending_color, length))
+        results.append(BenchmarkResult("RulesCanvas.paintEvent", {"rules": length},
+                                       measure(lambda: canvas.render(target)), "s", False))
+    return results
+
+
+def bench_colors(main, quick: bool) -> list[BenchmarkResult]:
+    results = []
+    for steps in (2, 20, 256):
+        results.append(BenchmarkResult("color_gradient", {"colors": steps}, measure(
+            lambda: main.color_gradient(main.gradient_starting_color, main.gradient_ending_color, steps)), "s", False))
+    results.append(BenchmarkResult("update_colors_list", {"colors": 20},
+                                   measure(lambda: main.update_colors_list(20)), "s", False))
+    return results
+
+
+BENCHMARKS = {
+    "ant_loop": bench_ant_loop,
+    "macro_highway": bench_macro_highway,
+    "reinit_ant": bench_reinit_ant,
+    "grid_paint": bench_grid_paint,
+    "rules_paint": bench_rules_paint,
+    "colors": bench_colors,
+}
+
+
+def set_grid_size(main, size: int, colors: int):
+    # the engine of a size x size grid, as if the canvas had that size
+    main.CANVAS_WIDTH = size * main.resolution
+    main.CANVAS_HEIGHT = size * main.resolution
+    main.updateGridSize(colors)
+
+
+def run_benchmarks(names: list[str], quick: bool, verbose: bool = True) -> list[BenchmarkResult]:
+    # the GUI is made offscreen, the worker thread stays paused, everything runs on this thread
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    import main
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    main.use_checkpoint_cache = False
+    main.use_highway_detection = False
+    window = main.MainWindow("ui/LangtonsAnt.ui")
+    canvas_size = (main.CANVAS_WIDTH, main.CANVAS_HEIGHT)
+
+    results = []
+    try:
+        for name in names:
+            for result in BENCHMARKS[name](main, quick):
+                results.append(result)
+                if verbose:
+                    print(f"{result.key}: {result.value:,.6g} {result.unit}", file=sys.stderr)
+            # the grid of the canvas again for the next benchmark
+            main.CANVAS_WIDTH, main.CANVAS_HEIGHT = canvas_size
+            main.updateGridSize()
+    finally:
+        main.simulation_worker.stop()
+    del window, app
+    return results
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks of Langton's ant.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--out", default="bench.json", help="JSON file of the results")
+    run.add_argument("--quick", action="store_true", help="fewer sizes and steps")
+    run.add_argument("--filter", default="", help=f"regex of the benchmarks to run ({', '.join(BENCHMARKS)})")
+    run.add_argument("--quiet", action="store_true", help="no progress output")
+
+    compare = commands.add_parser("compare", help="compare the results with a baseline")
+    compare.add_argument("baseline", help="JSON file of the baseline")
+    compare.add_argument("current", help="JSON file of the compared run")
+    compare.add_argument("--threshold", type=float, default=10, help="slowdown in percent flagged as a regression")
+    return parser.parse_args(argv)
+
+
+def main_run(args: argparse.Namespace) -> int:
+    names = [name for name in BENCHMARKS if re.search(args.filter, name)]
+    if not names:
+        print(f"Error: no benchmark matches '{args.filter}'", file=sys.stderr)
+        return 1
+    results = run_benchmarks(names, args.quick, not args.quiet)
+    save_results(args.out, results, machine_metadata())
+    return 0
+
+
+def main_compare(args: argparse.Namespace) -> int:
+    try:
+        baseline, baseline_metadata = load_results(args.baseline)
+        current, current_metadata = load_results(args.current)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if baseline_metadata.get("platform") != current_metadata.get("platform") or \
+            baseline_metadata.get("processor") != current_metadata.get("processor"):
+        print("Warning: the runs come from different machines", file=sys.stderr)
+
+    comparisons = compare_results(baseline, current, args.threshold / 100)
+    for comparison in comparisons:
+        flag = "REGRESSION" if comparison.regression else ""
+        print(f"{comparison.key:50} {comparison.baseline:14,.6g} {comparison.current:14,.6g} {comparison.unit:8} "
+              f"{100 * comparison.slowdown:+7.1f} % {flag}")
+    regressions = sum(comparison.regression for comparison in comparisons)
+    print(f"{regressions} regression(s) of {len(comparisons)} benchmarks (threshold {args.threshold:g} %)")
+    return 1 if regressions else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    for name in ("out", "baseline", "current"):
+        if hasattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    # the GUI loads its files relative to the project directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.command == "run":
+        return main_run(args)
+    return main_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
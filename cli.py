@@ -0,0 +1,234 @@
+"""
+Headless batch runner, no Qt needed.
+
+    python cli.py --rules RLLR --steps 1e9 --size 4096x4096 --out run.png --state run.npz
+"""
+import argparse
+import re
+import sys
+import time
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.ColorGradient import (
+    GRADIENT_START_COLOR,
+    GRADIENT_END_COLOR,
+    BACKGROUND_COLOR,
+    color_gradient,
+    color_palette
+)
+from Classes.EngineState import load_state, save_state
+from Classes.HighwayDetector import HighwayDetector
+from Classes.MacroEngine import MacroAntEngine
+from Classes.PackedEngine import create_engine
+from Classes.PagedEngine import PagedAntEngine
+from Classes.PerfMetrics import PHASE_CHECKPOINT, PHASE_STEP, PerfMetrics, memory_per_cell
+from Classes.PngExport import export_png
+from Classes.Recorder import RECORD_EXTENSIONS, Recorder
+from Classes.SnapshotFile import save_snapshot
+from Classes.RuleCompiler import compile_rules, compile_turmite
+from Classes.TrajectoryLog import TrajectoryLog, TrajectoryWriter
+
+
+def parse_steps(text: str) -> int:
+    # "1e9", "1000000" or "1_000_000"
+    steps = float(text.replace("_", ""))
+    if steps < 0 or steps != int(steps):
+        raise argparse.ArgumentTypeError(f"Invalid number of steps: '{text}'")
+    return int(steps)
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    match = re.fullmatch(r"(\d+)[xX](\d+)", text)
+    if not match or int(match[1]) < 1 or int(match[2]) < 1:
+        raise argparse.ArgumentTypeError(f"Invalid grid size: '{text}' (WIDTHxHEIGHT expected)")
+    return int(match[1]), int(match[2])
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Runs Langton's ant without the GUI.")
+    rules = parser.add_mutually_exclusive_group()
+    rules.add_argument("--rules", help="rule string, e.g. RLLR (R, L, U, N)")
+    rules.add_argument("--turmite", help="turmite table, e.g. \"{{{1, 2, 0}, {0, 8, 0}}}\"")
+    parser.add_argument("--steps", type=parse_steps, default=0, help="steps to run, e.g. 1e9")
+    parser.add_argument("--size", type=parse_size, default=(1024, 1024), help="grid size WIDTHxHEIGHT")
+    parser.add_argument("--resume", metavar="STATE", help="continue from a saved state (.npz or .lant)")
+    parser.add_argument("--replay", metavar="LOG", help="continue from a step of a trajectory log (see --log)")
+    parser.add_argument("--at", type=parse_steps, metavar="STEP",
+                        help="step of the --replay log (its end by default)")
+    parser.add_argument("--out", help="PNG image of the final grid")
+    parser.add_argument("--scale", type=int, default=1, help="pixels per cell of the image")
+    parser.add_argument("--crop", action="store_true",
+                        help="only the bounding box of the visited cells in --out and --preview")
+    parser.add_argument("--preview", metavar="FILE",
+                        help="PNG of the final grid downsampled (mean color of the blocks of cells)")
+    parser.add_argument("--preview-size", type=int, default=1024, metavar="PIXELS",
+                        help="the longer side of --preview at most")
+    parser.add_argument("--state", help="save the final state (.npz, or a binary snapshot .lant)")
+    parser.add_argument("--checkpoint-every", type=parse_steps, default=0, metavar="STEPS",
+                        help="save a snapshot every STEPS steps")
+    parser.add_argument("--checkpoint", default="checkpoint-{steps}.lant",
+                        help="path of the checkpoint snapshots, {steps} is replaced by the step")
+    parser.add_argument("--log", metavar="DIR",
+                        help="record the trajectory (the color read by every step) with keyframes into DIR")
+    parser.add_argument("--keyframe-every", type=parse_steps, default=1 << 24, metavar="STEPS",
+                        help="steps between the keyframes of --log")
+    parser.add_argument("--record", metavar="FILE",
+                        help=f"record an animation of the grid ({', '.join(RECORD_EXTENSIONS)})")
+    parser.add_argument("--record-every", type=parse_steps, default=0, metavar="STEPS",
+                        help="steps between the frames of --record (every chunk of 2^20 steps by default)")
+    parser.add_argument("--fps", type=float, default=25, help="frame rate of --record")
+    parser.add_argument("--record-scale", type=int, default=1, help="pixels per cell of --record")
+    parser.add_argument("--start-color", default=GRADIENT_START_COLOR)
+    parser.add_argument("--end-color", default=GRADIENT_END_COLOR)
+    parser.add_argument("--background", default=BACKGROUND_COLOR)
+    parser.add_argument("--paged", metavar="FILE",
+                        help="keep the grid in FILE (memory-mapped), for the grids larger than the memory")
+    parser.add_argument("--cache-tiles", type=int, default=64,
+                        help="256x256 tiles of a --paged grid kept in memory")
+    parser.add_argument("--no-packed", action="store_true",
+                        help="a byte per cell for the two-colour rules too (8 cells per byte by default)")
+    parser.add_argument("--macro", action="store_true",
+                        help="memoize tile traversals, skips the highways of any rule without extrapolating them")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="time series of steps/s, phase timings and memory per cell (.csv or .json)")
+    parser.add_argument("--metrics-interval", type=float, default=1.0, metavar="SECONDS",
+                        help="seconds between the rows of --metrics")
+    parser.add_argument("--no-highways", action="store_true", help="step highways instead of extrapolating them")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+
+    args = parser.parse_args(argv)
+    if args.resume and args.replay:
+        parser.error("--resume and --replay can not be used together")
+    if not args.resume and not args.replay and not (args.rules or args.turmite):
+        parser.error("--rules or --turmite is needed (or --resume or --replay)")
+    if args.at is not None and not args.replay:
+        parser.error("--at needs --replay")
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+    if args.preview_size < 1:
+        parser.error("--preview-size must be at least 1")
+    if args.paged and (args.resume or args.replay):
+        parser.error("--paged can not be used with --resume or --replay")
+    if args.keyframe_every < 1:
+        parser.error("--keyframe-every must be at least 1")
+    if args.metrics_interval <= 0:
+        parser.error("--metrics-interval must be positive")
+    if args.fps <= 0:
+        parser.error("--fps must be positive")
+    if args.record_scale < 1:
+        parser.error("--record-scale must be at least 1")
+    return args
+
+
+def grid_palette(args: argparse.Namespace, colors: int) -> np.ndarray:
+    # the same palette as the GUI: gradient over the rule colors, color 0 is the background
+    return color_palette(color_gradient(args.start_color, args.end_color, colors), args.background)
+
+
+def run(args: argparse.Namespace, metrics: PerfMetrics | None = None) -> AntEngine:
+    metrics = metrics if metrics is not None else PerfMetrics()
+    if args.resume:
+        engine = load_state(args.resume)
+    elif args.replay:
+        log = TrajectoryLog(args.replay)
+        engine = log.seek(log.end if args.at is None else args.at)
+    else:
+        compiled = compile_rules(args.rules) if args.rules else compile_turmite(args.turmite)
+        if args.paged:
+            engine = PagedAntEngine(compiled, *args.size, path=args.paged, cache_tiles=args.cache_tiles)
+        elif args.macro:
+            engine = MacroAntEngine(compiled, *args.size)
+        elif args.no_packed:
+            engine = AntEngine(compiled, *args.size)
+        else:
+            engine = create_engine(compiled, *args.size)
+
+    # every step of a logged run is traced, the highways are not extrapolated
+    writer = TrajectoryWriter(engine, args.log, args.keyframe_every) if args.log else None
+    detector = None if args.no_highways or args.macro or writer else HighwayDetector(engine)
+    # every frame is recorded (the encoder is waited for), the first one is the start
+    recorder = Recorder(args.record, args.fps, args.record_every, args.record_scale, drop=False) \
+        if args.record else None
+    palette = grid_palette(args, engine.compiled.colors)
+    if recorder is not None:
+        recorder.offer(engine.rows(0, engine.height), palette, engine.steps)
+    target = engine.steps + args.steps
+    started = time.perf_counter()
+    last_report = started
+    every = args.checkpoint_every
+    while engine.steps < target:
+        chunk = min(target - engine.steps, 1 << 20)
+        if every:
+            # the chunk ends at the next checkpoint
+            chunk = min(chunk, every - engine.steps % every)
+        if recorder is not None and args.record_every:
+            chunk = min(chunk, args.record_every - engine.steps % args.record_every)
+        timed = metrics.start(PHASE_STEP)
+        if writer is not None:
+            writer.advance(chunk)
+        elif detector is not None:
+            detector.advance(chunk)
+        else:
+            engine.step(chunk)
+        metrics.stop(PHASE_STEP, timed)
+        metrics.count_steps(chunk)
+        if every and engine.steps % every == 0:
+            timed = metrics.start(PHASE_CHECKPOINT)
+            save_snapshot(engine, args.checkpoint.format(steps=engine.steps), compress=True)
+            metrics.stop(PHASE_CHECKPOINT, timed)
+        if recorder is not None and recorder.due(engine.steps):
+            recorder.offer(engine.rows(0, engine.height), palette, engine.steps)
+        if metrics.enabled:
+            metrics.sample(memory_per_cell(engine))
+
+        now = time.perf_counter()
+        if not args.quiet and now - last_report >= 5:
+            last_report = now
+            print(f"{engine.steps:,} / {target:,} steps ({engine.steps / (now - started):,.0f} steps/s)",
+                  file=sys.stderr)
+
+    if writer is not None:
+        writer.close()
+    if recorder is not None:
+        recorder.close()
+    if metrics.enabled:
+        metrics.sample(memory_per_cell(engine), force=True)
+    if not args.quiet:
+        print(f"{engine.steps:,} steps in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    return engine
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    metrics = PerfMetrics(enabled=bool(args.metrics), interval=args.metrics_interval)
+    try:
+        engine = run(args, metrics)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.metrics:
+        metrics.export(args.metrics)
+
+    palette = grid_palette(args, engine.compiled.colors)
+    try:
+        if args.out:
+            # unpacked band by band, the whole grid is never in memory a byte per cell
+            export_png(args.out, engine.width, engine.height, engine.rows, palette, args.scale, args.crop)
+        if args.preview:
+            export_png(args.preview, engine.width, engine.height, engine.rows, palette, crop=args.crop,
+                       max_size=args.preview_size)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.state:
+        save_state(engine, args.state)
+    if isinstance(engine, PagedAntEngine):
+        engine.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
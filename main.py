@@ -1,6 +1,6 @@
 import sys
 import re
-from enum import IntEnum
+import time
 
 
 from PySide6.QtUiTools import QUiLoader
@@ -8,43 +8,94 @@ from PySide6.QtCore import (
     QFile,
     QTimer
 )
-from PySide6.QtGui import QColor
 from PySide6.QtWidgets import (
     QApplication,
     QWidget,
     QPushButton,
     QLineEdit,
     QLabel,
-    QComboBox
+    QComboBox,
+    QFileDialog,
+    QSlider
 )
 
 from Classes.Canvas import GridCanvas, RulesCanvas
 from Classes.DialogWindow import WarningDialog
 from Classes.ColorPicker import ColorPicker
+from Classes.AntEngine import AntEngine
+from Classes.HighwayDetector import HighwayDetector
+from Classes.CycleFinder import CycleFinder
+from Classes.MultiAntEngine import MultiAntEngine
+from Classes.PackedEngine import PackedAntEngine
+from Classes.UnboundedEngine import UnboundedAntEngine
+from Classes.CheckpointCache import CheckpointCache
+from Classes.SnapshotFile import SNAPSHOT_EXTENSION, load_snapshot, read_header, save_snapshot
+from Classes.RuleCompiler import compile_rules, CompiledRules
+from Classes.ColorGradient import (
+    GRADIENT_START_COLOR,
+    GRADIENT_END_COLOR,
+    BACKGROUND_COLOR,
+    color_gradient,
+    color_palette,
+    get_middle_color,
+    hex_to_rgb
+)
+from Classes.SimulationWorker import SimulationWorker
+from Classes.FrameScheduler import FrameScheduler
+from Classes.PngExport import export_png
+from Classes.Recorder import RECORD_EXTENSIONS, Recorder
+from Classes.PerfMetrics import PHASE_LABEL, PHASE_REPAINT, TIMER_LATENESS, PerfMetrics, memory_per_cell, overlay_lines
 
-ant_tick_period: int = 1            # [ms]
-ant_repaint_grid_period: int = 20   # [ms]
-ant_moves_per_tick: int = 1
+ant_tick_period: int = 1            # [ms] the speed combo box gives the steps per tick
+ant_repaint_grid_period: int = 20   # [ms] frame of the GUI and of the stepping scheduler
+ant_moves_per_tick: int = 1         # 0 = unlimited
 
 CANVAS_WIDTH: int  = 100
 CANVAS_HEIGHT: int = 100
 resolution: int    = 4
 
+grid_size: int     = 0              # cells of a side of the grid, 0 = the canvas size / resolution (zoom to see more)
 grid_width: int    = int(CANVAS_WIDTH / resolution)
 grid_height: int   = int(CANVAS_HEIGHT / resolution)
-grid: list[list[int]] = []
+
+# -- headless simulation engine (owns the grid and the ant)
+ant_engine: AntEngine | UnboundedAntEngine
+use_packed_grid: bool = True        # two-colour rules keep 8 cells per byte (the canvas shows the bits)
+highway_detector: HighwayDetector | None = None     # None for the engines without a single ant trace
+use_highway_detection: bool = True  # highways are extrapolated instead of stepped
+cycle_finder: CycleFinder | None = None             # and for the unbounded grid (its state is not finite)
+use_cycle_detection: bool = False   # whole grid state recurrence, pays off on small grids only
+ant_count: int = 1                  # more ants share the grid (vectorized stepping)
+use_unbounded_grid: bool = False    # no wrapping, the canvas shows the cells around the start
+checkpoint_cache: CheckpointCache | None = None
+use_checkpoint_cache: bool = True   # Start resumes a rule (or its mirror) from the furthest step it ran to before
+
+# -- the engine is stepped on the worker thread, the GUI shows its snapshots
+simulation_worker: SimulationWorker | None = None
+shown_snapshot_version: int = -1
+shown_steps: int = 0
+
+# -- Rewind steps the ant backwards (no history, the rules are reversible), the slider goes back and forth
+ant_rewinding: bool = False
+furthest_step: int = 0              # the end of the slider, the furthest step the run got to
+SLIDER_RANGE: int = 1 << 30         # the slider positions are scaled down beyond it (QSlider is 32 bit)
+
+# -- timers of the phases (stepping, publishing, repainting), shown over the grid by the Perf button
+perf_metrics: PerfMetrics = PerfMetrics()
+last_repaint_tick: float | None = None     # perf_counter() of the previous frame timer tick
+
+# -- the Rec button records the shown frames (encoded on a background thread, dropped when it falls behind)
+grid_recorder: Recorder | None = None
 
 # -- global widgets for easier access
 steps_count_label: QLabel
+steps_rate_label: QLabel
+steps_slider: QSlider
 grid_canvas: GridCanvas
 rules_canvas: RulesCanvas
 
 
-ant_y_pos: int = 0
-ant_x_pos: int = 0
-ant_direction: int = 0
 ant_stopped: bool = True
-ant_steps: int = 0
 
 #RLLRLLRRRLLRLLRL
 #RLLLLRRRLLL
@@ -66,14 +117,8 @@ COLORS = [
 "#00d5e6", "#00e2cc", "#00f0b3", "#00fd99", "#00ff80"
 ]
 
-gradient_starting_color: str = "#00FF00"
-gradient_ending_color: str = "#0000FF"
-
-class Directions(IntEnum):
-    ANT_UP      = 0
-    ANT_RIGHT   = 1
-    ANT_DOWN    = 2
-    ANT_LEFT    = 3
+gradient_starting_color: str = GRADIENT_START_COLOR
+gradient_ending_color: str = GRADIENT_END_COLOR
 
 class MainWindow(QWidget):
     def __init__(self, ui_file_path):
@@ -95,33 +140,53 @@ class MainWindow(QWidget):
         self.window.setFixedSize(self.window.size())
 
 
-        # Create timer for ant_loop() and ant_repaint_grid(), but don't start them yet
-        self.ant_loop_timer = QTimer()
-        self.ant_loop_timer.setInterval(ant_tick_period)
-        self.ant_loop_timer.timeout.connect(ant_loop)
+        # Create the frame timer for ant_repaint_grid(), but don't start it yet (ant_loop() runs on the worker thread)
         self.ant_repaint_grid_timer = QTimer()
         self.ant_repaint_grid_timer.setInterval(ant_repaint_grid_period)
-        self.ant_repaint_grid_timer.timeout.connect(ant_repaint_grid)
+        self.ant_repaint_grid_timer.timeout.connect(ant_repaint_grid_tick)
+        self.ant_repaint_grid_timer.timeout.connect(self.rewindEndCheck)
+        self.ant_repaint_grid_timer.timeout.connect(self.workerErrorCheck)
 
 
         # create class variables
         self.start_button: QPushButton = QPushButton()
         self.pause_button: QPushButton = QPushButton()
+        self.save_button: QPushButton = QPushButton()
+        self.load_button: QPushButton = QPushButton()
+        self.metrics_button: QPushButton = QPushButton()
+        self.record_button: QPushButton = QPushButton()
+        self.rewind_button: QPushButton = QPushButton()
         self.grad_start_button_clr_picker = None
         self.grad_end_button_clr_picker = None
         self.rules_input: QLineEdit = QLineEdit()
         self.speed_combo_box: QComboBox = QComboBox()
+        self.grid_size_combo_box: QComboBox = QComboBox()
 
         # Setup all widgets
         self.widgets_setup()
 
+        global simulation_worker, checkpoint_cache
+        if use_checkpoint_cache:
+            checkpoint_cache = CheckpointCache()
+
+        # the worker thread owns the engine from now on
+        simulation_worker = SimulationWorker(ant_engine, ant_loop, FrameScheduler(fps=1000 / ant_repaint_grid_period),
+                                             dirty_tile_size=grid_canvas.dirty_tile_size, metrics=perf_metrics)
+        grid_canvas.grid_lock = simulation_worker.grid_lock
+        simulation_worker.set_speed(ant_steps_per_second())
+
     def widgets_setup(self):
-        global steps_count_label
+        global steps_count_label, steps_rate_label, steps_slider
 
         # === Get all widgets from Qt designers layouts
         # Buttons
         self.start_button = self.window.findChild(QPushButton, "btn_start")
         self.pause_button = self.window.findChild(QPushButton, "btn_pause")
+        self.save_button = self.window.findChild(QPushButton, "btn_save")
+        self.load_button = self.window.findChild(QPushButton, "btn_load")
+        self.metrics_button = self.window.findChild(QPushButton, "btn_metrics")
+        self.record_button = self.window.findChild(QPushButton, "btn_record")
+        self.rewind_button = self.window.findChild(QPushButton, "btn_rewind")
         grad_start_col_btn_placeholder = self.window.findChild(QPushButton, "start_color_button")
         grad_end_col_btn_placeholder = self.window.findChild(QPushButton, "end_color_button")
 
@@ -130,9 +195,14 @@ class MainWindow(QWidget):
 
         # Label
         steps_count_label = self.window.findChild(QLabel, "label_ant_steps_count")
+        steps_rate_label = self.window.findChild(QLabel, "label_ant_steps_rate")
+
+        # Slider
+        steps_slider = self.window.findChild(QSlider, "slider_steps")
 
         # Combo Box
         self.speed_combo_box = self.window.findChild(QComboBox, "speed_combo_box")
+        self.grid_size_combo_box = self.window.findChild(QComboBox, "grid_size_combo_box")
 
         # Canvases
         grid_canvas_placeholder = self.window.findChild(QWidget, "canvas_grid")
@@ -144,6 +214,20 @@ class MainWindow(QWidget):
         if self.pause_button:
             self.pause_button.clicked.connect(self.pause_button_clicked)
             self.pause_button.setEnabled(False)
+        if self.save_button:
+            self.save_button.clicked.connect(self.save_button_clicked)
+        if self.load_button:
+            self.load_button.clicked.connect(self.load_button_clicked)
+        if self.metrics_button:
+            self.metrics_button.clicked.connect(self.metrics_button_clicked)
+        if self.record_button:
+            self.record_button.toggled.connect(self.record_button_toggled)
+        if self.rewind_button:
+            self.rewind_button.toggled.connect(self.rewind_button_toggled)
+            self.rewind_button.setEnabled(False)
+        if steps_slider:
+            steps_slider.valueChanged.connect(self.steps_slider_changed)
+            steps_slider.setEnabled(False)
 
         # === Assign initial text to label
         if steps_count_label:
@@ -161,9 +245,18 @@ class MainWindow(QWidget):
             self.speed_combo_box.addItem("200x", 200)
             self.speed_combo_box.addItem("500x", 500)
             self.speed_combo_box.addItem("1000x", 1000)
+            self.speed_combo_box.addItem("Unlimited", 0)
 
             self.speed_combo_box.currentIndexChanged.connect(self.speed_combo_box_changed)
 
+        # === Assign grid size combo box list items
+        if self.grid_size_combo_box:
+            self.grid_size_combo_box.addItem("Fit", 0)
+            for size in (1024, 2048, 4096, 8192):
+                self.grid_size_combo_box.addItem(f"{size} x {size}", size)
+
+            self.grid_size_combo_box.currentIndexChanged.connect(self.grid_size_combo_box_changed)
+
         # === Replacing the placeholders with my custom Canvas class
         if grid_canvas_placeholder:
             global CANVAS_WIDTH, CANVAS_HEIGHT, grid_canvas, COLORS
@@ -172,11 +265,13 @@ class MainWindow(QWidget):
             index = layout.indexOf(grid_canvas_placeholder)
 
             grid_canvas = GridCanvas(
-                "#F0F0F0", grid_canvas_placeholder, parent=grid_canvas_placeholder.parentWidget())
+                BACKGROUND_COLOR, grid_canvas_placeholder, parent=grid_canvas_placeholder.parentWidget())
             CANVAS_WIDTH = grid_canvas.width()
             CANVAS_HEIGHT = grid_canvas.height()
             updateGridSize()
             grid_canvas.setCellSize(resolution)
+            grid_canvas.metrics = perf_metrics
+            grid_canvas.setGrid(ant_engine.grid_view)
 
             # update COLORS list
             update_colors_list(20)
@@ -192,7 +287,7 @@ class MainWindow(QWidget):
             index = layout.indexOf(rules_canvas_placeholder)
 
             rules_canvas = RulesCanvas(
-                "#F0F0F0", rules_canvas_placeholder, parent=rules_canvas_placeholder.parentWidget())
+                BACKGROUND_COLOR, rules_canvas_placeholder, parent=rules_canvas_placeholder.parentWidget())
             rules_canvas.setLeftAndRightImages("ui/right_turn_sign.png", "ui/left_turn_sign.png")
 
             layout.removeWidget(rules_canvas_placeholder)
@@ -236,17 +331,25 @@ class MainWindow(QWidget):
             self.grad_end_button_clr_picker.selectedColorSignal.connect(self.grad_end_btn_clicked)
 
     def start_button_clicked(self):
-        global ant_stopped
+        global ant_stopped, furthest_step
 
         if ant_stopped:
-            reinit_ant()                    # reinitiates the ant
-            grid_canvas.clearAllCells()     # clear the canvas also
-
             if self.updateRulesInput():
+                # compile the validated rules into the transition tables used by the engine
+                compiled_rules = compile_rules(ANTS_RULES)
+                simulation_worker.wait()    # the checkpoint of the stop is saved from the old engine
+                fit_engine(compiled_rules.colors)
+                furthest_step = 0
+                simulation_worker.call(reinit_ant, compiled_rules)   # reinitiates the ant (from the cache)
+                simulation_worker.wait()
+                steps_count_label.setText("0")
+                steps_count_label.setToolTip("")
+                ant_repaint_grid()  # clear the canvas also
+
                 #print("Rules: " + ANTS_RULES)
                 ant_stopped = False
-                self.ant_loop_timer.start()
-                self.ant_repaint_grid_timer.start()
+                simulation_worker.start()
+                self.startRepaintTimer()
 
                 # update COLORS list
                 update_colors_list(len(ANTS_RULES))
@@ -257,31 +360,201 @@ class MainWindow(QWidget):
                     self.start_button.setText("Stop")
                 if self.pause_button:
                     self.pause_button.setEnabled(True)
+                self.setRewindEnabled(True)
 
         else:
             ant_stopped = True
-            self.ant_loop_timer.stop()
+            simulation_worker.pause()
+            simulation_worker.call(save_checkpoint)
             self.ant_repaint_grid_timer.stop()
             if self.start_button:
                 self.start_button.setText("Start")
             if self.pause_button:
                 self.pause_button.setText("Pause")
                 self.pause_button.setEnabled(False)
+            self.setRewindEnabled(False)
 
     def pause_button_clicked(self):
-        if self.ant_loop_timer.isActive():
-            self.ant_loop_timer.stop()
+        if self.ant_repaint_grid_timer.isActive():
+            simulation_worker.pause()
+            simulation_worker.call(save_checkpoint)
             self.ant_repaint_grid_timer.stop()
             self.pause_button.setText("Play")
         elif not ant_stopped:
-            self.ant_loop_timer.start()
-            self.ant_repaint_grid_timer.start()
+            simulation_worker.start()
+            self.startRepaintTimer()
             self.pause_button.setText("Pause")
 
+    def save_button_clicked(self):
+        path, _ = QFileDialog.getSaveFileName(self.window, "Save snapshot", "",
+                                              f"Langton's ant snapshot (*{SNAPSHOT_EXTENSION});;PNG image (*.png)")
+        if not path:
+            return
+        if path.lower().endswith(".png"):
+            # the shown grid, as drawn by the canvas
+            error = call_on_worker(export_grid_png, path)
+            if error:
+                show_warn_popup("Snapshot warning", f"Image could not be saved!\n\n{error}")
+            return
+        if not saves_snapshots():
+            show_warn_popup("Snapshot warning", "Only a single ant on the wrapped grid can be saved!")
+            return
+        if not path.endswith(SNAPSHOT_EXTENSION):
+            path += SNAPSHOT_EXTENSION
+
+        # saved on the worker thread between two frames, the running simulation goes on
+        palette = [hex_to_rgb(color) for color in COLORS]
+        error = call_on_worker(save_snapshot, ant_engine, path, palette, True)
+        if error:
+            show_warn_popup("Snapshot warning", f"Snapshot could not be saved!\n\n{error}")
+
+    def load_button_clicked(self):
+        global ANTS_RULES, ant_stopped, COLORS, furthest_step
+        if not saves_snapshots():
+            show_warn_popup("Snapshot warning", "Only a single ant on the wrapped grid can be loaded!")
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self.window, "Load snapshot", "",
+                                              f"Langton's ant snapshot (*{SNAPSHOT_EXTENSION})")
+        if not path:
+            return
+        try:
+            header = read_header(path)
+        except (OSError, ValueError) as e:
+            show_warn_popup("Snapshot warning", f"Snapshot could not be loaded!\n\n{e}")
+            return
+        if (header.width, header.height) != (grid_width, grid_height):
+            show_warn_popup("Snapshot warning", f"Snapshot grid {header.width}x{header.height} does not match "
+                                                f"the grid {grid_width}x{grid_height}!")
+            return
+
+        simulation_worker.pause()
+        simulation_worker.wait()        # the worker is done with the engine before fit_engine() replaces it
+        self.ant_repaint_grid_timer.stop()
+        fit_engine(header.colors)
+        error = call_on_worker(load_ant, path)
+        if error:
+            show_warn_popup("Snapshot warning", f"Snapshot could not be loaded!\n\n{error}")
+            return
+
+        # the loaded state is shown paused, Play continues it
+        ANTS_RULES = header.rules
+        self.rules_input.setText(header.rules)
+        if header.palette is not None and len(header.palette) == header.colors:
+            COLORS = [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in header.palette.tolist()]
+        else:
+            update_colors_list(header.colors)
+        grid_canvas.setColors(COLORS)
+        rules_canvas.addRules(ANTS_RULES, COLORS)
+        furthest_step = 0
+        ant_repaint_grid()
+
+        ant_stopped = False
+        if self.start_button:
+            self.start_button.setText("Stop")
+        if self.pause_button:
+            self.pause_button.setText("Play")
+            self.pause_button.setEnabled(True)
+        self.setRewindEnabled(True)
+
+    def rewind_button_toggled(self, checked: bool):
+        # the worker steps the ant backwards at the same speed until it gets to step 0
+        global ant_rewinding
+        ant_rewinding = checked
+
+    def rewindEndCheck(self):
+        # the rewound ant stops at step 0 (the worker pauses itself, then it can go forward again),
+        # there is nothing to rewind at step 0
+        if not self.rewind_button or ant_stopped:
+            return
+        if ant_rewinding and shown_steps == 0 and self.ant_repaint_grid_timer.isActive():
+            self.pause_button_clicked()
+            simulation_worker.wait()
+            self.rewind_button.setChecked(False)
+        self.rewind_button.setEnabled(shown_steps > 0)
+
+    def workerErrorCheck(self):
+        # the worker pauses on an error of the simulation, the GUI pauses too and shows it
+        error, simulation_worker.error = simulation_worker.error, None
+        if error is None:
+            return
+        if self.ant_repaint_grid_timer.isActive():
+            self.pause_button_clicked()
+        ant_repaint_grid()
+        show_warn_popup("Simulation warning", f"The simulation stopped!\n\n{error}")
+
+    def steps_slider_changed(self, position: int):
+        # the ant goes to the step of the slider, back by reverse stepping, forward by stepping again
+        error = call_on_worker(seek_ant, slider_step(position))
+        if error:
+            show_warn_popup("Steps slider warning", f"The ant can not go to step {slider_step(position)}!\n\n{error}")
+        ant_repaint_grid()
+        self.rewindEndCheck()
+
+    def setRewindEnabled(self, enabled: bool):
+        if self.rewind_button:
+            self.rewind_button.setEnabled(enabled)
+            if not enabled:
+                self.rewind_button.setChecked(False)
+        if steps_slider:
+            steps_slider.setEnabled(enabled)
+
+    def metrics_button_clicked(self, checked: bool):
+        # the timers measure only while the overlay is shown
+        perf_metrics.reset()
+        perf_metrics.enabled = checked
+        grid_canvas.setOverlay(["measuring..."] if checked else [])
+
+    def record_button_toggled(self, checked: bool):
+        global grid_recorder
+        if not checked:
+            if grid_recorder is not None:
+                recorder, grid_recorder = grid_recorder, None
+                try:
+                    recorder.close()
+                except (OSError, ValueError, IndexError) as e:
+                    show_warn_popup("Recording warning", f"Recording could not be saved!\n\n{e}")
+                    return
+                self.record_button.setToolTip(f"{recorder.recorded} frames recorded, {recorder.dropped} dropped")
+            return
+
+        path, _ = QFileDialog.getSaveFileName(self.window, "Record", "",
+                                              "GIF (*.gif);;Animated PNG (*.png);;Raw RGB frames (*.rgb)")
+        if path and not path.lower().endswith(RECORD_EXTENSIONS):
+            path += ".gif"
+        try:
+            # a frame of every repaint, the frame rate of the timer
+            grid_recorder = Recorder(path, fps=1000 / ant_repaint_grid_period) if path else None
+        except (OSError, ValueError) as e:
+            show_warn_popup("Recording warning", f"Recording could not be started!\n\n{e}")
+        if grid_recorder is None:
+            self.record_button.setChecked(False)
+
+    def startRepaintTimer(self):
+        global last_repaint_tick
+        # the lateness of the first tick is not measured (the pause before it is not a late frame)
+        last_repaint_tick = None
+        self.ant_repaint_grid_timer.start()
+
     def speed_combo_box_changed(self):
         global ant_moves_per_tick
         speed = self.speed_combo_box.currentData()
         ant_moves_per_tick = speed
+        simulation_worker.set_speed(ant_steps_per_second())
+
+    def grid_size_combo_box_changed(self):
+        global grid_size
+        # a new grid stops the ant
+        if not ant_stopped:
+            self.start_button_clicked()
+        grid_size = self.grid_size_combo_box.currentData()
+        # the worker is done with the old engine (and the checkpoint of the stop) before it is replaced
+        simulation_worker.pause()
+        simulation_worker.wait()
+        updateGridSize()
+        simulation_worker.wait()
+        steps_count_label.setText("0")
+        ant_repaint_grid()
 
     def grad_start_btn_clicked(self, selected_color: str):
         global COLORS, gradient_starting_color
@@ -350,134 +623,195 @@ class MainWindow(QWidget):
 
 
 # ==== Globally defined functions ====
-def color_gradient(color_start_hex: str, color_end_hex: str, steps: int) -> list[str]:
-    c_start = tuple(int(color_start_hex[i:i+2], 16) for i in (1, 3, 5))
-    c_end = tuple(int(color_end_hex[i:i+2], 16) for i in (1, 3, 5))
-
-    colors: list[str] = []
-    for i in range(steps):
-        t = i / (steps - 1)
-        r = lin_interpolation(c_start[0], c_end[0], t)
-        g = lin_interpolation(c_start[1], c_end[1], t)
-        b = lin_interpolation(c_start[2], c_end[2], t)
-        colors.append(f"#{r:02X}{g:02X}{b:02X}")
-
-    return colors
-
-def lin_interpolation(a, b, t):
-    return int(a + (b - a) * t)
-
-def get_middle_color(color_start_hex: str, color_end_hex: str) -> str:
-    color_start = QColor(color_start_hex)
-    color_end = QColor(color_end_hex)
-
-    r = (color_start.red()   + color_end.red()) // 2
-    g = (color_start.green() + color_end.green()) // 2
-    b = (color_start.blue()  + color_end.blue()) // 2
-
-    return f"#{r:02X}{g:02X}{b:02X}"
-
 def update_colors_list(gradient_steps: int):
     global COLORS
     COLORS.clear()
     COLORS = color_gradient(gradient_starting_color, gradient_ending_color, gradient_steps)
 
-def ant_turn_right():
-    global ant_direction
-    ant_direction += 1      # cruel Python, ant_direction++ would be much easier
-    if ant_direction > Directions.ANT_LEFT:
-        ant_direction = Directions.ANT_UP
-
-def ant_turn_left():
-    global ant_direction
-    ant_direction -= 1
-    if ant_direction < Directions.ANT_UP:
-        ant_direction = Directions.ANT_LEFT
-
-def ant_move_forward():
-    global ant_x_pos, ant_y_pos
-    match ant_direction:
-        case Directions.ANT_UP:
-            ant_y_pos -= 1
-        case Directions.ANT_RIGHT:
-            ant_x_pos += 1
-        case Directions.ANT_DOWN:
-            ant_y_pos += 1
-        case Directions.ANT_LEFT:
-            ant_x_pos -= 1
-        case _:
-            pass
-
-    # grid wrap around
-    if ant_x_pos > grid_width - 1:
-        ant_x_pos = 0
-    elif ant_x_pos < 0:
-        ant_x_pos = grid_width - 1
-
-    if ant_y_pos > grid_height - 1:
-        ant_y_pos = 0
-    elif ant_y_pos < 0:
-        ant_y_pos = grid_height - 1
-
-def reinit_ant():
-    global grid, ant_x_pos, ant_y_pos, ant_direction, ant_steps
-
-    # reinit starting position
-    ant_x_pos = int(grid_width / 2)
-    ant_y_pos = int(grid_height / 2)
-    ant_direction = Directions.ANT_DOWN
-    ant_steps = 0
-
-    # reinit grid
-    for x in range(grid_width):
-        for y in range(grid_height):
-            grid[x][y] = 0
-
-def ant_loop():
-    global ant_moves_per_tick, grid, ant_steps
-
-    for _ in range(ant_moves_per_tick):
-        # Ant's current state
-        ant_state = grid[ant_x_pos][ant_y_pos]
-        # Ant's next direction
-        direction = ANTS_RULES[ant_state]
-
-        # Ant makes turn based on the rule at current grid state
-        if direction == 'R':
-            ant_turn_right()
-        elif direction == 'L':
-            ant_turn_left()
-
-        # Grid state changes based on current state (advance the state by 1 or return to 0 state)
-        if ant_state == len(ANTS_RULES) - 1:
-            grid[ant_x_pos][ant_y_pos] = 0
-        else:
-            grid[ant_x_pos][ant_y_pos] = ant_state + 1
-
-        #print(f"x = {ant_x_pos}, y = {ant_y_pos}, dir = {ant_direction}")
-
-        # Draw the current square
-        color_index = grid[ant_x_pos][ant_y_pos]
-        grid_canvas.addCell(ant_x_pos, ant_y_pos, color_index)
-
-        # Ant moves forward
-        ant_move_forward()
-
-    # Advance steps
-    ant_steps += ant_moves_per_tick
-    steps_count_label.setText(str(ant_steps))
-    pass
+def reinit_ant(compiled_rules: CompiledRules):
+    ant_engine.set_rules(compiled_rules)
+    ant_engine.reset()
+    reset_detectors()
+    if caches_checkpoints():
+        checkpoint_cache.restore(ant_engine)
+
+def reset_detectors():
+    # the detectors follow the ant forward only, they start again
+    if highway_detector is not None:
+        highway_detector.reset()
+    if cycle_finder is not None:
+        cycle_finder.reset()
+
+def caches_checkpoints() -> bool:
+    # a single ant on the wrapped grid only
+    return use_checkpoint_cache and checkpoint_cache is not None and ant_count == 1 and not use_unbounded_grid
+
+def save_checkpoint():
+    # runs on the worker thread
+    if caches_checkpoints():
+        checkpoint_cache.put(ant_engine)
+
+def saves_snapshots() -> bool:
+    # the snapshot keeps a single ant on the wrapped grid
+    return ant_count == 1 and not use_unbounded_grid
+
+def load_ant(path: str):
+    # runs on the worker thread
+    load_snapshot(path, ant_engine)
+    reset_detectors()
+
+def export_grid_png(path: str):
+    # runs on the worker thread, the grid is colorized and compressed band by band (any grid size)
+    if use_unbounded_grid:
+        grid = ant_engine.grid
+        width, height, rows = grid.shape[1], grid.shape[0], lambda top, bottom: grid[top:bottom]
+    else:
+        width, height, rows = ant_engine.width, ant_engine.height, ant_engine.rows
+    export_png(path, width, height, rows, color_palette(COLORS, BACKGROUND_COLOR), resolution)
+
+def call_on_worker(function, *args) -> Exception | None:
+    # runs the function on the worker thread and waits for it, returns its error
+    errors = []
+
+    def command():
+        try:
+            function(*args)
+        except (OSError, ValueError) as e:
+            errors.append(e)
+
+    simulation_worker.call(command)
+    simulation_worker.wait()
+    return errors[0] if errors else None
+
+def ant_steps_per_second() -> float | None:
+    # speed of the combo box as steps per second, None = unlimited
+    if ant_moves_per_tick == 0:
+        return None
+    return ant_moves_per_tick * 1000 / ant_tick_period
+
+def ant_loop(steps: int):
+    # runs on the worker thread, all the stepping is done by the engine, the GUI only shows the snapshots
+    if ant_rewinding:
+        if ant_engine.steps == 0:
+            # nothing left to rewind, the worker pauses (the GUI unchecks Rewind)
+            simulation_worker.pause()
+            return
+        rewind_ant(steps)
+    else:
+        advance_ant(steps)
+
+def advance_ant(steps: int):
+    if highway_detector is None:
+        # the detectors follow a single ant only
+        ant_engine.step(steps)
+    elif use_cycle_detection and cycle_finder is not None:
+        # once the state repeats, the whole cycles are skipped
+        cycle_finder.advance(steps)
+    elif use_highway_detection:
+        highway_detector.advance(steps)
+    else:
+        ant_engine.step(steps)
+
+def rewind_ant(steps: int):
+    # runs on the worker thread, the ant steps back to step 0 at most
+    ant_engine.step_back(min(steps, ant_engine.steps))
+    reset_detectors()
+
+def seek_ant(step: int):
+    # runs on the worker thread
+    if step < ant_engine.steps:
+        rewind_ant(ant_engine.steps - step)
+    elif step > ant_engine.steps:
+        advance_ant(step - ant_engine.steps)
+
+def slider_position(step: int) -> int:
+    if furthest_step <= SLIDER_RANGE:
+        return step
+    return step * SLIDER_RANGE // furthest_step
+
+def slider_step(position: int) -> int:
+    if furthest_step <= SLIDER_RANGE:
+        return position
+    return position * furthest_step // SLIDER_RANGE
+
+def update_steps_slider(steps: int):
+    global furthest_step
+    furthest_step = max(furthest_step, steps)
+    if steps_slider and not steps_slider.isSliderDown():
+        # set without seeking
+        steps_slider.blockSignals(True)
+        steps_slider.setMaximum(slider_position(furthest_step))
+        steps_slider.setValue(slider_position(steps))
+        steps_slider.blockSignals(False)
+
+def ant_repaint_grid_tick():
+    # the frame timer, its lateness is measured against its period
+    global last_repaint_tick
+    if perf_metrics.enabled:
+        now = time.perf_counter()
+        if last_repaint_tick is not None:
+            perf_metrics.add(TIMER_LATENESS, max(0.0, now - last_repaint_tick - ant_repaint_grid_period / 1000))
+        last_repaint_tick = now
+    ant_repaint_grid()
 
 def ant_repaint_grid():
-    grid_canvas.repaint_grid()
-
-def updateGridSize():
-    global grid_width, grid_height, grid
-    grid_width = int(CANVAS_WIDTH / resolution)
-    grid_height = int(CANVAS_HEIGHT / resolution)
-
-    # create the grid with its proper size
-    grid = [[0 for _ in range(grid_height)] for _ in range(grid_width)]
+    global shown_snapshot_version, shown_steps
+    if simulation_worker.version == shown_snapshot_version:
+        return
+
+    started = perf_metrics.start(PHASE_REPAINT)
+    with simulation_worker.snapshot() as snapshot:
+        shown_snapshot_version = snapshot.version
+        grid_canvas.setGrid(snapshot.grid, snapshot.dirty)
+        grid_canvas.setAnts(snapshot.ant_xs, snapshot.ant_ys)
+        if grid_recorder is not None:
+            grid_recorder.offer(snapshot.grid, color_palette(COLORS, BACKGROUND_COLOR), snapshot.steps)
+        label_started = perf_metrics.start(PHASE_LABEL)
+        steps_count_label.setText(str(snapshot.steps))
+        perf_metrics.stop(PHASE_LABEL, label_started)
+        shown_steps = snapshot.steps
+        update_steps_slider(snapshot.steps)
+    if steps_rate_label:
+        steps_rate_label.setText(f"{simulation_worker.achieved_rate:,.0f} steps/s")
+    perf_metrics.stop(PHASE_REPAINT, started)
+
+    if perf_metrics.enabled:
+        row = perf_metrics.sample(memory_per_cell(ant_engine))
+        if row is not None:
+            grid_canvas.setOverlay(overlay_lines(row))
+
+    cycle = cycle_finder.cycle if cycle_finder is not None else None
+    if use_cycle_detection and cycle is not None:
+        steps_count_label.setToolTip(f"Cycle of {cycle.period} steps from step {cycle.pre_period}")
+
+def packs_grid(colors: int) -> bool:
+    # a single ant of a two-colour rule on the wrapped grid
+    return use_packed_grid and colors <= 2 and ant_count == 1 and not use_unbounded_grid
+
+def fit_engine(colors: int):
+    # a new engine when the packing of the grid does not suit the colors (the worker has to be paused)
+    if packs_grid(colors) != isinstance(ant_engine, PackedAntEngine):
+        updateGridSize(colors)
+
+def updateGridSize(colors: int = 2):
+    global grid_width, grid_height, ant_engine, highway_detector, cycle_finder
+    grid_width = grid_size or int(CANVAS_WIDTH / resolution)
+    grid_height = grid_size or int(CANVAS_HEIGHT / resolution)
+
+    # create the engine (and its grid) with its proper size
+    if use_unbounded_grid:
+        ant_engine = UnboundedAntEngine("RL")
+        ant_engine.set_viewport(-(grid_width // 2), -(grid_height // 2), grid_width, grid_height)
+    elif ant_count > 1:
+        ant_engine = MultiAntEngine("RL", grid_width, grid_height, ant_count)
+    elif packs_grid(colors):
+        ant_engine = PackedAntEngine("RL", grid_width, grid_height)
+    else:
+        ant_engine = AntEngine("RL", grid_width, grid_height)
+    highway_detector = HighwayDetector(ant_engine) if ant_engine.traceable else None
+    cycle_finder = CycleFinder(ant_engine) if ant_engine.traceable and ant_engine.wraps else None
+    if simulation_worker is not None:
+        simulation_worker.set_engine(ant_engine, ant_loop)
 
 def show_rules_input_warn_popup(warn_message: str):
     # Could be done with QMessageBox, but I do not like the way OS handles it
@@ -489,8 +823,11 @@ def show_rules_input_warn_popup(warn_message: str):
     msg.setStandardButtons(QMessageBox.StandardButton.Ok | QMessageBox.StandardButton.Cancel)
     ret = msg.exec()  # shows dialog window
     """
+    show_warn_popup("Ant's rules input warning", warn_message)
+
+def show_warn_popup(title: str, warn_message: str):
     warning_dialog = WarningDialog()
-    warning_dialog.setTitle("Ant's rules input warning")
+    warning_dialog.setTitle(title)
     warning_dialog.setMessage(warn_message)
     warning_dialog.exec()
 
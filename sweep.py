@@ -0,0 +1,62 @@
+"""
+Classifies all the [LR] rules on all the cores, the results go to an SQLite database.
+An interrupted sweep continues when started again with the same database and settings.
+
+    python sweep.py --db sweep.db --steps 1e5 --max-length 20
+"""
+import argparse
+import sys
+import time
+
+from Classes.RuleSweep import RuleSweep
+from cli import parse_size, parse_steps
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Classifies Langton's ant rules (highway, cycle, symmetric, chaotic).")
+    parser.add_argument("--db", default="sweep.db", help="results database, continued when it exists")
+    parser.add_argument("--steps", type=parse_steps, default=100_000, help="step budget of every rule")
+    parser.add_argument("--size", type=parse_size, default=(512, 512), help="grid size WIDTHxHEIGHT")
+    parser.add_argument("--min-length", type=int, default=2)
+    parser.add_argument("--max-length", type=int, default=20)
+    parser.add_argument("--shard-size", type=int, default=256, help="rules (mirror pairs) per task of a worker")
+    parser.add_argument("--workers", type=int, help="worker processes (all the cores by default)")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    try:
+        sweep = RuleSweep(args.db, args.steps, *args.size, min_length=args.min_length, max_length=args.max_length,
+                          shard_size=args.shard_size, workers=args.workers)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    last_report = started
+
+    def progress(done: int, total: int):
+        nonlocal last_report
+        now = time.perf_counter()
+        if not args.quiet and (now - last_report >= 5 or done == total):
+            last_report = now
+            print(f"{done:,} / {total:,} shards ({now - started:.0f} s)", file=sys.stderr)
+
+    try:
+        sweep.run(progress)
+    except KeyboardInterrupt:
+        print("Interrupted, run again to continue", file=sys.stderr)
+        return 130
+    finally:
+        counts = sweep.store.class_counts()
+        sweep.close()
+
+    for classification, count in sorted(counts.items()):
+        print(f"{classification}: {count:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
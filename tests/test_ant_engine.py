@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import DIRECTION_DX, DIRECTION_DY, Directions
+
+TURNS = {"N": 0, "R": 1, "U": 2, "L": 3}
+
+
+def reference_run(rules: str, width: int, height: int, steps: int) -> tuple[np.ndarray, int, int, int]:
+    # the ant stepped cell by cell, straight from the rule string
+    grid = np.zeros((height, width), dtype=np.uint8)
+    x, y, direction = width // 2, height // 2, int(Directions.ANT_DOWN)
+    for _ in range(steps):
+        color = int(grid[y, x])
+        direction = (direction + TURNS[rules[color]]) % 4
+        grid[y, x] = (color + 1) % len(rules)
+        x = (x + DIRECTION_DX[direction]) % width
+        y = (y + DIRECTION_DY[direction]) % height
+    return grid, x, y, direction
+
+
+@pytest.mark.parametrize("rules", ["RL", "RLLR", "LRRRRRLLR"])
+def test_steps_like_the_rules(rules):
+    # the grid wraps around (40 x 30), the steps are done in uneven calls
+    engine = AntEngine(rules, 40, 30)
+    for steps in (1, 99, 2900, 7000):
+        engine.step(steps)
+    grid, x, y, direction = reference_run(rules, 40, 30, 10_000)
+    assert (engine.x, engine.y, engine.direction, engine.steps) == (x, y, direction, 10_000)
+    assert np.array_equal(engine.grid, grid)
+
+
+def test_step_back_to_the_start():
+    engine = AntEngine("RLLR", 64, 64)
+    engine.step(20_000)
+    engine.step_back(20_000)
+    assert (engine.x, engine.y, engine.direction, engine.steps) == (32, 32, Directions.ANT_DOWN, 0)
+    assert not engine.grid.any()
+
+
+def test_restore_and_copy():
+    engine = AntEngine("RLR", 16, 16)
+    engine.step(500)
+    copy = engine.copy()
+    engine.step(100)
+    copy.step(100)
+    assert np.array_equal(copy.grid, engine.grid) and (copy.x, copy.y) == (engine.x, engine.y)
+    assert not engine.grid.flags.writeable
+
+    with pytest.raises(ValueError):
+        engine.restore(np.zeros((16, 17), dtype=np.uint8), 0, 0, 0, 0, 0)
@@ -0,0 +1,43 @@
+import pytest
+
+from Classes.Benchmark import BenchmarkResult, compare_results, load_results, measure, save_results
+
+
+def test_regressions_flagged_both_ways():
+    baseline = [
+        BenchmarkResult("ant_loop", {"rules": 2, "grid": 64}, 1000.0, "steps/s", True),
+        BenchmarkResult("ant_loop", {"rules": 4, "grid": 64}, 1000.0, "steps/s", True),
+        BenchmarkResult("render", {"grid": 64}, 0.010, "s", False),
+        BenchmarkResult("render", {"grid": 512}, 0.010, "s", False),
+    ]
+    current = [
+        BenchmarkResult("ant_loop", {"grid": 64, "rules": 2}, 800.0, "steps/s", True),      # 25 % slower
+        BenchmarkResult("ant_loop", {"rules": 4, "grid": 64}, 950.0, "steps/s", True),      # within the threshold
+        BenchmarkResult("render", {"grid": 64}, 0.015, "s", False),                         # 50 % slower
+        BenchmarkResult("render", {"grid": 512}, 0.005, "s", False),                        # faster
+        BenchmarkResult("render", {"grid": 2048}, 0.020, "s", False),                       # not in the baseline
+    ]
+    comparisons = {comparison.key: comparison for comparison in compare_results(baseline, current, 0.1)}
+    assert len(comparisons) == 4
+    assert comparisons["ant_loop grid=64 rules=2"].slowdown == pytest.approx(0.25)
+    assert comparisons["render grid=64"].slowdown == pytest.approx(0.5)
+    assert comparisons["render grid=512"].slowdown == pytest.approx(-0.5)
+    assert {key for key, comparison in comparisons.items() if comparison.regression} == \
+        {"ant_loop grid=64 rules=2", "render grid=64"}
+
+
+def test_results_file(tmp_path):
+    path = str(tmp_path / "results.json")
+    results = [BenchmarkResult("ant_loop", {"rules": 2}, 1234.5, "steps/s", True)]
+    save_results(path, results, {"python": "3.11"})
+    assert load_results(path) == (results, {"python": "3.11"})
+
+    (tmp_path / "other.json").write_text('{"results": [{"name": "x"}]}')
+    with pytest.raises(ValueError):
+        load_results(str(tmp_path / "other.json"))
+
+
+def test_measure_median_of_a_call():
+    calls = []
+    seconds = measure(lambda: calls.append(1), repeat=3, min_time=0.001)
+    assert 0 < seconds < 0.001 and len(calls) > 3
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QWidget
+
+from Classes.AntEngine import AntEngine
+from Classes.Canvas import GridCanvas
+from Classes.PackedEngine import PackedAntEngine
+
+
+@pytest.fixture(scope="module")
+def app() -> QApplication:
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def canvas(app) -> GridCanvas:
+    placeholder = QWidget()
+    placeholder.resize(200, 150)
+    return GridCanvas("#FFFFFF", placeholder)
+
+
+def image_indexes(canvas: GridCanvas) -> np.ndarray:
+    image = canvas.image
+    return np.array([[image.pixelIndex(x, y) for x in range(image.width())] for y in range(image.height())])
+
+
+def test_image_shows_the_grid_without_a_copy(canvas):
+    engine = AntEngine("RLR", 40, 30)
+    engine.step(3000)
+    canvas.setGrid(engine.grid)
+    image = canvas.image
+    assert np.array_equal(image_indexes(canvas), engine.grid)
+
+    # the engine writes the memory the image shows, the same image is kept
+    engine.step(1000)
+    canvas.setGrid(engine.grid)
+    assert canvas.image is image
+    assert np.array_equal(image_indexes(canvas), engine.grid)
+
+    canvas.setColors(["#FFFFFF", "#FF0000", "#0000FF"])
+    y, x = np.argwhere(engine.grid == 2)[0]
+    assert image.pixel(int(x), int(y)) == 0xFF0000FF
+
+
+
+
+def test_packed_grid_as_a_1_bit_image(canvas):
+    engine = PackedAntEngine("RL", 100, 60)
+    engine.step(5000)
+    canvas.setGrid(engine.grid_view)
+    assert canvas.image.depth() == 1
+    assert np.array_equal(image_indexes(canvas), engine.grid)
+
+def test_dirty_tiles_merged_to_rectangles(canvas):
+    tile = canvas.dirty_tile_size
+    dirty = np.zeros((8, 8), dtype=bool)
+    dirty[1:4, 2:5] = True
+    dirty[5, 0] = True
+    dirty[6, 6:8] = True
+    rects = canvas.dirtyRects(dirty)
+    assert len(rects) == 3
+
+    covered = np.zeros_like(dirty)
+    for rect in rects:
+        left, top = rect.x() // tile, rect.y() // tile
+        covered[top:top + rect.height() // tile, left:left + rect.width() // tile] = True
+    assert np.array_equal(covered, dirty)
+
+    # more than a quarter of the tiles, the whole canvas is repainted
+    assert canvas.dirtyRects(np.ones((8, 8), dtype=bool)) is None
@@ -0,0 +1,56 @@
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.CheckpointCache import CheckpointCache
+from Classes.RuleCompiler import compile_turmite
+
+
+def stepped(rules: str, steps: int) -> AntEngine:
+    engine = AntEngine(rules, 64, 48)
+    engine.step(steps)
+    return engine
+
+
+def assert_same(engine: AntEngine, other: AntEngine):
+    assert (engine.x, engine.y, engine.direction, engine.state, engine.steps) == \
+        (other.x, other.y, other.direction, other.state, other.steps)
+    assert np.array_equal(engine.grid, other.grid)
+
+
+def test_mirrored_rule_restored(tmp_path):
+    cache = CheckpointCache(str(tmp_path))
+    assert cache.put(stepped("RLLR", 3000))
+
+    # LRRL is the mirror image of RLLR
+    engine = AntEngine("LRRL", 64, 48)
+    assert cache.restore(engine)
+    assert_same(engine, stepped("LRRL", 3000))
+
+    engine = AntEngine("RLLR", 64, 48)
+    assert not cache.restore(engine, max_steps=2999)
+    assert cache.restore(engine)
+    assert_same(engine, stepped("RLLR", 3000))
+
+
+def test_repeated_root_restored(tmp_path):
+    # RLRL steps like RL, its colors taken modulo 2
+    cache = CheckpointCache(str(tmp_path))
+    assert cache.put(stepped("RLRL", 5000))
+    engine = AntEngine("LR", 64, 48)
+    assert cache.restore(engine)
+    assert_same(engine, stepped("LR", 5000))
+
+    # but not three repeats of the root (the colors modulo 6 are not known)
+    engine = AntEngine("RLRLRL", 64, 48)
+    assert not cache.restore(engine)
+
+
+def test_turmites_and_least_recently_used(tmp_path):
+    cache = CheckpointCache(str(tmp_path), max_bytes=1)
+    turmite = AntEngine(compile_turmite("{{{1, 2, 0}, {0, 8, 0}}}"), 64, 48)
+    turmite.step(100)
+    assert not cache.put(turmite)
+
+    # a checkpoint bigger than max_bytes is evicted right away
+    assert cache.put(stepped("RL", 100))
+    assert not cache.restore(AntEngine("RL", 64, 48))
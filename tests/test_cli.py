@@ -0,0 +1,38 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import cli
+from Classes.AntEngine import AntEngine
+from Classes.EngineState import load_state
+
+
+def test_run_and_resume(tmp_path):
+    first = str(tmp_path / "first.npz")
+    second = str(tmp_path / "second.lant")
+    assert cli.main(["--rules", "RLLR", "--steps", "3e3", "--size", "64x48", "--state", first, "--quiet"]) == 0
+    assert cli.main(["--resume", first, "--steps", "2_000", "--state", second, "--quiet"]) == 0
+
+    plain = AntEngine("RLLR", 64, 48)
+    plain.step(5000)
+    engine = load_state(second)
+    assert (engine.x, engine.y, engine.direction, engine.steps) == (plain.x, plain.y, plain.direction, 5000)
+    assert np.array_equal(engine.grid, plain.grid)
+
+
+def test_image_of_the_grid(tmp_path):
+    out = tmp_path / "grid.png"
+    assert cli.main(["--rules", "RL", "--steps", "1000", "--size", "32x32", "--out", str(out), "--quiet"]) == 0
+    assert out.read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_invalid_arguments():
+    assert cli.parse_steps("1e9") == 10 ** 9
+    assert cli.parse_size("640x480") == (640, 480)
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.parse_steps("1.5")
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.parse_size("640")
+    with pytest.raises(SystemExit):
+        cli.parse_args(["--steps", "10"])
@@ -0,0 +1,42 @@
+import time
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.CycleFinder import CycleFinder
+
+
+def test_finds_cycle_of_small_grid():
+    engine = AntEngine("RL", 6, 6)
+    finder = CycleFinder(engine, chunk=1 << 10)
+    cycle = finder.observe(1 << 20)
+    assert cycle is not None
+
+    # the state repeats every period steps from the pre-period on
+    plain = AntEngine("RL", 6, 6)
+    plain.step(cycle.pre_period)
+    before = plain.copy()
+    plain.step(cycle.period)
+    assert (plain.x, plain.y, plain.direction, plain.state) == (before.x, before.y, before.direction, before.state)
+    assert np.array_equal(plain.grid, before.grid)
+
+
+def test_huge_step_count_is_skipped():
+    engine = AntEngine("RL", 6, 6)
+    finder = CycleFinder(engine, chunk=1 << 10)
+    steps = 10 ** 15
+
+    started = time.perf_counter()
+    cycle = finder.advance(steps)
+    assert time.perf_counter() - started < 5
+    assert cycle is not None
+    assert engine.steps == steps
+
+    plain = AntEngine("RL", 6, 6)
+    plain.step(cycle.pre_period + (steps - cycle.pre_period) % cycle.period)
+    assert (engine.x, engine.y, engine.direction, engine.state) == (plain.x, plain.y, plain.direction, plain.state)
+    assert np.array_equal(engine.grid, plain.grid)
+
+    # the next calls skip the whole cycles too
+    finder.advance(steps)
+    assert engine.steps == 2 * steps
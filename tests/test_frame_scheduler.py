@@ -0,0 +1,41 @@
+import math
+import time
+
+from Classes.FrameScheduler import MAX_STEP_RATE, FrameScheduler
+
+
+def run_frames(scheduler: FrameScheduler, step, frames: int) -> list[int]:
+    done = []
+    for _ in range(frames):
+        done.append(scheduler.run_frame(step))
+        scheduler.wait_next_frame()
+    return done
+
+
+def test_step_function_ignoring_n():
+    # the batches are sized for a fast stepping, but their size stays bounded
+    batches = []
+    scheduler = FrameScheduler(fps=200)
+    run_frames(scheduler, batches.append, 50)
+    assert math.isfinite(scheduler.step_rate) and scheduler.step_rate <= MAX_STEP_RATE
+    assert max(batches) <= MAX_STEP_RATE * scheduler.batch_time
+
+
+def test_batches_follow_the_step_rate():
+    # a step function of about 1 microsecond per step settles at batches of about batch_time
+    def step(n: int):
+        deadline = time.perf_counter() + n * 1e-6
+        while time.perf_counter() < deadline:
+            pass
+
+    batches = []
+    scheduler = FrameScheduler(fps=50)
+    run_frames(scheduler, lambda n: (batches.append(n), step(n)), 20)
+    assert 1e5 < scheduler.step_rate < 2e6
+    assert batches[-1] <= 2e6 * scheduler.batch_time
+
+
+def test_steps_per_second_target():
+    scheduler = FrameScheduler(fps=100, steps_per_second=5000)
+    done = run_frames(scheduler, lambda n: None, 10)
+    assert sum(done) == 500
@@ -0,0 +1,52 @@
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.GridPyramid import GridPyramid, majority
+
+
+def reference_level(grid: np.ndarray, k: int) -> np.ndarray:
+    # the majority of every 2 x 2 block, level by level (the cells beyond the edge repeat the last ones)
+    for _ in range(k):
+        height, width = grid.shape
+        grid = np.pad(grid, ((0, height % 2), (0, width % 2)), mode="edge")
+        grid = np.array([[majority(*(grid[y:y + 2, x:x + 2].ravel()[:, None]))[0]
+                          for x in range(0, grid.shape[1], 2)] for y in range(0, grid.shape[0], 2)], dtype=np.uint8)
+    return grid
+
+
+def test_majority_ties():
+    # the most frequent color, a visited color before the background in a tie
+    cells = [[1, 1, 2, 0], [0, 0, 3, 3], [0, 0, 0, 2], [2, 2, 3, 3], [0, 1, 2, 3]]
+    assert majority(*np.array(cells, dtype=np.uint8).T).tolist() == [1, 3, 0, 2, 1]
+
+
+def test_levels_like_the_reference():
+    # odd sizes, the tiles of a level are not whole
+    engine = AntEngine("RLLR", 75, 51)
+    engine.step(8000)
+    pyramid = GridPyramid(tile_size=4)
+    pyramid.set_grid(engine.grid)
+    assert pyramid.depth == 7 and pyramid.level(10).shape == (1, 1)
+    for k in range(pyramid.depth + 1):
+        assert np.array_equal(pyramid.level(k), reference_level(engine.grid, k))
+
+
+def test_dirty_tiles_recomputed():
+    grid = np.zeros((64, 64), dtype=np.uint8)
+    pyramid = GridPyramid(tile_size=8)
+    pyramid.set_grid(grid)
+    pyramid.level(3)
+
+    # the changed cells are in the tile (1, 2) of the grid (cells 8 to 15, 16 to 23)
+    grid[8:12, 16:20] = 1
+    pyramid.mark_dirty(np.zeros((8, 8), dtype=bool))
+    assert not pyramid.level(3).any()
+    dirty = np.zeros((8, 8), dtype=bool)
+    dirty[1, 2] = True
+    pyramid.mark_dirty(dirty)
+    for k in range(4):
+        assert np.array_equal(pyramid.level(k), reference_level(grid, k))
+
+    grid[40:, :] = 1
+    pyramid.mark_dirty()
+    assert np.array_equal(pyramid.level(pyramid.depth), reference_level(grid, pyramid.depth))
@@ -0,0 +1,17 @@
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.HighwayDetector import HighwayDetector
+
+
+def test_small_advances_match_plain_stepping():
+    # the RL highway wraps around the grid and runs into its trail, advanced in short calls
+    engine = AntEngine("RL", 1024, 1024)
+    detector = HighwayDetector(engine)
+    for _ in range(300):
+        detector.advance(1000)
+
+    plain = AntEngine("RL", 1024, 1024)
+    plain.step(300 * 1000)
+    assert (engine.x, engine.y, engine.direction, engine.state) == (plain.x, plain.y, plain.direction, plain.state)
+    assert np.array_equal(engine.grid, plain.grid)
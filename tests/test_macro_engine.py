@@ -0,0 +1,37 @@
+import time
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.MacroEngine import MacroAntEngine
+
+
+def steps_per_second(engine: AntEngine, steps: int) -> float:
+    started = time.perf_counter()
+    engine.step(steps)
+    return steps / (time.perf_counter() - started)
+
+
+def test_same_grid_as_plain_stepping():
+    for rules in ("RL", "RLR", "LLRR"):
+        macro = MacroAntEngine(rules, 256, 256, tile_size=8)
+        plain = AntEngine(rules, 256, 256)
+        for steps in (1, 999, 30_000):
+            macro.step(steps)
+            plain.step(steps)
+            assert (macro.x, macro.y, macro.direction, macro.state, macro.steps) == \
+                   (plain.x, plain.y, plain.direction, plain.state, plain.steps)
+            assert np.array_equal(macro.grid, plain.grid)
+
+
+def test_faster_than_plain_stepping_on_highway():
+    # the RL highway starts at about step 10000 and reaches the edge of the grid after about 100000 more
+    macro = MacroAntEngine("RL", 4096, 4096)
+    plain = AntEngine("RL", 4096, 4096)
+    macro.step(11_000)
+    plain.step(11_000)
+
+    macro_rate = steps_per_second(macro, 90_000)
+    plain_rate = steps_per_second(plain, 90_000)
+    assert macro_rate > plain_rate
+    assert np.array_equal(macro.grid, plain.grid)
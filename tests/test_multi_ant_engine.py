@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from Classes.AntEngine import AntEngine
+from Classes.CycleFinder import CycleFinder
+from Classes.HighwayDetector import HighwayDetector
+from Classes.MultiAntEngine import MultiAntEngine
+from Classes.TrajectoryLog import TrajectoryWriter
+
+
+def test_single_ant_like_ant_engine():
+    multi = MultiAntEngine("RLLR", 32, 32, ants=1)
+    single = AntEngine("RLLR", 32, 32)
+    multi.step(5000)
+    single.step(5000)
+    assert (multi.x, multi.y, multi.direction, multi.state) == (single.x, single.y, single.direction, single.state)
+    assert np.array_equal(multi.grid, single.grid)
+
+
+def test_step_back_undoes_shared_cells():
+    engine = MultiAntEngine("RL", 8, 8, ants=16)
+    start = engine.copy()
+    engine.step(300)
+    engine.step_back(300)
+    assert np.array_equal(engine.xs, start.xs) and np.array_equal(engine.ys, start.ys)
+    assert np.array_equal(engine.grid, start.grid)
+
+
+def test_not_taken_by_trace_users(tmp_path):
+    engine = MultiAntEngine("RL", 32, 32, ants=4)
+    assert not engine.traceable
+    with pytest.raises(ValueError):
+        HighwayDetector(engine)
+    with pytest.raises(ValueError):
+        CycleFinder(engine)
+    with pytest.raises(ValueError):
+        TrajectoryWriter(engine, str(tmp_path / "log"))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from Classes.AntEngine import AntEngine
+from Classes.HighwayDetector import HighwayDetector
+from Classes.PackedEngine import PackedAntEngine, create_engine
+
+
+def assert_same(engine: AntEngine, other: AntEngine):
+    assert (engine.x, engine.y, engine.direction, engine.state, engine.steps) == \
+        (other.x, other.y, other.direction, other.state, other.steps)
+    assert np.array_equal(engine.grid, other.grid)
+
+
+# the widths of whole bytes, of padded bytes and of padded 4-byte rows
+@pytest.mark.parametrize("width", [64, 77, 200])
+def test_like_ant_engine(width):
+    packed = PackedAntEngine("LR", width, 90)
+    plain = AntEngine("LR", width, 90)
+    packed.step(30_000)
+    plain.step(30_000)
+    assert_same(packed, plain)
+    assert packed.population() == plain.population()
+    assert np.array_equal(packed.rows(10, 20), plain.grid[10:20])
+
+    packed.step_back(12_345)
+    plain.step_back(12_345)
+    assert_same(packed, plain)
+
+
+def test_highway_fills_the_bits():
+    packed = PackedAntEngine("RL", 200, 200)
+    plain = AntEngine("RL", 200, 200)
+    HighwayDetector(packed).advance(400_000)
+    plain.step(400_000)
+    assert_same(packed, plain)
+
+
+def test_grid_view_reads_the_packed_rows():
+    engine = PackedAntEngine("RL", 100, 60)
+    engine.step(5000)
+    grid = engine.grid
+    view = engine.grid_view
+    assert view.shape == grid.shape
+    assert np.array_equal(np.asarray(view), grid)
+    assert np.array_equal(view[7:40, 3:91], grid[7:40, 3:91])
+    ys, xs = np.nonzero(grid)
+    assert view[ys, xs].all() and engine.colors_at(xs, ys).all()
+
+
+def test_packs_two_colours_only():
+    assert isinstance(create_engine("RL", 8, 8), PackedAntEngine)
+    assert not isinstance(create_engine("RLL", 8, 8), PackedAntEngine)
+    with pytest.raises(ValueError):
+        PackedAntEngine("RLL", 8, 8)
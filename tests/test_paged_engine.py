@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from Classes.AntEngine import AntEngine
+from Classes.HighwayDetector import HighwayDetector
+from Classes.PagedEngine import PagedAntEngine
+from Classes.ZobristHash import ZobristHash
+
+
+def assert_same(engine: AntEngine, other: AntEngine):
+    assert (engine.x, engine.y, engine.direction, engine.state, engine.steps) == \
+        (other.x, other.y, other.direction, other.state, other.steps)
+    assert np.array_equal(engine.grid, other.grid)
+
+
+def test_like_ant_engine_with_evictions(tmp_path):
+    # 2 tiles in memory out of 8, the ant keeps crossing the tile edges
+    path = str(tmp_path / "grid.bin")
+    with PagedAntEngine("RLLR", 256, 128, path=path, tile_size=64, cache_tiles=2) as paged:
+        plain = AntEngine("RLLR", 256, 128)
+        paged.step(60_000)
+        plain.step(60_000)
+        assert_same(paged, plain)
+        assert paged.tile_misses > 8
+        assert np.array_equal(paged.rows(30, 100), plain.grid[30:100])
+
+        paged.step_back(25_000)
+        plain.step_back(25_000)
+        assert_same(paged, plain)
+
+        # the evicted tiles are in the file, tile by tile
+        paged.flush()
+        tiles = np.fromfile(path, dtype=np.uint8).reshape(2, 4, 64, 64)
+        assert np.array_equal(tiles.transpose(0, 2, 1, 3).reshape(128, 256), plain.grid)
+
+
+def test_detectors_on_the_paged_grid():
+    with PagedAntEngine("RL", 128, 128, tile_size=64, cache_tiles=1) as paged:
+        plain = AntEngine("RL", 128, 128)
+        HighwayDetector(paged).advance(200_000)
+        plain.step(200_000)
+        assert_same(paged, plain)
+        path = paged.path
+    assert not os.path.exists(path)
+
+    # the hashes of the cycle finder, from the traced keys
+    with PagedAntEngine("RLLR", 128, 64, tile_size=64, cache_tiles=1) as paged:
+        plain = AntEngine("RLLR", 128, 64)
+        zobrist = ZobristHash(128, 64, plain.compiled)
+        hashes, grid_hash = paged.trace_hashes(20_000, zobrist, 0)
+        plain_hashes, plain_grid_hash = plain.trace_hashes(20_000, zobrist, 0)
+        assert np.array_equal(hashes, plain_hashes) and grid_hash == plain_grid_hash
+        assert grid_hash == zobrist.grid_hash(paged.grid)
+
+
+def test_grid_size_of_whole_tiles():
+    with pytest.raises(ValueError):
+        PagedAntEngine("RL", 100, 64, tile_size=64)
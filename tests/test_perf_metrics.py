@@ -0,0 +1,45 @@
+import csv
+import json
+
+import pytest
+
+from Classes.PackedEngine import PackedAntEngine
+from Classes.PerfMetrics import PHASE_PAINT, PHASE_STEP, PerfMetrics, memory_per_cell, overlay_lines
+
+
+def test_disabled_timers_record_nothing():
+    metrics = PerfMetrics()
+    assert metrics.start(PHASE_STEP) is None
+    metrics.stop(PHASE_STEP, None)
+    metrics.count_steps(100)
+    assert metrics.phases == [] and metrics.sample(force=True) is None
+
+
+def test_percentiles_of_the_window():
+    metrics = PerfMetrics(enabled=True, window=100)
+    for milliseconds in range(200):
+        metrics.add(PHASE_PAINT, milliseconds / 1000)
+    # only the last 100 durations are kept
+    assert metrics.percentiles(PHASE_PAINT, (0, 50, 100)) == pytest.approx([0.1, 0.1495, 0.199])
+
+    # every 4th call is timed
+    metrics = PerfMetrics(enabled=True, sample_every=4)
+    started = [metrics.start(PHASE_STEP) for _ in range(8)]
+    assert [value is not None for value in started] == [False, False, False, True] * 2
+
+
+def test_rows_exported(tmp_path):
+    metrics = PerfMetrics(enabled=True, interval=3600)
+    metrics.stop(PHASE_STEP, metrics.start(PHASE_STEP))
+    metrics.count_steps(1000)
+    assert metrics.sample() is None
+    row = metrics.sample(memory_per_cell(PackedAntEngine("RL", 64, 64)), force=True)
+    assert row["steps"] == 1000 and row["memory_per_cell"] == 0.125
+    assert "step_p99_ms" in row and overlay_lines(row)[-1] == "memory: 0.125 B/cell"
+
+    metrics.export(str(tmp_path / "metrics.json"))
+    metrics.export(str(tmp_path / "metrics.csv"))
+    assert json.loads((tmp_path / "metrics.json").read_text()) == [row]
+    with open(tmp_path / "metrics.csv", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 1 and float(rows[0]["steps"]) == 1000
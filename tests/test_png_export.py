@@ -0,0 +1,79 @@
+import struct
+import zlib
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.PngExport import export_png, visited_bounds
+
+
+def read_png(path: str) -> tuple[np.ndarray, np.ndarray | None]:
+    # the pixels (color indexes or RGB) and the palette of a PNG of unfiltered 8-bit rows
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    offset = 8
+    palette, idat = None, b""
+    while offset < len(data):
+        size, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        chunk = data[offset + 8:offset + 8 + size]
+        assert struct.unpack(">I", data[offset + 8 + size:offset + 12 + size])[0] == zlib.crc32(chunk_type + chunk)
+        offset += size + 12
+        if chunk_type == b"IHDR":
+            width, height, depth, color_type = struct.unpack(">IIBB", chunk[:10])
+        elif chunk_type == b"PLTE":
+            palette = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, 3)
+        elif chunk_type == b"IDAT":
+            idat += chunk
+    channels = 1 if color_type == 3 else 3
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, width * channels + 1)
+    assert depth == 8 and not rows[:, 0].any()
+    pixels = rows[:, 1:].reshape(height, width, channels)
+    return (pixels[:, :, 0] if channels == 1 else pixels), palette
+
+
+def engine_and_palette() -> tuple[AntEngine, np.ndarray]:
+    engine = AntEngine("RLLR", 120, 90)
+    engine.step(6000)
+    return engine, np.array([[255, 255, 255], [0, 0, 0], [200, 30, 30], [30, 30, 200]], dtype=np.uint8)
+
+
+def test_indexed_grid_scaled_and_cropped(tmp_path):
+    engine, palette = engine_and_palette()
+    grid = engine.grid
+    path = str(tmp_path / "grid.png")
+    assert export_png(path, 120, 90, lambda top, bottom: grid[top:bottom], palette, scale=3) == (360, 270)
+    pixels, png_palette = read_png(path)
+    assert np.array_equal(png_palette, palette)
+    assert np.array_equal(pixels, grid.repeat(3, axis=0).repeat(3, axis=1))
+
+    left, top, right, bottom = visited_bounds(120, 90, lambda first, last: grid[first:last], band_rows=7)
+    ys, xs = np.nonzero(grid)
+    assert (left, top, right, bottom) == (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+    assert export_png(path, 120, 90, lambda first, last: grid[first:last], palette, crop=True) == \
+        (right - left, bottom - top)
+    assert np.array_equal(read_png(path)[0], grid[top:bottom, left:right])
+
+    # an empty grid is its first cell
+    empty = np.zeros((90, 120), dtype=np.uint8)
+    assert export_png(path, 120, 90, lambda first, last: empty[first:last], palette, crop=True) == (1, 1)
+
+
+def test_preview_of_block_means(tmp_path):
+    engine, palette = engine_and_palette()
+    grid = engine.grid
+    path = str(tmp_path / "preview.png")
+    # the longer side fits 25 pixels: blocks of 5 x 5 cells
+    assert export_png(path, 120, 90, lambda top, bottom: grid[top:bottom], palette, max_size=25) == (24, 18)
+    pixels, png_palette = read_png(path)
+    assert png_palette is None
+    colors = palette[grid].astype(int)
+    expected = [[(colors[y:y + 5, x:x + 5].sum(axis=(0, 1)) + 12) // 25 for x in range(0, 120, 5)]
+                for y in range(0, 90, 5)]
+    assert np.array_equal(pixels, expected)
+
+    # the blocks of the last row and column are smaller
+    assert export_png(path, 120, 90, lambda top, bottom: grid[top:bottom], palette, downsample=7) == (18, 13)
+    pixels = read_png(path)[0]
+    block = colors[84:90, 119:120]
+    assert np.array_equal(pixels[12, 17], (block.sum(axis=(0, 1)) + 3) // 6)
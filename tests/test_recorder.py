@@ -0,0 +1,103 @@
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtGui import QImage, QImageReader
+from PySide6.QtWidgets import QApplication
+
+from Classes.Recorder import Recorder
+
+
+@pytest.fixture(scope="module")
+def app() -> QApplication:
+    return QApplication.instance() or QApplication([])
+
+
+def frames_and_palettes() -> list[tuple[np.ndarray, np.ndarray]]:
+    # random cells (long enough for the LZW table to fill up), the last frame with another palette
+    random = np.random.default_rng(7)
+    palette = np.array([[255, 255, 255], [0, 0, 0], [200, 30, 30], [30, 30, 200]], dtype=np.uint8)
+    frames = [(random.integers(0, 4, (60, 90), dtype=np.uint8), palette) for _ in range(2)]
+    frames.append((random.integers(0, 4, (60, 90), dtype=np.uint8), palette[::-1]))
+    return frames
+
+
+def rgb(image: QImage) -> np.ndarray:
+    image = image.convertToFormat(QImage.Format.Format_RGB888)
+    rows = np.frombuffer(image.constBits(), dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+    # a copy, the bits are freed with the image
+    return rows[:, :image.width() * 3].reshape(image.height(), image.width(), 3).copy()
+
+
+def apng_frames(path: str) -> tuple[int, list[np.ndarray]]:
+    # the frame count of acTL and the RGB frames of the IDAT and fdAT chunks
+    with open(path, "rb") as file:
+        data = file.read()
+    offset = 8
+    count, frames = None, []
+    width = height = 0
+    while offset < len(data):
+        size, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        chunk = data[offset + 8:offset + 8 + size]
+        offset += size + 12
+        if chunk_type == b"IHDR":
+            width, height = struct.unpack(">II", chunk[:8])
+        elif chunk_type == b"acTL":
+            count = struct.unpack(">I", chunk[:4])[0]
+        elif chunk_type in (b"IDAT", b"fdAT"):
+            raw = np.frombuffer(zlib.decompress(chunk[4:] if chunk_type == b"fdAT" else chunk), dtype=np.uint8)
+            frames.append(raw.reshape(height, width * 3 + 1)[:, 1:].reshape(height, width, 3))
+    return count, frames
+
+
+def test_gif_frames_decoded(app, tmp_path):
+    path = str(tmp_path / "run.gif")
+    with Recorder(path, fps=10, scale=2, drop=False) as recorder:
+        for grid, palette in frames_and_palettes():
+            assert recorder.offer(grid, palette)
+    assert recorder.recorded == 3
+
+    reader = QImageReader(path)
+    assert reader.imageCount() == 3
+    for grid, palette in frames_and_palettes():
+        image = reader.read()
+        assert (image.width(), image.height()) == (180, 120)
+        assert np.array_equal(rgb(image)[::2, ::2], palette[grid])
+
+
+def test_apng_and_raw_frames_decoded(tmp_path):
+    path = str(tmp_path / "run.apng")
+    with Recorder(path, drop=False) as recorder:
+        for grid, palette in frames_and_palettes():
+            recorder.offer(grid, palette)
+    count, frames = apng_frames(path)
+    assert count == len(frames) == 3
+    for frame, (grid, palette) in zip(frames, frames_and_palettes()):
+        assert np.array_equal(frame, palette[grid])
+
+    path = str(tmp_path / "run.rgb")
+    with Recorder(path, fps=30, drop=False) as recorder:
+        for grid, palette in frames_and_palettes():
+            recorder.offer(grid, palette)
+    frames = np.fromfile(path, dtype=np.uint8).reshape(3, 60, 90, 3)
+    for frame, (grid, palette) in zip(frames, frames_and_palettes()):
+        assert np.array_equal(frame, palette[grid])
+    with open(path + ".json") as file:
+        assert json.load(file) == {"width": 90, "height": 60, "fps": 30, "frames": 3, "pix_fmt": "rgb24"}
+
+
+def test_frames_every_steps(tmp_path):
+    grid, palette = frames_and_palettes()[0]
+    with Recorder(str(tmp_path / "run.rgb"), every_steps=100, drop=False) as recorder:
+        taken = [recorder.offer(grid, palette, steps) for steps in (5, 50, 100, 150, 320, 399, 400)]
+    assert taken == [True, False, True, False, True, False, True]
+    assert recorder.recorded == 4
+
+    with pytest.raises(ValueError):
+        Recorder(str(tmp_path / "run.mp4"))
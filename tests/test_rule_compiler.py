@@ -0,0 +1,55 @@
+import pytest
+
+from Classes.RuleCompiler import (
+    TURN_LEFT,
+    TURN_RIGHT,
+    compile_rules,
+    compile_source,
+    compile_turmite
+)
+
+
+def test_rule_string_tables():
+    compiled = compile_rules("rll")
+    assert (compiled.source, compiled.colors, compiled.states) == ("RLL", 3, 1)
+    assert compiled.write == (1, 2, 0)
+    assert compiled.turn == (TURN_RIGHT, TURN_LEFT, TURN_LEFT)
+
+    # the step key of (state 0, direction, color) gives the write, the new direction and the next key
+    for direction in range(4):
+        for color in range(3):
+            k = compiled.key(0, direction) + color
+            new_direction = (direction + compiled.turn[color]) % 4
+            assert compiled.step_write[k] == compiled.write[color]
+            assert compiled.step_direction[k] == new_direction
+            assert compiled.step_next_key[k] == compiled.key(0, new_direction)
+            assert compiled.key_direction(compiled.step_next_key[k]) == new_direction
+
+
+def test_step_back_tables_undo_a_step():
+    compiled = compile_rules("RLLR")
+    assert compiled.reversible
+    for k in range(len(compiled.step_write)):
+        after = compiled.step_next_key[k] + compiled.step_write[k]
+        assert compiled.step_back_key[after] + compiled.step_back_write[after] == k
+        assert compiled.step_back_direction[after] == compiled.key_direction(k)
+
+
+def test_turmite_tables():
+    # a two-state turmite, the second state does not turn
+    compiled = compile_turmite("{{{1, 2, 1}, {0, 8, 0}}, {{1, 1, 0}, {1, 1, 1}}}")
+    assert (compiled.colors, compiled.states) == (2, 2)
+    assert compiled.next_state == (1, 0, 0, 1)
+    k = compiled.key(1, 3) + 1
+    assert compiled.step_direction[k] == 3 and compiled.key_state(compiled.step_next_key[k]) == 1
+    assert compile_source(compiled.source) == compiled
+
+    with pytest.raises(ValueError):
+        compile_turmite([[(2, "R", 0), (0, "L", 0)]])
+
+
+@pytest.mark.parametrize("rules", ["RX", "R", ""])
+def test_invalid_rules(rules):
+    with pytest.raises(ValueError):
+        compile_rules(rules)
+
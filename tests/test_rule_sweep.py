@@ -0,0 +1,46 @@
+import pytest
+
+from Classes.RuleSweep import (
+    HIGHWAY,
+    RuleResult,
+    RuleSweep,
+    SweepStore,
+    classify_rule,
+    mirror_result,
+    rule_at,
+    rule_count
+)
+
+
+def test_rules_of_the_mirror_pairs():
+    assert rule_count(2, 3) == 12
+    assert [rule_at(index) for index in range(6)] == ["LR", "LL", "LRR", "LRL", "LLR", "LLL"]
+
+
+def test_highway_and_its_mirror():
+    result = classify_rule("RL", 20_000, 256, 256)
+    assert result.classification == HIGHWAY
+    assert result.highway_period == 104 and abs(result.drift_x) == abs(result.drift_y) == 2
+    assert result.steps < 20_000
+
+    assert mirror_result(result) == classify_rule("LR", 20_000, 256, 256)
+
+
+def test_resume_skips_the_stored_shards(tmp_path):
+    path = str(tmp_path / "sweep.db")
+    sweep = RuleSweep(path, 2000, 64, 64, min_length=2, max_length=3, shard_size=2, workers=1)
+    assert sweep.remaining_shards() == [0, 1, 2]
+    marker = RuleResult("LR", "marker", 0, None, None, None, None, None, 0, 0, 0, 0, 0, 0)
+    sweep.store.add_shard(1, [marker])
+    assert sweep.remaining_shards() == [0, 2]
+
+    sweep.run()
+    assert sweep.remaining_shards() == []
+    results = {result.rules: result for result in sweep.store.results()}
+    sweep.close()
+    # the shard 1 (LRR, LRL and their mirrors) was not run again, the shard 0 overwrote the marker
+    assert "LRR" not in results and "RLL" not in results
+    assert len(results) == 8 and results["LR"].classification != "marker"
+
+    with pytest.raises(ValueError):
+        SweepStore(path, {"steps": 1})
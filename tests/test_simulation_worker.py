@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.FrameScheduler import FrameScheduler
+from Classes.SimulationWorker import SimulationWorker
+
+
+def test_dirty_tiles_cover_every_change():
+    # the ant crosses the grid edges, only the tiles near it are hashed
+    engine = AntEngine("RLLR", 512, 512)
+    worker = SimulationWorker(engine, scheduler=FrameScheduler(fps=100))
+    worker.call(lambda: None)
+    worker.wait()
+    with worker.snapshot() as snapshot:
+        shown = snapshot.grid.copy()
+
+    worker.start()
+    deadline = time.perf_counter() + 2
+    while time.perf_counter() < deadline:
+        time.sleep(0.02)
+        worker.pause()
+        worker.wait()
+        with worker.snapshot() as snapshot:
+            changed = np.ones((32, 32), dtype=bool) if snapshot.dirty is None else snapshot.dirty
+            grid = snapshot.grid.copy()
+        assert not (grid != shown).reshape(32, 16, 32, 16).any(axis=(1, 3))[~changed].any()
+        shown = grid
+        worker.start()
+    worker.stop()
+    assert engine.steps > 0
+
+
+def test_snapshot_grid_does_not_change_while_stepping():
+    engine = AntEngine("RLLR", 256, 256)
+    worker = SimulationWorker(engine, scheduler=FrameScheduler(fps=100))
+    worker.start()
+    time.sleep(0.2)
+
+    with worker.snapshot() as snapshot:
+        grid = snapshot.grid.copy()
+        steps = snapshot.steps
+        time.sleep(0.2)
+        assert np.array_equal(snapshot.grid, grid)
+    worker.stop()
+    assert engine.steps > steps
+
+
+def test_error_pauses_the_worker():
+    engine = AntEngine("RL", 64, 64)
+
+    def step(n: int):
+        raise OverflowError("too many steps")
+
+    worker = SimulationWorker(engine, step, scheduler=FrameScheduler(fps=100))
+    worker.start()
+    worker.wait()
+    time.sleep(0.1)
+    assert isinstance(worker.error, OverflowError)
+    assert worker.achieved_rate == 0.0
+
+    # the thread still takes the commands
+    worker.call(engine.step, 10)
+    worker.wait()
+    assert engine.steps == 10
+    worker.stop()
+    worker.wait()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from Classes.AntEngine import AntEngine
+from Classes.PackedEngine import PackedAntEngine
+from Classes.SnapshotFile import SnapshotReader, load_snapshot, read_header, save_snapshot
+
+
+def assert_same(engine: AntEngine, other: AntEngine):
+    assert (engine.x, engine.y, engine.direction, engine.state, engine.steps) == \
+        (other.x, other.y, other.direction, other.state, other.steps)
+    assert np.array_equal(engine.grid, other.grid)
+
+
+# 1, 2, 3 (not a divisor of 8) and 8 bits per cell
+@pytest.mark.parametrize("rules", ["RL", "RLLR", "RLLRL", "R" * 129 + "L"])
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, rules, compress):
+    path = str(tmp_path / "grid.lant")
+    engine = AntEngine(rules, 70, 50)
+    engine.step(20_000)
+    palette = np.arange(3 * len(rules)).reshape(-1, 3) % 256
+    save_snapshot(engine, path, palette, compress=compress, tile_rows=16)
+
+    header = read_header(path)
+    assert (header.compressed, header.bits) == (compress, max(1, (len(rules) - 1).bit_length()))
+    assert np.array_equal(header.palette, palette)
+    loaded = load_snapshot(path)
+    assert_same(loaded, engine)
+    with SnapshotReader(path) as reader:
+        assert np.array_equal(reader.rows(13, 37), engine.grid[13:37])
+
+
+def test_mapped_load_does_not_write_the_file(tmp_path):
+    # the packed rows of a width multiple of 32 are stepped on a copy-on-write mapping of the file
+    path = str(tmp_path / "grid.lant")
+    engine = PackedAntEngine("RL", 64, 64)
+    engine.step(5000)
+    save_snapshot(engine, path)
+
+    loaded = load_snapshot(path)
+    loaded.step(3000)
+    engine.step(3000)
+    assert_same(loaded, engine)
+    assert load_snapshot(path).steps == 5000
+
+    # saved over the file it is mapped on
+    save_snapshot(loaded, path)
+    assert_same(load_snapshot(path), engine)
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "grid.npz"
+    path.write_bytes(b"PK\x03\x04")
+    with pytest.raises(ValueError):
+        read_header(str(path))
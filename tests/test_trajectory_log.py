@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from Classes.AntEngine import AntEngine
+from Classes.RuleCompiler import compile_source
+from Classes.TrajectoryLog import TrajectoryLog, TrajectoryWriter
+
+
+def assert_same(engine: AntEngine, other: AntEngine):
+    assert (engine.x, engine.y, engine.direction, engine.state, engine.steps) == \
+        (other.x, other.y, other.direction, other.state, other.steps)
+    assert np.array_equal(engine.grid, other.grid)
+
+
+# bit-packed symbols, bytes of symbols and a rule of 2 states
+@pytest.mark.parametrize("rules", ["RL", "RLLR", "{{{1, 2, 1}, {1, 8, 1}}, {{1, 2, 1}, {0, 1, 0}}}"])
+def test_seek_like_plain_stepping(tmp_path, rules):
+    path = str(tmp_path / "log")
+    with TrajectoryWriter(AntEngine(compile_source(rules), 64, 48), path, keyframe_every=7000, chunk_steps=3000) as writer:
+        writer.advance(20_000)
+        writer.advance(5_500)
+
+    log = TrajectoryLog(path)
+    assert (log.start, log.end) == (0, 25_500)
+    assert log.keyframe_steps == [0, 7000, 14_000, 21_000]
+    for step in [0, 6999, 7000, 12_345, 25_500]:
+        plain = AntEngine(compile_source(rules), 64, 48)
+        plain.step(step)
+        assert_same(log.seek(step, replay_steps=2000), plain)
+
+    with pytest.raises(ValueError):
+        log.seek(25_501)
+
+
+def test_log_cut_short(tmp_path):
+    # the index of the last keyframe is readable without close()
+    path = str(tmp_path / "log")
+    writer = TrajectoryWriter(AntEngine("RL", 32, 32), path, keyframe_every=1000, chunk_steps=400)
+    writer.advance(2500)
+    writer._queue.put(None)
+    writer._thread.join()
+    log = TrajectoryLog(path)
+    assert log.end == 2000
+    plain = AntEngine("RL", 32, 32)
+    plain.step(1500)
+    assert_same(log.seek(1500), plain)
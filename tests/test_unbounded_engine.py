@@ -0,0 +1,38 @@
+import numpy as np
+
+from Classes.AntEngine import AntEngine
+from Classes.UnboundedEngine import UnboundedAntEngine
+
+
+def written_bounds(engine: UnboundedAntEngine) -> tuple[int, int, int, int] | None:
+    # the bounding box of the non zero cells from all the tiles
+    xs, ys = [], []
+    for (tile_x, tile_y), tile in engine.tiles.items():
+        tile_ys, tile_xs = np.nonzero(tile)
+        xs.extend(tile_x * engine.tile_size + tile_xs)
+        ys.extend(tile_y * engine.tile_size + tile_ys)
+    return (min(xs), min(ys), max(xs), max(ys)) if xs else None
+
+
+def test_bounding_box_follows_the_steps():
+    engine = UnboundedAntEngine("RLLR", tile_size=8)
+    assert engine.bounding_box is None
+    for steps in (1, 10, 500, 20_000):
+        engine.step(steps)
+        assert engine.bounding_box == written_bounds(engine)
+
+    # the cells written back to 0 by stepping back stay inside
+    bounds = engine.bounding_box
+    engine.step_back(engine.steps)
+    assert engine.bounding_box == bounds
+    engine.reset()
+    assert engine.bounding_box is None
+
+
+def test_same_cells_as_wrapped_grid():
+    unbounded = UnboundedAntEngine("RL")
+    wrapped = AntEngine("RL", 256, 256)
+    unbounded.step(11_000)
+    wrapped.step(11_000)
+    grid = unbounded.window(-128, -128, 256, 256)
+    assert np.array_equal(grid, wrapped.grid)